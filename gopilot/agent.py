@@ -8,9 +8,13 @@ branch summaries, and interactive Q&A over repository context.
 
 from __future__ import annotations
 
+import asyncio
+import fnmatch
 import json
 import logging
-from typing import Any, Optional
+import os
+import re
+from typing import Any, Iterator, Optional, Sequence, Union
 
 from .git_context import GitContext
 from .ollama_client import OllamaClient
@@ -20,28 +24,257 @@ logger = logging.getLogger(__name__)
 # Maximum diff length sent to the model (characters).
 _MAX_DIFF_CHARS = 4000
 
+# Raw diff bytes read from git. Larger than the prompt budget so
+# _compress_diff still has whole files to choose from.
+_MAX_DIFF_BYTES = _MAX_DIFF_CHARS * 16
+
+# Files diffed in full for review/commit prompts, picked by changed lines.
+_MAX_DIFF_FILES = 20
+
+# Branch/file names listed in query context before "(+N more)".
+_MAX_CONTEXT_ITEMS = 20
+
+# Token budget for diffs, using the ~4 characters/token rule of thumb.
+_CHARS_PER_TOKEN = 4
+_MAX_DIFF_TOKENS = _MAX_DIFF_CHARS // _CHARS_PER_TOKEN
+
+# Generated or vendored files whose hunks carry no reviewable signal.
+_LOW_SIGNAL_PATTERNS = (
+    "*.lock",
+    "*.min.*",
+    "*.map",
+    "package-lock.json",
+    "pnpm-lock.yaml",
+    "go.sum",
+)
+
+# Result of a _prepare_* method: a (prompt, system) pair, a final message,
+# or None when the request cannot be served.
+_Prepared = Union[tuple[str, str], str, None]
+
+# System prompts. Kept byte-identical across calls so Ollama can reuse the
+# prefilled prefix between requests.
+_SYSTEM_QUERY_TMPL = (
+    "You are a GitHub Copilot-style agent embedded in a developer's "
+    "local environment. You have access to the git repository context "
+    "shown below. Answer the developer's question concisely and helpfully.\n\n"
+    "Repository context:\n{context}"
+)
+_SYSTEM_REVIEW = (
+    "You are a senior code reviewer. Review the following diff and "
+    "provide actionable feedback. Focus on bugs, readability, "
+    "performance, and security. Be concise."
+)
+_SYSTEM_COMMIT = (
+    "You are a commit message generator. Based on the diff provided, "
+    "write a clear, conventional commit message. Use the format:\n"
+    "<type>(<scope>): <description>\n\n<body>\n\n"
+    "Types: feat, fix, docs, style, refactor, test, chore."
+)
+_SYSTEM_EXPLAIN = (
+    "You are a technical writer. Explain the following code changes "
+    "between two git branches in clear, concise language suitable for "
+    "a pull request description."
+)
+_SYSTEM_SUMMARY = (
+    "You are a project manager assistant. Summarize the work done "
+    "on this branch based on the commit history. Be concise."
+)
+_SYSTEM_MULTI = (
+    "You are a senior software engineer. Answer every numbered "
+    "section for the diff provided. Start each section on its own "
+    "line with its label, e.g. [1], and do not add other sections."
+)
+
+# Fixed instruction blocks. Each prompt is laid out as instruction, then
+# _DIFF_MARKER, then the volatile diff, so the system prompt plus
+# instruction form a stable prefix whose prefill Ollama can reuse.
+_INSTRUCTION_REVIEW = "Review this diff."
+_INSTRUCTION_COMMIT = "Generate a commit message for this diff."
+_INSTRUCTION_EXPLAIN = "Explain the changes in these commits and diff."
+_DIFF_MARKER = "\n---DIFF---\n"
+
+# Keep the model (and its cached prompt prefix) loaded between requests.
+_KEEP_ALIVE = "30m"
+
+# Section instructions for multi_action, keyed by the action they replace.
+_MULTI_SECTIONS = {
+    "review": (
+        "Code review: actionable feedback focused on bugs, readability, "
+        "performance, and security."
+    ),
+    "commit_message": (
+        "Commit message in conventional format: "
+        "<type>(<scope>): <description> followed by a short body."
+    ),
+    "explain_diff": (
+        "Pull request description explaining the changes in clear, "
+        "concise language."
+    ),
+}
+
+# Matches the "[N]" section labels in a multi_action response.
+_SECTION_LABEL_RE = re.compile(r"^\s*\[(\d+)\][ \t]*", re.MULTILINE)
+
+
+def _diff_prompt(instruction: str, diff: str, omitted: Sequence[str] = ()) -> str:
+    """
+    Lay out a prompt as fixed instruction block followed by the diff.
+
+    Args:
+        instruction: Fixed instruction text.
+        diff: Unified diff text.
+        omitted: Changed paths left out of *diff*; listed after it so the
+                 model knows the change set is incomplete.
+    """
+    prompt = f"{instruction}{_DIFF_MARKER}```diff\n{_compress_diff(diff)}\n```"
+    if omitted:
+        prompt += (
+            f"\n... ({len(omitted)} more changed file(s) not shown: "
+            f"{_cap(list(omitted))})"
+        )
+    return prompt
+
 
 def _truncate(text: str, limit: int = _MAX_DIFF_CHARS) -> str:
-    """Truncate text to *limit* characters with an indicator."""
+    """
+    Truncate text to *limit* characters with an indicator.
+
+    Diffs are already capped by git (see ``_MAX_DIFF_BYTES``), so this
+    only slices text that is known to be small.
+    """
     if len(text) <= limit:
         return text
     return text[:limit] + "\n... (truncated)"
 
 
+def _cap(items: list[str], n: int = _MAX_CONTEXT_ITEMS) -> str:
+    """Join the first *n* items, noting how many were left out."""
+    text = ", ".join(items[:n])
+    if len(items) > n:
+        text += f" (+{len(items) - n} more)"
+    return text
+
+
+def _estimate_tokens(text: str) -> int:
+    """Approximate the number of model tokens in *text*."""
+    return (len(text) + _CHARS_PER_TOKEN - 1) // _CHARS_PER_TOKEN
+
+
+def _compress_file_diff(section: str) -> tuple[str, int]:
+    """
+    Drop hunk context lines that are not adjacent to a change.
+
+    Args:
+        section: Diff text for a single file (starting at ``diff --git``).
+
+    Returns:
+        Tuple of (compressed section, number of changed lines).
+    """
+    lines = section.split("\n")
+    is_change = [line[:1] in ("+", "-") for line in lines]
+    kept = []
+    changed = 0
+    in_hunk = False
+    for i, line in enumerate(lines):
+        if line.startswith("@@"):
+            in_hunk = True
+        elif in_hunk and is_change[i]:
+            changed += 1
+        elif in_hunk and not (
+            (i > 0 and is_change[i - 1])
+            or (i + 1 < len(lines) and is_change[i + 1])
+        ):
+            continue
+        kept.append(line)
+    return "\n".join(kept), changed
+
+
+def _compress_diff(diff: str, token_budget: int = _MAX_DIFF_TOKENS) -> str:
+    """
+    Fit a diff into *token_budget* tokens, keeping the highest-signal files.
+
+    Lockfiles and minified assets are dropped, distant context lines are
+    removed, and whole files are then picked in order of changed lines
+    until the budget is spent. Selected files keep their original order.
+
+    Args:
+        diff: Unified diff text (``git diff`` output).
+        token_budget: Approximate token limit for the result.
+
+    Returns:
+        Compressed diff text.
+    """
+    if _estimate_tokens(diff) <= token_budget:
+        return diff
+
+    sections = re.split(r"^(?=diff --git )", diff, flags=re.MULTILINE)
+    candidates = []
+    skipped = 0
+    for index, section in enumerate(s for s in sections if s.strip()):
+        path = section.split("\n", 1)[0].rsplit(" b/", 1)[-1]
+        name = path.rsplit("/", 1)[-1]
+        if any(fnmatch.fnmatch(name, pattern) for pattern in _LOW_SIGNAL_PATTERNS):
+            skipped += 1
+            continue
+        text, changed = _compress_file_diff(section.rstrip("\n"))
+        candidates.append((changed, index, text))
+
+    selected = []
+    remaining = token_budget
+    for changed, index, text in sorted(candidates, key=lambda c: (-c[0], c[1])):
+        cost = _estimate_tokens(text) + 1
+        if cost <= remaining:
+            selected.append((index, text))
+            remaining -= cost
+        else:
+            skipped += 1
+
+    if not selected and candidates:
+        # Nothing fits whole: keep the start of the highest-signal file
+        _, index, text = min(candidates, key=lambda c: (-c[0], c[1]))
+        selected.append((index, _truncate(text, token_budget * _CHARS_PER_TOKEN)))
+        skipped -= 1
+
+    parts = [text for _, text in sorted(selected)]
+    if skipped > 0:
+        parts.append(f"... ({skipped} more file(s) omitted)")
+    return "\n".join(parts)
+
+
 class CopilotAgent:
     """Git-aware copilot agent backed by a local Ollama model."""
 
-    def __init__(self, ollama_client: OllamaClient, git_context: GitContext):
+    def __init__(
+        self,
+        ollama_client: OllamaClient,
+        git_context: GitContext,
+        model_preference: Optional[str] = None,
+    ):
         """
         Initialize the agent.
 
+        Agent prompts are long (diffs, commit logs) and decode-heavy, so a
+        quantized tag such as ``qwen2.5-coder:7b-instruct-q4_K_M`` is a good
+        choice here: Q4_K_M moves roughly a quarter of the FP16 weight
+        bytes per token and about doubles decode speed on memory-bound
+        hardware with little quality loss for review-style tasks.
+
         Args:
             ollama_client: Configured Ollama client.
             git_context: GitContext bound to a local repository.
+            model_preference: Model tag for agent requests. Defaults to the
+                              ``GOPILOT_AGENT_MODEL`` environment variable,
+                              then to the client's model.
         """
         self.ollama = ollama_client
         self.git = git_context
-        logger.info("CopilotAgent initialized")
+        self.model_preference = model_preference or os.environ.get(
+            "GOPILOT_AGENT_MODEL"
+        )
+        logger.info(
+            f"CopilotAgent initialized (model={self.model_preference or 'default'})"
+        )
 
     # ------------------------------------------------------------------
     # Public high-level actions
@@ -58,30 +291,7 @@ class CopilotAgent:
         Returns:
             AI-generated response text, or None on error.
         """
-        status = self.git.get_status_summary()
-        context_parts = [
-            f"Current branch: {status.get('branch', 'unknown')}",
-            f"Local branches: {', '.join(status.get('branches', []))}",
-        ]
-        staged = status.get("staged_files", [])
-        if staged:
-            context_parts.append(f"Staged files: {', '.join(staged)}")
-        unstaged = status.get("unstaged_files", [])
-        if unstaged:
-            context_parts.append(f"Unstaged files: {', '.join(unstaged)}")
-        commits = status.get("recent_commits", [])
-        if commits:
-            context_parts.append("Recent commits:\n" + "\n".join(commits))
-
-        context_text = "\n".join(context_parts)
-
-        system = (
-            "You are a GitHub Copilot-style agent embedded in a developer's "
-            "local environment. You have access to the git repository context "
-            "shown below. Answer the developer's question concisely and helpfully.\n\n"
-            f"Repository context:\n{context_text}"
-        )
-        return self.ollama.generate(prompt=query, system=system)
+        return self._generate(self._prepare_query(query))
 
     def review_changes(self, base_branch: Optional[str] = None) -> Optional[str]:
         """
@@ -95,23 +305,7 @@ class CopilotAgent:
         Returns:
             Review text, or None.
         """
-        if base_branch:
-            diff = self.git.get_diff(base=base_branch)
-        else:
-            diff = self.git.get_staged_diff()
-            if not diff:
-                diff = self.git.get_diff()
-
-        if not diff:
-            return "No changes detected to review."
-
-        system = (
-            "You are a senior code reviewer. Review the following diff and "
-            "provide actionable feedback. Focus on bugs, readability, "
-            "performance, and security. Be concise."
-        )
-        prompt = f"Review this diff:\n```diff\n{_truncate(diff)}\n```"
-        return self.ollama.generate(prompt=prompt, system=system)
+        return self._generate(self._prepare_review(base_branch))
 
     def suggest_commit_message(self) -> Optional[str]:
         """
@@ -120,20 +314,7 @@ class CopilotAgent:
         Returns:
             Suggested commit message, or None.
         """
-        diff = self.git.get_staged_diff()
-        if not diff:
-            diff = self.git.get_diff()
-        if not diff:
-            return "No changes detected."
-
-        system = (
-            "You are a commit message generator. Based on the diff provided, "
-            "write a clear, conventional commit message. Use the format:\n"
-            "<type>(<scope>): <description>\n\n<body>\n\n"
-            "Types: feat, fix, docs, style, refactor, test, chore."
-        )
-        prompt = f"Generate a commit message for:\n```diff\n{_truncate(diff)}\n```"
-        return self.ollama.generate(prompt=prompt, system=system)
+        return self._generate(self._prepare_commit_message())
 
     def explain_diff(
         self,
@@ -150,23 +331,7 @@ class CopilotAgent:
         Returns:
             Explanation text, or None.
         """
-        diff = self.git.get_diff(base=base, target=target)
-        if not diff:
-            return "No differences found between the specified branches."
-
-        commits = self.git.get_branch_commits(base=base, target=target)
-        commits_text = "\n".join(commits) if commits else "(no unique commits)"
-
-        system = (
-            "You are a technical writer. Explain the following code changes "
-            "between two git branches in clear, concise language suitable for "
-            "a pull request description."
-        )
-        prompt = (
-            f"Commits:\n{commits_text}\n\n"
-            f"Diff:\n```diff\n{_truncate(diff)}\n```"
-        )
-        return self.ollama.generate(prompt=prompt, system=system)
+        return self._generate(self._prepare_explain_diff(base, target))
 
     def summarize_branch(self, branch: Optional[str] = None) -> Optional[str]:
         """
@@ -178,6 +343,129 @@ class CopilotAgent:
         Returns:
             Summary text, or None.
         """
+        return self._generate(self._prepare_summarize_branch(branch))
+
+    # ------------------------------------------------------------------
+    # Prompt preparation
+    #
+    # Each _prepare_* method returns either a (prompt, system) pair to send
+    # to the model, a final message when there is nothing to ask, or None
+    # when the request cannot be served.
+    # ------------------------------------------------------------------
+
+    def _generate(self, prepared: _Prepared) -> Optional[str]:
+        """Send a prepared request to the model and return the full text."""
+        if prepared is None or isinstance(prepared, str):
+            return prepared
+        prompt, system = prepared
+        return self.ollama.generate(
+            prompt=prompt,
+            system=system,
+            model=self.model_preference,
+            keep_alive=_KEEP_ALIVE,
+        )
+
+    def _generate_stream(self, prepared: _Prepared) -> Iterator[str]:
+        """Send a prepared request to the model and yield text fragments."""
+        if prepared is None:
+            return
+        if isinstance(prepared, str):
+            yield prepared
+            return
+        prompt, system = prepared
+        yield from self.ollama.generate_stream(
+            prompt=prompt,
+            system=system,
+            model=self.model_preference,
+            keep_alive=_KEEP_ALIVE,
+        )
+
+    def _get_change_diff(
+        self, base_branch: Optional[str] = None
+    ) -> tuple[Optional[str], list[str]]:
+        """
+        Return the diff to review: against *base_branch* if given, else the
+        staged diff, falling back to the working-tree diff.
+
+        Only the most-changed files are diffed and git output is capped,
+        so large change sets never reach Python in full.
+
+        Returns:
+            Tuple of (diff text or None on error, changed paths left out).
+        """
+        if base_branch:
+            selector = {"base": base_branch}
+        elif self.git.has_staged_changes():
+            selector = {"staged": True}
+        else:
+            selector = {}
+        ranked = self.git.rank_changed_files(**selector)
+        if ranked is None:
+            return None, []
+        if not ranked:
+            return "", []
+        diff = self.git.get_diff(
+            max_bytes=_MAX_DIFF_BYTES, paths=ranked[:_MAX_DIFF_FILES], **selector
+        )
+        return diff, ranked[_MAX_DIFF_FILES:]
+
+    def _prepare_query(self, query: str) -> _Prepared:
+        status = self.git.get_status_summary()
+        staged = status.get("staged_files", [])
+        unstaged = status.get("unstaged_files", [])
+        commits = status.get("recent_commits", [])
+        context_text = "\n".join(
+            line
+            for line in (
+                f"Current branch: {status.get('branch', 'unknown')}",
+                f"Local branches: {_cap(status.get('branches', []))}",
+                staged and f"Staged files: {_cap(staged)}",
+                unstaged and f"Unstaged files: {_cap(unstaged)}",
+                commits and "Recent commits:\n" + "\n".join(commits),
+            )
+            if line
+        )
+        system = _SYSTEM_QUERY_TMPL.format(context=context_text)
+        return query, system
+
+    def _prepare_review(self, base_branch: Optional[str] = None) -> _Prepared:
+        diff, omitted = self._get_change_diff(base_branch)
+
+        if not diff:
+            return "No changes detected to review."
+
+        return _diff_prompt(_INSTRUCTION_REVIEW, diff, omitted), _SYSTEM_REVIEW
+
+    def _prepare_commit_message(self) -> _Prepared:
+        diff, omitted = self._get_change_diff()
+        if not diff:
+            return "No changes detected."
+
+        return _diff_prompt(_INSTRUCTION_COMMIT, diff, omitted), _SYSTEM_COMMIT
+
+    def _prepare_explain_diff(
+        self, base: str, target: Optional[str] = None
+    ) -> _Prepared:
+        # Fetch the diff and the commit range concurrently
+        diff_future = self.git.submit(
+            self.git.get_diff, base=base, target=target, max_bytes=_MAX_DIFF_BYTES
+        )
+        commits_future = self.git.submit(
+            self.git.get_branch_commits, base=base, target=target
+        )
+        diff = diff_future.result()
+        if not diff:
+            return "No differences found between the specified branches."
+
+        commits = commits_future.result()
+        commits_text = "\n".join(commits) if commits else "(no unique commits)"
+
+        prompt = _diff_prompt(
+            f"{_INSTRUCTION_EXPLAIN}\nCommits:\n{commits_text}", diff
+        )
+        return prompt, _SYSTEM_EXPLAIN
+
+    def _prepare_summarize_branch(self, branch: Optional[str] = None) -> _Prepared:
         branch = branch or self.git.get_current_branch()
         if not branch:
             return None
@@ -186,15 +474,108 @@ class CopilotAgent:
         if not commits:
             return f"No commits found on branch '{branch}'."
 
-        system = (
-            "You are a project manager assistant. Summarize the work done "
-            "on this branch based on the commit history. Be concise."
-        )
         prompt = (
             f"Branch: {branch}\n"
             f"Commits:\n" + "\n".join(commits)
         )
-        return self.ollama.generate(prompt=prompt, system=system)
+        return prompt, _SYSTEM_SUMMARY
+
+    # ------------------------------------------------------------------
+    # Combined / streaming actions
+    # ------------------------------------------------------------------
+
+    def multi_action(
+        self,
+        actions: list[str],
+        base_branch: Optional[str] = None,
+    ) -> Optional[dict[str, str]]:
+        """
+        Answer several diff-based actions with a single generation.
+
+        The diff and shared instructions are sent once and the model is
+        asked for one labelled section per action, so the prompt is
+        prefilled once instead of once per action.
+
+        Args:
+            actions: Any of ``review``, ``commit_message``, ``explain_diff``.
+            base_branch: Compare against this branch instead of the
+                         staged / working-tree diff.
+
+        Returns:
+            Mapping of action name to its section text, or None on error.
+        """
+        unknown = [a for a in actions if a not in _MULTI_SECTIONS]
+        if unknown:
+            raise ValueError(f"Unsupported multi actions: {', '.join(unknown)}")
+        if not actions:
+            return {}
+
+        diff, omitted = self._get_change_diff(base_branch)
+
+        if not diff:
+            return {action: "No changes detected." for action in actions}
+
+        sections = "\n".join(
+            f"[{i}] {_MULTI_SECTIONS[action]}"
+            for i, action in enumerate(actions, start=1)
+        )
+        prompt = _diff_prompt(
+            f"Produce the following sections:\n{sections}", diff, omitted
+        )
+        text = self.ollama.generate(
+            prompt=prompt,
+            system=_SYSTEM_MULTI,
+            model=self.model_preference,
+            keep_alive=_KEEP_ALIVE,
+        )
+        if text is None:
+            return None
+
+        # re.split yields [preamble, label, body, label, body, ...]
+        parts = _SECTION_LABEL_RE.split(text)
+        results: dict[str, str] = {}
+        for label, body in zip(parts[1::2], parts[2::2]):
+            index = int(label) - 1
+            if 0 <= index < len(actions):
+                results.setdefault(actions[index], body.strip())
+        return results
+
+    def stream_agent_request(self, action: str, params: dict) -> Iterator[str]:
+        """
+        Stream the response to a text-producing agent action.
+
+        Supports the same actions and parameters as
+        :meth:`handle_agent_request` except ``status`` and ``multi``.
+        Fragments are yielded as the model decodes them, so callers can
+        show output long before generation finishes.
+
+        Args:
+            action: Action identifier.
+            params: Action-specific parameters.
+
+        Yields:
+            Response text fragments.
+
+        Raises:
+            ValueError: If *action* does not produce streamable text.
+        """
+        with self.git.request_scope():
+            if action == "query":
+                prepared = self._prepare_query(params.get("query", ""))
+            elif action == "review":
+                prepared = self._prepare_review(params.get("base_branch"))
+            elif action == "commit_message":
+                prepared = self._prepare_commit_message()
+            elif action == "explain_diff":
+                prepared = self._prepare_explain_diff(
+                    base=params.get("base", "main"),
+                    target=params.get("target"),
+                )
+            elif action == "summarize_branch":
+                prepared = self._prepare_summarize_branch(params.get("branch"))
+            else:
+                raise ValueError(f"Action cannot be streamed: {action}")
+        yield from self._generate_stream(prepared)
 
     # ------------------------------------------------------------------
     # Structured helpers (used by LSP custom methods)
@@ -218,7 +599,7 @@ class CopilotAgent:
 
         Supported actions:
             query, review, commit_message, explain_diff,
-            summarize_branch, status
+            summarize_branch, status, multi
 
         Args:
             action: Action identifier.
@@ -227,6 +608,11 @@ class CopilotAgent:
         Returns:
             Dict with ``result`` or ``error`` key.
         """
+        with self.git.request_scope():
+            return self._dispatch_agent_request(action, params)
+
+    def _dispatch_agent_request(self, action: str, params: dict) -> dict[str, Any]:
+        """Run *action*; see :meth:`handle_agent_request`."""
         try:
             if action == "query":
                 text = self.process_query(params.get("query", ""))
@@ -241,6 +627,14 @@ class CopilotAgent:
                 )
             elif action == "summarize_branch":
                 text = self.summarize_branch(params.get("branch"))
+            elif action == "multi":
+                sections = self.multi_action(
+                    params.get("actions", list(_MULTI_SECTIONS)),
+                    base_branch=params.get("base_branch"),
+                )
+                if sections is None:
+                    return {"error": "Failed to generate response (Ollama unreachable?)"}
+                return {"result": sections}
             elif action == "status":
                 return {"result": self.git.get_status_summary()}
             else:
@@ -253,7 +647,58 @@ class CopilotAgent:
             logger.exception(f"Agent error for action={action}: {exc}")
             return {"error": str(exc)}
 
+    async def handle_agent_request_async(
+        self, action: str, params: dict
+    ) -> dict[str, Any]:
+        """
+        Run :meth:`handle_agent_request` on a worker thread.
+
+        Args:
+            action: Action identifier.
+            params: Action-specific parameters.
+
+        Returns:
+            Dict with ``result`` or ``error`` key.
+        """
+        return await asyncio.to_thread(self.handle_agent_request, action, params)
 
-if __name__ == "__main__"
-    agent = Agent(git=Git())
-    agent.handle_agent_request(action="query", params={"query": ""})
+    async def batch_handle(self, requests: list[dict]) -> list[dict[str, Any]]:
+        """
+        Run several agent requests concurrently.
+
+        Each request's git queries and Ollama call overlap with the others,
+        so wall time approaches the slowest request rather than the sum.
+        Ollama only decodes them in parallel when the server is started
+        with ``OLLAMA_NUM_PARALLEL`` > 1.
+
+        Args:
+            requests: List of ``{"action": ..., "params": {...}}`` dicts.
+
+        Returns:
+            Responses in the same order as *requests*.
+        """
+        coros = [
+            self.handle_agent_request_async(
+                req.get("action", ""), req.get("params", {})
+            )
+            for req in requests
+        ]
+        return list(await asyncio.gather(*coros))
+
+
+if __name__ == "__main__":
+    # Usage: python -m gopilot.agent [action]
+    import sys
+
+    agent = CopilotAgent(OllamaClient(), GitContext())
+    # Warmup: a 1-token generate loads the model; keep_alive=-1 pins it
+    # in memory so later agent calls skip the model load.
+    agent.ollama.generate(
+        prompt="ok",
+        system="",
+        model=agent.model_preference,
+        options={"num_predict": 1},
+        keep_alive=-1,
+    )
+    action = sys.argv[1] if len(sys.argv) > 1 else "status"
+    print(json.dumps(agent.handle_agent_request(action, {}), indent=2))
@@ -2,18 +2,272 @@
 Git Context - Local git repository interaction for copilot agent mode
 
 Provides branch listing, diffs, changed files, and commit history
-using only stdlib subprocess calls to the git CLI.
+using stdlib subprocess calls to the git CLI. When the optional
+``pygit2`` package is installed, hot-path reads (current branch,
+branches, commit log, tracked files, file contents) run in-process.
 """
 
 from __future__ import annotations
 
+import contextlib
+import contextvars
+import functools
+import itertools
 import logging
 import os
 import subprocess
-from typing import Optional
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Iterator, Optional
+
+try:
+    # Optional: in-process reads through libgit2 instead of forking git
+    import pygit2
+except ImportError:  # pragma: no cover - depends on environment
+    pygit2 = None
 
 logger = logging.getLogger(__name__)
 
+# Worker threads used to run independent git commands concurrently. The
+# workers mostly wait on git subprocesses, so this is a fixed small cap
+# rather than the CPU count: a 1-CPU container still overlaps the calls.
+_MAX_WORKERS = 4
+
+# Read results are reused until HEAD/index change or this many seconds pass
+# (the TTL bounds staleness for working-tree edits and new refs, which do
+# not touch either file).
+_CACHE_TTL = 2.0
+_CACHE_SIZE = 16
+
+# Subcommands that modify the repository and invalidate cached reads.
+_WRITE_COMMANDS = frozenset(
+    {
+        "add", "checkout", "cherry-pick", "commit", "merge", "mv", "rebase",
+        "reset", "restore", "revert", "rm", "stash", "switch", "tag",
+    }
+)
+
+# Subcommands whose output can be memoized within a request scope.
+_READ_ONLY_COMMANDS = frozenset(
+    {"branch", "diff", "log", "ls-files", "rev-parse", "show", "status"}
+)
+
+# Number of space-separated fields preceding the path in each
+# ``git status --porcelain=v2`` entry type (ordinary, rename/copy, unmerged).
+_PORCELAIN_V2_FIELDS = {"1": 8, "2": 9, "u": 10}
+
+
+def _parse_porcelain_v2(output: str) -> tuple[Optional[str], list[str], list[str]]:
+    """
+    Parse ``git status --porcelain=v2 --branch -z`` output.
+
+    Args:
+        output: NUL-separated porcelain v2 status text.
+
+    Returns:
+        Tuple of (branch, staged_files, unstaged_files). A detached HEAD
+        is reported as ``HEAD`` to match ``git rev-parse --abbrev-ref``.
+    """
+    branch: Optional[str] = None
+    staged: list[str] = []
+    unstaged: list[str] = []
+
+    records = iter(output.split("\0"))
+    for record in records:
+        if record.startswith("# branch.head "):
+            head = record[len("# branch.head "):]
+            branch = "HEAD" if head == "(detached)" else head
+            continue
+
+        fields = _PORCELAIN_V2_FIELDS.get(record[:1])
+        if fields is None:
+            continue
+        parts = record.split(" ", fields)
+        if len(parts) <= fields:
+            continue
+        xy, path = parts[1], parts[fields]
+        if record[0] == "2":
+            # Renames/copies are followed by a separate original-path record
+            next(records, None)
+
+        if record[0] == "u":
+            staged.append(path)
+            unstaged.append(path)
+            continue
+        if xy[0] != ".":
+            staged.append(path)
+        if xy[1] != ".":
+            unstaged.append(path)
+
+    return branch, staged, unstaged
+
+
+def _detach(value: Any) -> Any:
+    """Copy the lists and dicts in a cached value; strings and tuples are shared."""
+    if isinstance(value, list):
+        return [_detach(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _detach(item) for key, item in value.items()}
+    return value
+
+
+def _cached(method: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Memoize a read-only GitContext method.
+
+    Entries are keyed on the method name and arguments and are only reused
+    while the ``.git/HEAD`` / ``.git/index`` mtimes are unchanged and the
+    entry is younger than ``_CACHE_TTL``. Every call gets its own copy of
+    the containers, so a caller mutating a result cannot corrupt the cache.
+    """
+
+    @functools.wraps(method)
+    def wrapper(self: "GitContext", *args: Any, **kwargs: Any) -> Any:
+        key = (method.__name__, args, tuple(sorted(kwargs.items())))
+        stamp = self.repo_stamp()
+        now = time.monotonic()
+        with self._cache_lock:
+            entry = self._cache.get(key)
+            if entry and entry[0] == stamp and now - entry[1] < _CACHE_TTL:
+                self._cache.move_to_end(key)
+                return _detach(entry[2])
+
+        value = method(self, *args, **kwargs)
+        with self._cache_lock:
+            self._cache[key] = (stamp, now, value)
+            self._cache.move_to_end(key)
+            while len(self._cache) > _CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return _detach(value)
+
+    return wrapper
+
+
+@functools.lru_cache(maxsize=1)
+def _git_supports_batch_command() -> bool:
+    """Return True if the installed git has ``cat-file --batch-command`` (2.36+)."""
+    try:
+        output = subprocess.run(
+            ["git", "version"], capture_output=True, timeout=5
+        ).stdout.decode("ascii", errors="replace")
+        major, minor = (int(p) for p in output.split()[2].split(".")[:2])
+    except Exception:
+        return False
+    return (major, minor) >= (2, 36)
+
+
+class _GitBatchSession:
+    """
+    Answer object queries through long-lived ``git cat-file`` processes.
+
+    On git 2.36+ a single ``--batch-command`` process serves both
+    ``contents`` and ``info`` requests; older versions fall back to one
+    ``--batch`` and one ``--batch-check`` process. Processes are started on
+    first use and restarted if they exit, so each query costs a pipe
+    round-trip instead of a fork/exec.
+    """
+
+    def __init__(self, git_cmd: list[str], popen_kwargs: dict[str, Any]):
+        """
+        Args:
+            git_cmd: Command prefix that targets the repository.
+            popen_kwargs: Extra ``subprocess.Popen`` arguments (cwd/env).
+        """
+        self._git_cmd = git_cmd
+        self._popen_kwargs = popen_kwargs
+        self._procs: dict[str, subprocess.Popen] = {}
+        self._lock = threading.Lock()
+
+    def contents(self, spec: str) -> Optional[bytes]:
+        """
+        Return raw blob bytes for *spec* (e.g. ``HEAD:path``).
+
+        Returns:
+            Blob bytes, or None if the object is missing or not a blob.
+        """
+        result = self._query("contents", spec)
+        if result is None or result[0] != "blob":
+            return None
+        return result[2]
+
+    def info(self, spec: str) -> Optional[tuple[str, int]]:
+        """
+        Return ``(type, size)`` for *spec* without reading its content.
+
+        Returns:
+            Object type and size, or None if the object is missing.
+        """
+        result = self._query("info", spec)
+        if result is None:
+            return None
+        return result[0], result[1]
+
+    def _query(
+        self, command: str, spec: str
+    ) -> Optional[tuple[str, int, Optional[bytes]]]:
+        """Send one request and parse ``<sha> <type> <size>`` (+ content)."""
+        if _git_supports_batch_command():
+            key, line = "--batch-command", f"{command} {spec}\n"
+        else:
+            key = "--batch" if command == "contents" else "--batch-check"
+            line = f"{spec}\n"
+
+        with self._lock:
+            try:
+                proc = self._procs.get(key)
+                if proc is None or proc.poll() is not None:
+                    self._stop(key)  # release a dead session's pipes
+                    proc = subprocess.Popen(
+                        self._git_cmd + ["cat-file", key],
+                        stdin=subprocess.PIPE,
+                        stdout=subprocess.PIPE,
+                        stderr=subprocess.DEVNULL,
+                        **self._popen_kwargs,
+                    )
+                    self._procs[key] = proc
+
+                proc.stdin.write(line.encode("utf-8"))
+                proc.stdin.flush()
+
+                # Header: "<sha> <type> <size>" or "<spec> missing"
+                header = proc.stdout.readline().split()
+                if len(header) != 3 or not header[2].isdigit():
+                    return None
+                obj_type, size = header[1].decode("ascii"), int(header[2])
+                if command != "contents":
+                    return obj_type, size, None
+                data = proc.stdout.read(size + 1)[:size]
+                return obj_type, size, data
+            except FileNotFoundError:
+                logger.error("git executable not found")
+                return None
+            except (OSError, ValueError) as exc:
+                logger.error(f"git cat-file error: {exc}")
+                self._stop(key)
+                return None
+
+    def _stop(self, key: str) -> None:
+        """Terminate the process registered under *key*."""
+        proc = self._procs.pop(key, None)
+        if proc is None:
+            return
+        try:
+            proc.stdin.close()
+            proc.terminate()
+            proc.wait(timeout=1)
+        except Exception:
+            proc.kill()
+            proc.wait()
+        proc.stdout.close()
+
+    def close(self) -> None:
+        """Terminate all running processes."""
+        with self._lock:
+            for key in list(self._procs):
+                self._stop(key)
+
 
 class GitContext:
     """Interact with a local git repository."""
@@ -27,38 +281,135 @@ class GitContext:
                        Defaults to the current working directory.
         """
         self.repo_path = repo_path or os.getcwd()
+        self._resolve_repo()
+        self._repo = self._open_pygit2()
+        self._repo_lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(
+            max_workers=_MAX_WORKERS, thread_name_prefix="gopilot-git"
+        )
+        # Long-lived ``git cat-file`` session for object reads
+        self._batch = _GitBatchSession(self._git_cmd, self._popen_kwargs)
+        # LRU of read results, see _cached
+        self._cache: OrderedDict[tuple, tuple] = OrderedDict()
+        self._cache_lock = threading.Lock()
+        # Per-request memo of git output, see request_scope
+        self._request_memo: contextvars.ContextVar[
+            Optional[dict[tuple, Optional[str]]]
+        ] = contextvars.ContextVar(f"gopilot_git_memo_{id(self)}", default=None)
         logger.info(f"GitContext initialized for: {self.repo_path}")
 
     # ------------------------------------------------------------------
     # Internal helpers
     # ------------------------------------------------------------------
 
-    def _run_git(self, *args: str, check: bool = True) -> Optional[str]:
+    def _resolve_repo(self) -> None:
+        """
+        Locate the git directory and work tree once.
+
+        Later commands get ``GIT_DIR``/``GIT_WORK_TREE`` in their
+        environment instead of ``-C``, so git skips its upward repository
+        discovery on every call. Falls back to ``-C`` when *repo_path* is
+        not inside a work tree.
+        """
+        self._git_dir: Optional[str] = None
+        self._work_tree: Optional[str] = None
+        self._git_cmd = ["git", "-C", self.repo_path]
+        # Descriptors Python opens are non-inheritable (PEP 446), so the
+        # per-spawn close_fds sweep is skipped.
+        self._popen_kwargs: dict[str, Any] = {"close_fds": False}
+        try:
+            result = subprocess.run(
+                self._git_cmd
+                + ["rev-parse", "--absolute-git-dir", "--show-toplevel"],
+                capture_output=True,
+                timeout=30,
+            )
+        except Exception as exc:
+            logger.debug(f"Could not resolve git repository: {exc}")
+            return
+        lines = result.stdout.decode("utf-8", errors="replace").splitlines()
+        if result.returncode != 0 or len(lines) != 2:
+            return
+
+        self._git_dir, self._work_tree = lines
+        env = dict(os.environ)
+        env["GIT_DIR"] = self._git_dir
+        env["GIT_WORK_TREE"] = self._work_tree
+        # Run from repo_path so relative output matches ``git -C repo_path``
+        self._git_cmd = ["git"]
+        self._popen_kwargs.update(cwd=self.repo_path, env=env)
+
+    def _open_pygit2(self) -> Optional[Any]:
+        """Open the repository with pygit2 if it is installed."""
+        if pygit2 is None or self._git_dir is None:
+            return None
+        try:
+            return pygit2.Repository(self._git_dir)
+        except Exception as exc:
+            logger.debug(f"pygit2 unavailable for {self.repo_path}: {exc}")
+            return None
+
+    def _is_repo_root(self) -> bool:
+        """Return True if repo_path is the top of the work tree."""
+        return self._work_tree is not None and os.path.realpath(
+            self.repo_path
+        ) == os.path.realpath(self._work_tree)
+
+    def _run_git(
+        self,
+        *args: str,
+        check: bool = True,
+        max_bytes: Optional[int] = None,
+    ) -> Optional[str]:
         """
         Execute a git command inside the repository.
 
+        Output is captured as bytes and decoded once, after any
+        *max_bytes* cut, so large diffs are not decoded in full only to
+        be truncated later.
+
         Args:
             *args: Arguments passed after ``git``.
             check: If True, return None on non-zero exit code.
+            max_bytes: Keep at most this many bytes of stdout.
 
         Returns:
             Stripped stdout string, or None on failure.
         """
-        cmd = ["git", "-C", self.repo_path] + list(args)
+        if args and args[0] in _WRITE_COMMANDS:
+            self.invalidate_cache()
+
+        memo = self._request_memo.get()
+        if memo is None or not args or args[0] not in _READ_ONLY_COMMANDS:
+            return self._spawn_git(args, check, max_bytes)
+
+        key = (args, check, max_bytes)
+        if key in memo:
+            return memo[key]
+        output = self._spawn_git(args, check, max_bytes)
+        memo[key] = output
+        return output
+
+    def _spawn_git(
+        self, args: tuple[str, ...], check: bool, max_bytes: Optional[int]
+    ) -> Optional[str]:
+        """Run git in a subprocess; see :meth:`_run_git`."""
+        cmd = self._git_cmd + list(args)
         logger.debug(f"Running: {' '.join(cmd)}")
+        if max_bytes is not None:
+            return self._run_git_limited(cmd, check, max_bytes)
         try:
             result = subprocess.run(
                 cmd,
                 capture_output=True,
-                text=True,
                 timeout=30,
+                **self._popen_kwargs,
             )
             if check and result.returncode != 0:
-                logger.warning(
-                    f"git command failed ({result.returncode}): {result.stderr.strip()}"
-                )
+                stderr = result.stderr.decode("utf-8", errors="replace").strip()
+                logger.warning(f"git command failed ({result.returncode}): {stderr}")
                 return None
-            return result.stdout.strip()
+            return result.stdout.strip().decode("utf-8", errors="replace")
         except FileNotFoundError:
             logger.error("git executable not found")
             return None
@@ -69,18 +420,278 @@ class GitContext:
             logger.error(f"git error: {exc}")
             return None
 
+    def _git_returncode(self, *args: str) -> Optional[int]:
+        """
+        Execute a git command for its exit status only.
+
+        Output is discarded instead of piped, for commands such as
+        ``diff --quiet`` whose answer is the exit code.
+
+        Returns:
+            The exit code, or None if git could not be run.
+        """
+        cmd = self._git_cmd + list(args)
+        logger.debug(f"Running: {' '.join(cmd)}")
+        try:
+            return subprocess.run(
+                cmd,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                timeout=30,
+                **self._popen_kwargs,
+            ).returncode
+        except FileNotFoundError:
+            logger.error("git executable not found")
+            return None
+        except subprocess.TimeoutExpired:
+            logger.error("git command timed out")
+            return None
+        except Exception as exc:
+            logger.error(f"git error: {exc}")
+            return None
+
+    def _run_git_limited(
+        self, cmd: list[str], check: bool, max_bytes: int
+    ) -> Optional[str]:
+        """
+        Run *cmd* and read at most *max_bytes* of its stdout.
+
+        The process is killed as soon as the limit is reached, so git
+        stops producing output that would be thrown away.
+        """
+        try:
+            proc = subprocess.Popen(
+                cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                **self._popen_kwargs,
+            )
+        except FileNotFoundError:
+            logger.error("git executable not found")
+            return None
+        except Exception as exc:
+            logger.error(f"git error: {exc}")
+            return None
+
+        timer = threading.Timer(30, proc.kill)
+        timer.start()
+        try:
+            stdout = proc.stdout.read(max_bytes)
+            truncated = len(stdout) == max_bytes and proc.stdout.read(1) != b""
+            if truncated:
+                proc.kill()
+            stderr = proc.stderr.read()
+            returncode = proc.wait()
+        except Exception as exc:
+            proc.kill()
+            logger.error(f"git error: {exc}")
+            return None
+        finally:
+            timer.cancel()
+            proc.stdout.close()
+            proc.stderr.close()
+
+        if check and not truncated and returncode != 0:
+            stderr_text = stderr.decode("utf-8", errors="replace").strip()
+            logger.warning(f"git command failed ({returncode}): {stderr_text}")
+            return None
+        return stdout.strip().decode("utf-8", errors="replace")
+
+    def _run_git_lines(self, *args: str, sep: bytes = b"\n") -> Iterator[str]:
+        """
+        Execute a git command and yield its non-empty output records.
+
+        Output is consumed from the pipe incrementally, so only one
+        read chunk is held in memory at a time instead of the whole
+        stdout plus its split copy. Streamed commands are never memoized
+        by :meth:`request_scope`.
+
+        Args:
+            *args: Arguments passed after ``git``.
+            sep: Record separator (``b"\\0"`` for ``-z`` output).
+
+        Yields:
+            Stripped, decoded records.
+        """
+        cmd = self._git_cmd + list(args)
+        logger.debug(f"Running: {' '.join(cmd)}")
+        try:
+            proc = subprocess.Popen(
+                cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                **self._popen_kwargs,
+            )
+        except FileNotFoundError:
+            logger.error("git executable not found")
+            return
+        except Exception as exc:
+            logger.error(f"git error: {exc}")
+            return
+
+        timer = threading.Timer(30, proc.kill)
+        timer.start()
+        finished = False
+        try:
+            pending = b""
+            for chunk in iter(lambda: proc.stdout.read(65536), b""):
+                records = (pending + chunk).split(sep)
+                pending = records.pop()
+                for record in records:
+                    record = record.strip()
+                    if record:
+                        yield record.decode("utf-8", errors="replace")
+            pending = pending.strip()
+            if pending:
+                yield pending.decode("utf-8", errors="replace")
+            finished = True
+        finally:
+            timer.cancel()
+            proc.stdout.close()
+            # Not finished means the caller stopped iterating early; git
+            # may still be exiting after EOF, so poll() cannot tell
+            if not finished:
+                proc.kill()
+            returncode = proc.wait()
+            if returncode != 0 and finished:
+                logger.warning(f"git command failed ({returncode}): {' '.join(args)}")
+
+    def repo_stamp(self) -> tuple[Optional[int], Optional[int]]:
+        """
+        Return the mtimes of the git directory's ``HEAD`` and ``index``.
+
+        The stamp changes whenever a commit, checkout or ``git add`` could
+        have changed branch state or the set of tracked files.
+        """
+        stamp = []
+        for name in ("HEAD", "index"):
+            path = os.path.join(self._git_dir or self.repo_path, name)
+            try:
+                stamp.append(os.stat(path).st_mtime_ns)
+            except OSError:
+                stamp.append(None)
+        return tuple(stamp)
+
+    def invalidate_cache(self) -> None:
+        """Drop all cached read results."""
+        with self._cache_lock:
+            self._cache.clear()
+        memo = self._request_memo.get()
+        if memo is not None:
+            memo.clear()
+
+    @contextlib.contextmanager
+    def request_scope(self):
+        """
+        Memoize read-only git commands for the duration of a request.
+
+        Identical read commands issued inside the scope (for example the
+        same ``diff`` requested by two helpers) spawn git only once. The
+        memo lives in a context variable, so concurrent requests on other
+        threads or tasks never see each other's output; work handed to
+        :meth:`submit` inherits the caller's memo. A nested scope reuses
+        the outer one. Only :meth:`_run_git` output is memoized; streamed
+        listings from :meth:`_run_git_lines` always run git.
+        """
+        if self._request_memo.get() is not None:
+            yield self
+            return
+        token = self._request_memo.set({})
+        try:
+            yield self
+        finally:
+            self._request_memo.reset(token)
+
+    def _run_git_async(self, *args: str, check: bool = True) -> Future:
+        """
+        Execute a git command on the worker pool.
+
+        Returns:
+            Future resolving to the result of :meth:`_run_git`.
+        """
+        return self.submit(self._run_git, *args, check=check)
+
+    def submit(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+        """
+        Run a GitContext method on the worker pool.
+
+        Lets callers overlap independent git queries; each subprocess
+        releases the GIL while it waits, so wall time is the slowest
+        call rather than the sum.
+
+        Args:
+            fn: Callable to run (typically a bound GitContext method).
+            *args: Positional arguments for *fn*.
+            **kwargs: Keyword arguments for *fn*.
+
+        Returns:
+            Future resolving to the return value of *fn*.
+        """
+        # Run in a copy of the caller's context so request_scope carries over
+        return self._pool.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+    def close(self) -> None:
+        """Release background resources held by this context."""
+        self._pool.shutdown(wait=False)
+        self._batch.close()
+
+    def __del__(self) -> None:
+        try:
+            self.close()
+        except Exception:
+            pass
+
     def is_git_repo(self) -> bool:
         """Return True if the repo_path is inside a git repository."""
-        return self._run_git("rev-parse", "--is-inside-work-tree") == "true"
+        # Resolved once by _resolve_repo; no need to ask git again
+        return self._work_tree is not None
 
     # ------------------------------------------------------------------
     # Branch operations
     # ------------------------------------------------------------------
 
+    @_cached
+    def _list_refs(self, all_branches: bool = False) -> list[tuple[str, str, bool]]:
+        """
+        List branch refs with one ``git for-each-ref`` call.
+
+        Args:
+            all_branches: Include remote-tracking branches when True.
+
+        Returns:
+            List of ``(short_name, object_sha, is_current)`` tuples.
+        """
+        patterns = ["refs/heads"]
+        if all_branches:
+            patterns.append("refs/remotes")
+        # Tab-separated (%09) so the blank HEAD marker survives stripping
+        ref_format = "--format=%(objectname)%09%(HEAD)%09%(refname:short)"
+        refs = []
+        for line in self._run_git_lines("for-each-ref", ref_format, *patterns):
+            sha, marker, name = line.split("\t", 2)
+            refs.append((name, sha, marker == "*"))
+        return refs
+
+    @_cached
     def get_current_branch(self) -> Optional[str]:
         """Return the name of the currently checked-out branch."""
+        if self._repo is not None:
+            with self._repo_lock:
+                try:
+                    if self._repo.head_is_detached:
+                        return "HEAD"
+                    if not self._repo.head_is_unborn:
+                        return self._repo.head.shorthand
+                except pygit2.GitError as exc:
+                    logger.debug(f"pygit2 error: {exc}")
+
+        for name, _, is_current in self._list_refs():
+            if is_current:
+                return name
+        # Detached or unborn HEAD
         return self._run_git("rev-parse", "--abbrev-ref", "HEAD")
 
+    @_cached
     def list_branches(self, all_branches: bool = False) -> list[str]:
         """
         List branches.
@@ -91,13 +702,13 @@ class GitContext:
         Returns:
             Sorted list of branch names.
         """
-        args = ["branch", "--format=%(refname:short)"]
-        if all_branches:
-            args.append("--all")
-        output = self._run_git(*args)
-        if not output:
-            return []
-        return sorted(line.strip() for line in output.splitlines() if line.strip())
+        if self._repo is not None:
+            with self._repo_lock:
+                branches = list(self._repo.branches.local)
+                if all_branches:
+                    branches.extend(self._repo.branches.remote)
+            return sorted(branches)
+        return sorted(name for name, _, _ in self._list_refs(all_branches))
 
     # ------------------------------------------------------------------
     # Diff / changed-file operations
@@ -109,6 +720,9 @@ class GitContext:
         target: Optional[str] = None,
         staged: bool = False,
         name_only: bool = False,
+        max_bytes: Optional[int] = None,
+        max_files: Optional[int] = None,
+        paths: Optional[list[str]] = None,
     ) -> Optional[str]:
         """
         Return a diff string.
@@ -123,6 +737,11 @@ class GitContext:
             target: Target ref.
             staged: Show staged changes instead of working-tree.
             name_only: Only list file names.
+            max_bytes: Read at most this many bytes of diff output; git is
+                       stopped once the limit is reached.
+            max_files: Only diff the files with the most changed lines, as
+                       ranked by a cheap ``--numstat`` pass first.
+            paths: Only diff these paths (see :meth:`rank_changed_files`).
 
         Returns:
             Diff text, or None on error.
@@ -136,7 +755,73 @@ class GitContext:
             args.append(base)
         if target:
             args.append(target)
-        return self._run_git(*args)
+
+        if max_files is not None:
+            ranked = self._rank_changed_files(args)
+            if ranked is None:
+                return None
+            paths = ranked[:max_files]
+        if paths is not None:
+            if not paths:
+                return ""
+            # numstat paths are relative to the work tree root, not to cwd
+            pathspecs = [f":(top,literal){path}" for path in paths]
+            args = [args[0], "--no-renames", *args[1:], "--", *pathspecs]
+
+        return self._run_git(*args, max_bytes=max_bytes)
+
+    def rank_changed_files(
+        self,
+        base: Optional[str] = None,
+        target: Optional[str] = None,
+        staged: bool = False,
+    ) -> Optional[list[str]]:
+        """
+        Return the changed paths, most added+deleted lines first.
+
+        See :meth:`get_diff` for parameter semantics.
+
+        Returns:
+            Paths in descending order of churn, or None on error.
+        """
+        args = ["diff"]
+        if staged:
+            args.append("--cached")
+        if base:
+            args.append(base)
+        if target:
+            args.append(target)
+        return self._rank_changed_files(args)
+
+    def _rank_changed_files(self, diff_args: list[str]) -> Optional[list[str]]:
+        """
+        Rank the paths in a change set by added+deleted lines.
+
+        Args:
+            diff_args: ``git diff`` arguments selecting the change set.
+
+        Returns:
+            Paths in descending order of churn, or None on error.
+        """
+        output = self._run_git(
+            diff_args[0], "--numstat", "--no-renames", "-z", *diff_args[1:]
+        )
+        if output is None:
+            return None
+
+        ranked = []
+        for record in output.split("\0"):
+            parts = record.strip("\n").split("\t", 2)
+            if len(parts) != 3:
+                continue
+            added, deleted, path = parts
+            # Binary files report "-" for both counts
+            churn = int(added) if added.isdigit() else 0
+            churn += int(deleted) if deleted.isdigit() else 0
+            ranked.append((churn, path))
+
+        ranked.sort(key=lambda item: -item[0])
+        return [path for _, path in ranked]
 
     def get_changed_files(
         self,
@@ -149,19 +834,37 @@ class GitContext:
 
         See :meth:`get_diff` for parameter semantics.
         """
-        output = self.get_diff(base=base, target=target, staged=staged, name_only=True)
-        if not output:
-            return []
-        return [f.strip() for f in output.splitlines() if f.strip()]
+        args = ["diff", "--name-only"]
+        if staged:
+            args.append("--cached")
+        if base:
+            args.append(base)
+        if target:
+            args.append(target)
+        return list(self._run_git_lines(*args))
+
+    def has_staged_changes(self) -> bool:
+        """
+        Return True if the index differs from HEAD.
 
-    def get_staged_diff(self) -> Optional[str]:
+        Uses ``git diff --cached --quiet``, which answers through its exit
+        code without producing any diff output.
+        """
+        return self._git_returncode("diff", "--cached", "--quiet") == 1
+
+    def get_staged_diff(
+        self,
+        max_bytes: Optional[int] = None,
+        max_files: Optional[int] = None,
+    ) -> Optional[str]:
         """Shortcut: return the staged (index) diff."""
-        return self.get_diff(staged=True)
+        return self.get_diff(staged=True, max_bytes=max_bytes, max_files=max_files)
 
     # ------------------------------------------------------------------
     # Commit log
     # ------------------------------------------------------------------
 
+    @_cached
     def get_commit_log(
         self,
         n: int = 10,
@@ -179,15 +882,28 @@ class GitContext:
         Returns:
             List of commit lines.
         """
+        if self._repo is not None and oneline:
+            with self._repo_lock:
+                try:
+                    start = self._repo.revparse_single(branch or "HEAD")
+                    walker = self._repo.walk(
+                        start.peel(pygit2.Commit).id, pygit2.GIT_SORT_TIME
+                    )
+                    commits = []
+                    for commit in itertools.islice(walker, n):
+                        summary = commit.message.split("\n", 1)[0]
+                        commits.append(f"{commit.short_id} {summary}")
+                    return commits
+                except (pygit2.GitError, KeyError, ValueError) as exc:
+                    logger.debug(f"pygit2 error: {exc}")
+                    return []
+
         args = ["log", f"-{n}"]
         if oneline:
             args.append("--oneline")
         if branch:
             args.append(branch)
-        output = self._run_git(*args)
-        if not output:
-            return []
-        return [line.strip() for line in output.splitlines() if line.strip()]
+        return list(self._run_git_lines(*args))
 
     def get_branch_commits(
         self,
@@ -208,26 +924,27 @@ class GitContext:
         """
         ref_range = f"{base}..{target}" if target else f"{base}..HEAD"
         args = ["log", "--oneline", f"-{n}", ref_range]
-        output = self._run_git(*args)
-        if not output:
-            return []
-        return [line.strip() for line in output.splitlines() if line.strip()]
+        return list(self._run_git_lines(*args))
 
     # ------------------------------------------------------------------
     # File listing
     # ------------------------------------------------------------------
 
+    @_cached
     def list_project_files(self) -> list[str]:
         """
         List all tracked files in the repository.
 
         Returns:
-            Sorted list of file paths relative to repository root.
+            Sorted list of file paths relative to repository root
+            (``git ls-files`` already emits index order, which is sorted).
         """
-        output = self._run_git("ls-files")
-        if not output:
-            return []
-        return sorted(line.strip() for line in output.splitlines() if line.strip())
+        if self._repo is not None and self._is_repo_root():
+            with self._repo_lock:
+                index = self._repo.index
+                index.read()
+                return [entry.path for entry in index]
+        return list(self._run_git_lines("ls-files", "-z", sep=b"\0"))
 
     # ------------------------------------------------------------------
     # File content helpers
@@ -244,24 +961,65 @@ class GitContext:
         Returns:
             File content string, or None on error.
         """
-        return self._run_git("show", f"{ref}:{path}")
+        if self._repo is not None:
+            with self._repo_lock:
+                try:
+                    obj = self._repo.revparse_single(f"{ref}:{path}")
+                except (pygit2.GitError, KeyError, ValueError):
+                    return None
+                if not isinstance(obj, pygit2.Blob):
+                    return None
+                data = obj.data
+        else:
+            data = self._batch.contents(f"{ref}:{path}")
+        if data is None:
+            return None
+        return data.decode("utf-8", errors="replace")
+
+    def get_file_size_at_ref(self, path: str, ref: str = "HEAD") -> Optional[int]:
+        """
+        Return the size in bytes of a file at a git ref without reading it.
+
+        Args:
+            path: Repository-relative file path.
+            ref: Git ref (branch, tag, commit SHA).
+
+        Returns:
+            Blob size, or None if the path is missing or not a file.
+        """
+        info = self._batch.info(f"{ref}:{path}")
+        if info is None or info[0] != "blob":
+            return None
+        return info[1]
 
     # ------------------------------------------------------------------
     # Summary helpers (used by the agent)
     # ------------------------------------------------------------------
 
+    @_cached
     def get_status_summary(self) -> dict:
         """
         Build a summary dict of the current repository state.
 
+        Branch and staged/unstaged files come from a single
+        ``git status --porcelain=v2`` call instead of one git process each;
+        it runs concurrently with the branch listing and commit log.
+
         Returns:
             Dictionary with keys: branch, branches, staged_files,
             unstaged_files, recent_commits.
         """
+        status = self._run_git_async(
+            "status", "--porcelain=v2", "--branch", "--untracked-files=no", "-z"
+        )
+        branches = self.submit(self.list_branches)
+        commits = self.submit(self.get_commit_log, n=5)
+
+        branch, staged, unstaged = _parse_porcelain_v2(status.result() or "")
         return {
-            "branch": self.get_current_branch(),
-            "branches": self.list_branches(),
-            "staged_files": self.get_changed_files(staged=True),
-            "unstaged_files": self.get_changed_files(),
-            "recent_commits": self.get_commit_log(n=5),
+            "branch": branch,
+            "branches": branches.result(),
+            "staged_files": staged,
+            "unstaged_files": unstaged,
+            "recent_commits": commits.result(),
         }
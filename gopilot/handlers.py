@@ -5,8 +5,14 @@ LSP Handlers - Completion and hover functionality
 from __future__ import annotations
 
 import logging
+import os
 import re
+import threading
+import time
+from array import array
+from collections.abc import Sequence
 from typing import Any, Optional, TYPE_CHECKING
+from urllib.parse import unquote
 
 from .ollama_client import OllamaClient
 
@@ -15,6 +21,122 @@ if TYPE_CHECKING:
 
 logger = logging.getLogger(__name__)
 
+# Markdown fences and chatty prefixes stripped from raw completions.
+_RE_FENCE_OPEN = re.compile(r"^```\w*\n?")
+_RE_FENCE_CLOSE = re.compile(r"\n?```$")
+_RE_PREFIX = re.compile(r"^(Completion:|Output:|Result:)\s*", re.IGNORECASE)
+
+# Identifier-like word for hover lookups
+_WORD_RE = re.compile(r"\w+")
+
+# Open-tab summary lines: Python imports and def/class signatures, and JS/TS
+# top-level declarations
+_PY_SUMMARY_RE = re.compile(
+    r"^[ \t]*(?:(?P<imp>(?:import|from) [^\n]*)"
+    r"|(?P<sig>(?:async def|def|class) [^:\n]*:))",
+    re.MULTILINE,
+)
+_JS_SUMMARY_RE = re.compile(
+    r"^[ \t]*((?:import|export|const|let|var) [^\n]*)", re.MULTILINE
+)
+
+# Constant fields of every completion item; copied and filled per response
+_COMPLETION_ITEM_TEMPLATE = {
+    "kind": 1,  # Text
+    "detail": "AI Completion (gopilot)",
+    "insertTextFormat": 1,  # PlainText
+}
+
+# Summary limits: imports are only looked for near the top of a file
+_SUMMARY_HEAD_LINES = 100
+_SUMMARY_MAX_LINES = 30
+
+# File extension -> language identifier used in prompts.
+EXT_MAP = {
+    ".py": "python",
+    ".js": "javascript",
+    ".ts": "typescript",
+    ".jsx": "javascript",
+    ".tsx": "typescript",
+    ".go": "go",
+    ".rs": "rust",
+    ".java": "java",
+    ".c": "c",
+    ".cpp": "cpp",
+    ".h": "c",
+    ".hpp": "cpp",
+    ".rb": "ruby",
+    ".php": "php",
+    ".lua": "lua",
+    ".sh": "bash",
+    ".bash": "bash",
+    ".zsh": "zsh",
+    ".sql": "sql",
+    ".html": "html",
+    ".css": "css",
+    ".json": "json",
+    ".yaml": "yaml",
+    ".yml": "yaml",
+    ".md": "markdown",
+    ".toml": "toml",
+}
+
+
+def _line_starts(text: str) -> array:
+    """
+    Return the offset at which each line of *text* begins.
+
+    Stored as a packed array: 8 bytes per line rather than a list of int
+    objects, which matters for documents kept open all session.
+    """
+    starts = array("q", [0])
+    starts.extend(m.end() for m in re.finditer("\n", text))
+    return starts
+
+
+def _line_offset(text: str, n: int) -> int:
+    """Return the offset where line *n* of *text* starts (or ``len(text)``)."""
+    offset = 0
+    for _ in range(n):
+        offset = text.find("\n", offset) + 1
+        if not offset:
+            return len(text)
+    return offset
+
+
+class _DocumentLines(Sequence):
+    """
+    Read-only line view over a document, backed by a line-start index.
+
+    Indexing or slicing only copies the requested lines, so looking at a
+    window around the cursor does not split the whole document.
+    """
+
+    def __init__(self, text: str, starts: Sequence[int]):
+        self.text = text
+        self.starts = starts
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def line_end(self, i: int) -> int:
+        """Offset just past the last character of line *i* (before its newline)."""
+        if i + 1 < len(self.starts):
+            return self.starts[i + 1] - 1
+        return len(self.text)
+
+    def _line(self, i: int) -> str:
+        return self.text[self.starts[i] : self.line_end(i)]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._line(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("line index out of range")
+        return self._line(index)
+
 
 class LSPHandlers:
     """Handlers for LSP requests using Ollama."""
@@ -22,6 +144,15 @@ class LSPHandlers:
     # Maximum number of project files to include in context (prevents overwhelming the model)
     MAX_PROJECT_FILES = 200
 
+    # Seconds to wait before calling Ollama, so a burst of keystrokes only
+    # completes at the last position
+    COMPLETION_DEBOUNCE = 0.05
+
+    # Character caps on the local scope, so long lines or a large
+    # context_lines cannot blow up the prompt
+    MAX_CODE_BEFORE_CHARS = 2000
+    MAX_CODE_AFTER_CHARS = 500
+
     def __init__(
         self,
         ollama_client: OllamaClient,
@@ -40,11 +171,36 @@ class LSPHandlers:
         self.git_context = git_context
         self.context_lines = context_lines
         self._document_store: dict[str, str] = {}
+        # uri -> (text, line starts), built lazily by _get_lines
+        self._line_starts: dict[str, tuple[str, array]] = {}
+        # uri -> (file path, language), parsed once per document
+        self._uri_info: dict[str, tuple[str, str]] = {}
+        # uri -> (hash of text, summary) for secondary context
+        self._summary_cache: dict[str, tuple[int, str]] = {}
+        # uri -> number of the latest completion request
+        self._completion_gen: dict[str, int] = {}
+        # uri -> (position key, cancel event) of the in-flight completion
+        self._inflight: dict[str, tuple[Any, threading.Event]] = {}
+        self._completion_lock = threading.Lock()
+        # (repo stamp, formatted listing) for the project scope
+        self._project_cache: Optional[tuple[Any, str]] = None
         logger.info(
             f"LSP handlers initialized (context_lines={context_lines}, "
             f"git_context={'enabled' if git_context else 'disabled'})"
         )
 
+    def set_git_context(self, git_context: Optional["GitContext"]) -> None:
+        """
+        Switch the repository used for project scope.
+
+        Open documents and their caches are kept.
+
+        Args:
+            git_context: New git context, or None to disable project scope
+        """
+        self.git_context = git_context
+        self._project_cache = None
+
     def store_document(self, uri: str, text: str) -> None:
         """
         Store document content for later reference.
@@ -53,7 +209,12 @@ class LSPHandlers:
             uri: Document URI
             text: Document content
         """
+        if self._document_store.get(uri) == text:
+            # Re-sent unchanged (didSave, cursor-only sync): keep the indexes
+            return
         self._document_store[uri] = text
+        # Indexed on first completion/hover, not on every keystroke
+        self._line_starts.pop(uri, None)
         logger.debug(f"Stored document: {uri} ({len(text)} chars)")
 
     def remove_document(self, uri: str) -> None:
@@ -63,6 +224,14 @@ class LSPHandlers:
         Args:
             uri: Document URI
         """
+        self._line_starts.pop(uri, None)
+        self._uri_info.pop(uri, None)
+        self._summary_cache.pop(uri, None)
+        with self._completion_lock:
+            self._completion_gen.pop(uri, None)
+            inflight = self._inflight.pop(uri, None)
+        if inflight is not None:
+            inflight[1].set()
         if uri in self._document_store:
             del self._document_store[uri]
             logger.debug(f"Removed document: {uri}")
@@ -79,6 +248,18 @@ class LSPHandlers:
         """
         return self._document_store.get(uri)
 
+    def _get_lines(self, uri: str, document: str) -> _DocumentLines:
+        """
+        Line view of a stored document, shared by completion and hover.
+
+        The line-start index is built on first use and reused until the
+        document text changes.
+        """
+        cached = self._line_starts.get(uri)
+        if cached is None or cached[0] is not document:
+            cached = self._line_starts[uri] = (document, _line_starts(document))
+        return _DocumentLines(document, cached[1])
+
     def _get_language_from_uri(self, uri: str) -> str:
         """
         Detect programming language from file extension.
@@ -89,38 +270,27 @@ class LSPHandlers:
         Returns:
             Language identifier
         """
-        ext_map = {
-            ".py": "python",
-            ".js": "javascript",
-            ".ts": "typescript",
-            ".jsx": "javascript",
-            ".tsx": "typescript",
-            ".go": "go",
-            ".rs": "rust",
-            ".java": "java",
-            ".c": "c",
-            ".cpp": "cpp",
-            ".h": "c",
-            ".hpp": "cpp",
-            ".rb": "ruby",
-            ".php": "php",
-            ".lua": "lua",
-            ".sh": "bash",
-            ".bash": "bash",
-            ".zsh": "zsh",
-            ".sql": "sql",
-            ".html": "html",
-            ".css": "css",
-            ".json": "json",
-            ".yaml": "yaml",
-            ".yml": "yaml",
-            ".md": "markdown",
-            ".toml": "toml",
-        }
-        for ext, lang in ext_map.items():
-            if uri.endswith(ext):
-                return lang
-        return "text"
+        ext = os.path.splitext(uri)[1].lower()
+        return EXT_MAP.get(ext, "text")
+
+    def _get_uri_info(self, uri: str) -> tuple[str, str]:
+        """
+        Return the file path and language for a document URI.
+
+        The result is cached until the document is closed.
+
+        Args:
+            uri: Document URI
+
+        Returns:
+            Tuple of (file path, language identifier)
+        """
+        info = self._uri_info.get(uri)
+        if info is None:
+            path = unquote(uri.removeprefix("file://"))
+            info = (path, self._get_language_from_uri(path))
+            self._uri_info[uri] = info
+        return info
 
     def _extract_current_line_prefix(self, line: str, char_pos: int) -> str:
         """
@@ -138,39 +308,51 @@ class LSPHandlers:
         return line[:char_pos]
 
     def _build_local_scope(
-        self, lines: list[str], line_num: int, char_num: int
+        self, lines: Sequence[str], line_num: int, char_num: int
     ) -> tuple[str, str, str]:
         """
         Build local scope context around cursor.
 
         Args:
-            lines: All document lines
+            lines: Document lines (a list or a ``_DocumentLines`` view)
             line_num: Current line number (0-indexed)
             char_num: Current character position
 
         Returns:
             Tuple of (code_before, code_after, cursor_prefix)
         """
+        if not isinstance(lines, _DocumentLines):
+            text = "\n".join(lines)
+            lines = _DocumentLines(text, _line_starts(text))
+        text = lines.text
+
         # Calculate range
         start_line = max(0, line_num - self.context_lines)
         end_line = min(len(lines), line_num + self.context_lines + 1)
+        if start_line >= len(lines):
+            return "", "", ""
 
-        # Build code before cursor (within local scope)
-        code_before_lines = lines[start_line:line_num]
+        # Slice both halves straight out of the document around the cursor
+        scope_start = lines.starts[start_line]
         if line_num < len(lines):
             cursor_prefix = lines[line_num][:char_num]
-            code_before_lines.append(cursor_prefix)
+            cursor = lines.starts[line_num] + len(cursor_prefix)
+            scope_end = lines.line_end(end_line - 1)
         else:
             cursor_prefix = ""
+            cursor = scope_end = lines.line_end(len(lines) - 1)
 
-        # Build code after cursor (within local scope)
-        code_after_lines = []
-        if line_num < len(lines):
-            code_after_lines.append(lines[line_num][char_num:])
-        code_after_lines.extend(lines[line_num + 1 : end_line])
+        # Apply the character caps, trimming back to whole lines when possible
+        if cursor - scope_start > self.MAX_CODE_BEFORE_CHARS:
+            cap = cursor - self.MAX_CODE_BEFORE_CHARS
+            scope_start = text.find("\n", cap, cursor) + 1 or cap
+        if scope_end - cursor > self.MAX_CODE_AFTER_CHARS:
+            cap = cursor + self.MAX_CODE_AFTER_CHARS
+            newline = text.rfind("\n", cursor, cap)
+            scope_end = newline if newline != -1 else cap
 
-        code_before = "\n".join(code_before_lines)
-        code_after = "\n".join(code_after_lines)
+        code_before = text[scope_start:cursor]
+        code_after = text[cursor:scope_end]
 
         return code_before, code_after, cursor_prefix
 
@@ -185,39 +367,36 @@ class LSPHandlers:
         Returns:
             Summary string with imports and signatures
         """
-        lines = text.split("\n")
         summary_lines = []
 
         # Language-specific patterns
         if language == "python":
-            # Combine iterations for efficiency - collect both imports and definitions
-            for i, line in enumerate(lines):
-                stripped = line.strip()
-                # Imports (typically in first 100 lines)
-                if i < 100 and stripped.startswith(("import ", "from ")):
-                    summary_lines.append(stripped)
-                # Function and class definitions (throughout file)
-                elif stripped.startswith(("def ", "class ", "async def ")):
-                    # Extract just the signature
-                    if ":" in stripped:
-                        sig = stripped.split(":")[0] + ":"
-                        summary_lines.append(sig)
+            head_end = _line_offset(text, _SUMMARY_HEAD_LINES)
+            for match in _PY_SUMMARY_RE.finditer(text):
+                if match.group("sig"):
+                    summary_lines.append(match.group("sig"))
+                elif match.start() < head_end:
+                    summary_lines.append(match.group("imp").rstrip())
+                if len(summary_lines) >= _SUMMARY_MAX_LINES:
+                    break
 
         elif language in ("javascript", "typescript"):
-            for line in lines[:100]:
-                stripped = line.strip()
-                if stripped.startswith(("import ", "export ", "const ", "let ", "var ")):
-                    summary_lines.append(stripped[:80])  # Limit length
+            head_end = _line_offset(text, _SUMMARY_HEAD_LINES)
+            for match in _JS_SUMMARY_RE.finditer(text, 0, head_end):
+                summary_lines.append(match.group(1).rstrip()[:80])  # Limit length
+                if len(summary_lines) >= _SUMMARY_MAX_LINES:
+                    break
 
         # Generic fallback - just grab first few non-empty lines
         if not summary_lines:
-            for line in lines[:20]:
+            # maxsplit keeps the rest of the file in one unsplit tail
+            for line in text.split("\n", 20)[:20]:
                 if line.strip():
                     summary_lines.append(line.strip()[:80])
                 if len(summary_lines) >= 10:
                     break
 
-        return "\n".join(summary_lines[:30])  # Max 30 lines
+        return "\n".join(summary_lines[:_SUMMARY_MAX_LINES])
 
     def _build_secondary_context(self, current_uri: str) -> str:
         """
@@ -235,16 +414,22 @@ class LSPHandlers:
         context_parts = []
         context_parts.append("=== Open Tabs (Secondary Context) ===")
 
-        for uri, text in self._document_store.items():
+        # Snapshot: completions run on worker threads while the transport
+        # thread opens, edits and closes documents
+        for uri, text in list(self._document_store.items()):
             if uri == current_uri:
                 continue
 
-            # Extract file path from URI
-            file_path = uri.replace("file://", "")
-            language = self._get_language_from_uri(uri)
+            file_path, language = self._get_uri_info(uri)
 
-            # Get summary
-            summary = self._extract_file_summary(text, language)
+            # Get summary, reusing it while the tab is unchanged
+            text_hash = hash(text)
+            cached = self._summary_cache.get(uri)
+            if cached and cached[0] == text_hash:
+                summary = cached[1]
+            else:
+                summary = self._extract_file_summary(text, language)
+                self._summary_cache[uri] = (text_hash, summary)
 
             context_parts.append(f"\n--- {file_path} ({language}) ---")
             if summary:
@@ -262,15 +447,22 @@ class LSPHandlers:
         if not self.git_context:
             return ""
 
+        # Tracked files only change with HEAD or the index
+        stamp = self.git_context.repo_stamp()
+        if self._project_cache and self._project_cache[0] == stamp:
+            return self._project_cache[1]
+
         files = self.git_context.list_project_files()
         if not files:
-            return ""
-
-        # Limit to reasonable number to avoid overwhelming the model with too many files
-        if len(files) > self.MAX_PROJECT_FILES:
-            files = files[:self.MAX_PROJECT_FILES]
+            result = ""
+        else:
+            # Cap the listing so it does not overwhelm the model
+            if len(files) > self.MAX_PROJECT_FILES:
+                files = files[:self.MAX_PROJECT_FILES]
+            result = "=== Project Files ===\n" + "\n".join(files)
 
-        return "=== Project Files ===\n" + "\n".join(files)
+        self._project_cache = (stamp, result)
+        return result
 
     def handle_completion(
         self,
@@ -295,12 +487,24 @@ class LSPHandlers:
         Returns:
             List of completion items
         """
+        position_key = (
+            hash(self._document_store.get(uri)),
+            position.get("line", 0),
+            position.get("character", 0),
+        )
+        generation, cancel = self._next_completion(uri, position_key)
+        if self.COMPLETION_DEBOUNCE:
+            time.sleep(self.COMPLETION_DEBOUNCE)
+        if self._is_superseded(uri, generation):
+            logger.debug(f"Completion at {uri} superseded before request")
+            return []
+
         document = self.get_document(uri)
         if not document:
             logger.warning(f"Document not found: {uri}")
             return []
 
-        lines = document.split("\n")
+        lines = self._get_lines(uri, document)
         line_num = position.get("line", 0)
         char_num = position.get("character", 0)
 
@@ -315,7 +519,7 @@ class LSPHandlers:
         # Build project scope (file listing)
         project_context = self._build_project_scope()
 
-        language = self._get_language_from_uri(uri)
+        language = self._get_uri_info(uri)[1]
 
         logger.debug(
             f"Completion request at {uri}:{line_num}:{char_num} ({language})"
@@ -335,12 +539,17 @@ class LSPHandlers:
             cursor_prefix=cursor_prefix,
             secondary_context=secondary_context,
             project_context=project_context,
+            cancel_token=cancel,
         )
 
         if not completion:
             logger.warning("No completion received from Ollama")
             return []
 
+        if self._is_superseded(uri, generation):
+            logger.debug(f"Dropping stale completion for {uri}")
+            return []
+
         # Clean up completion
         completion = self._clean_completion(completion)
 
@@ -348,25 +557,51 @@ class LSPHandlers:
             return []
 
         # Create completion item
-        items = [
-            {
-                "label": completion.split("\n")[0][:50] + "..."
-                if len(completion.split("\n")[0]) > 50
-                else completion.split("\n")[0],
-                "kind": 1,  # Text
-                "detail": "AI Completion (gopilot)",
-                "insertText": completion,
-                "insertTextFormat": 1,  # PlainText
-                "documentation": {
-                    "kind": "markdown",
-                    "value": f"```{language}\n{completion}\n```",
-                },
-            }
-        ]
+        item = _COMPLETION_ITEM_TEMPLATE.copy()
+        first_line = completion.split("\n", 1)[0]
+        item["label"] = first_line[:50] + "..." if len(first_line) > 50 else first_line
+        item["insertText"] = completion
+        item["documentation"] = {
+            "kind": "markdown",
+            "value": f"```{language}\n{completion}\n```",
+        }
+        items = [item]
 
         logger.debug(f"Returning {len(items)} completion items")
         return items
 
+    def _next_completion(
+        self, uri: str, key: Any = None
+    ) -> tuple[int, threading.Event]:
+        """
+        Register a new completion request for *uri*.
+
+        The previous request's cancel event is set, so its Ollama stream is
+        abandoned instead of decoding a completion nobody will see. A repeat
+        request with the same *key* (document and cursor position) shares
+        the previous event instead: the identical Ollama call already in
+        flight is joined rather than restarted.
+
+        Returns:
+            Tuple of (request number, cancel event for this request)
+        """
+        with self._completion_lock:
+            generation = self._completion_gen.get(uri, 0) + 1
+            self._completion_gen[uri] = generation
+            previous = self._inflight.get(uri)
+            if previous is not None and key is not None and previous[0] == key:
+                return generation, previous[1]
+            cancel = threading.Event()
+            self._inflight[uri] = (key, cancel)
+        if previous is not None:
+            previous[1].set()
+        return generation, cancel
+
+    def _is_superseded(self, uri: str, generation: int) -> bool:
+        """True if a newer completion request for *uri* has arrived."""
+        with self._completion_lock:
+            return self._completion_gen.get(uri, 0) != generation
+
     def _clean_completion(self, text: str) -> str:
         """
         Clean up completion text.
@@ -378,11 +613,11 @@ class LSPHandlers:
             Cleaned completion text
         """
         # Remove markdown code blocks if present
-        text = re.sub(r"^```\w*\n?", "", text)
-        text = re.sub(r"\n?```$", "", text)
+        text = _RE_FENCE_OPEN.sub("", text)
+        text = _RE_FENCE_CLOSE.sub("", text)
 
         # Remove common prefixes/artifacts
-        text = re.sub(r"^(Completion:|Output:|Result:)\s*", "", text, flags=re.IGNORECASE)
+        text = _RE_PREFIX.sub("", text)
 
         # Strip leading/trailing whitespace but preserve indentation
         lines = text.split("\n")
@@ -416,7 +651,7 @@ class LSPHandlers:
             logger.warning(f"Document not found: {uri}")
             return None
 
-        lines = document.split("\n")
+        lines = self._get_lines(uri, document)
         line_num = position.get("line", 0)
 
         if line_num >= len(lines):
@@ -435,7 +670,7 @@ class LSPHandlers:
         end_line = min(len(lines), line_num + 5)
         context = "\n".join(lines[start_line:end_line])
 
-        language = self._get_language_from_uri(uri)
+        language = self._get_uri_info(uri)[1]
 
         logger.debug(f"Hover request for '{word}' at {uri}:{line_num}:{char_num}")
 
@@ -473,14 +708,9 @@ class LSPHandlers:
         if not line or char < 0 or char > len(line):
             return ""
 
-        # Find word boundaries
-        start = char
-        end = char
-
-        while start > 0 and (line[start - 1].isalnum() or line[start - 1] == "_"):
-            start -= 1
-
-        while end < len(line) and (line[end].isalnum() or line[end] == "_"):
-            end += 1
-
-        return line[start:end]
+        for match in _WORD_RE.finditer(line):
+            if match.start() > char:
+                break
+            if char <= match.end():
+                return match.group()
+        return ""
@@ -1,25 +1,163 @@
 """
 Ollama Client - HTTP client for localhost:11434
+
+Requests reuse a keep-alive connection per thread. The ``*_async``
+variants run the same calls on worker threads so an event loop can keep
+several generations in flight.
 """
 
+import asyncio
+import concurrent.futures
+import functools
+import hashlib
+import http.client
 import json
 import logging
-from typing import Optional
-from urllib.request import Request, urlopen
+import socket
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Callable, Iterator, Optional, Union
 from urllib.error import URLError, HTTPError
 
+try:
+    # Optional: faster JSON that reads and writes bytes directly
+    import orjson
+except ImportError:  # pragma: no cover - depends on environment
+    orjson = None
+
+try:
+    # Optional: incremental JSON parsing for the model listing
+    import ijson
+except ImportError:  # pragma: no cover - depends on environment
+    ijson = None
+
 logger = logging.getLogger(__name__)
 
+if orjson is not None:
+    _dumps = orjson.dumps
+    _loads = orjson.loads
+else:
+
+    def _dumps(obj: Any) -> bytes:
+        return json.dumps(obj).encode("utf-8")
+
+    def _loads(data: bytes) -> Any:
+        # json.loads detects UTF-8 bytes itself
+        return json.loads(data)
+
+
+# Responses remembered by generate (least recently used evicted first)
+_RESPONSE_CACHE_SIZE = 256
+
+# System prompts. The completion prompt only varies by language; the text
+# before the cursor is given in the user prompt, so the system prompt stays
+# identical across keystrokes.
+_SYSTEM_COMPLETE_TMPL = """You are a precise code completion assistant for {language}.
+Continue the code at [CURSOR HERE], right after the "Cursor position text".
+Never repeat code that already exists; keep the completion short.
+Match the existing style and indentation.
+Output only the code to insert: no explanations, comments or markdown."""
+
+_SYSTEM_EXPLAIN = """You are a code documentation assistant.
+Provide brief, helpful explanations of code.
+Keep explanations concise (2-3 sentences max)."""
+
+# Generation limits. Completions are a few lines and explanations 2-3
+# sentences, so cap decoding instead of running to the model's default
+# length. A blank-line run or a fence at the start of a line ends a
+# completion; an opening fence (``` + language) as the very first output
+# is let through and stripped by the handlers.
+_COMPLETE_OPTIONS = {
+    "num_predict": 128,
+    "temperature": 0.2,
+    "top_p": 0.9,
+    "stop": ["\n\n\n", "\n```"],
+}
+_EXPLAIN_OPTIONS = {"num_predict": 120}
+
+
+def _iter_ndjson(stream: Any, bufsize: int = 65536) -> Iterator[bytes]:
+    """
+    Yield newline-delimited records from a binary HTTP response.
+
+    ``read1`` returns whatever has arrived (up to *bufsize*) without
+    waiting for a full buffer, so records still surface as soon as Ollama
+    sends them, but a burst of chunks costs one read instead of one
+    ``readline`` each.
+    """
+    buf = bytearray()
+    while True:
+        data = stream.read1(bufsize)
+        if not data:
+            break
+        buf.extend(data)
+        if b"\n" not in data:
+            continue
+        *lines, rest = buf.split(b"\n")
+        buf = bytearray(rest)
+        yield from lines
+    if buf:
+        yield bytes(buf)
+
+
+def _head(text: str, limit: int) -> str:
+    """First *limit* characters of *text*, cut back to a line boundary."""
+    if len(text) <= limit:
+        return text
+    cut = text.rfind("\n", 0, limit)
+    return text[: cut if cut > 0 else limit]
+
+
+def _tail(text: str, limit: int) -> str:
+    """Last *limit* characters of *text*, cut forward to a line boundary."""
+    if len(text) <= limit:
+        return text
+    start = len(text) - limit
+    cut = text.find("\n", start)
+    return text[cut + 1 if cut != -1 else start :]
+
+
+@functools.lru_cache(maxsize=32)
+def _complete_system(language: str) -> str:
+    """Completion system prompt for *language*, formatted once per language."""
+    return _SYSTEM_COMPLETE_TMPL.format(language=language)
+
+
+class _NoDelayConnection(http.client.HTTPConnection):
+    """HTTPConnection with Nagle's algorithm disabled.
+
+    Ollama streams one small NDJSON line per token; with Nagle and delayed
+    ACKs those writes can stall for tens of milliseconds.
+    """
+
+    def connect(self) -> None:
+        super().connect()
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+
 
 class OllamaClient:
     """HTTP client for interacting with Ollama API."""
 
+    # Character budgets for each complete_code prompt section. Prefill time
+    # grows with prompt length, so lower-priority layers get less room.
+    MAX_BEFORE_CHARS = 4000
+    MAX_AFTER_CHARS = 1500
+    MAX_SECONDARY_CHARS = 2000
+    MAX_PROJECT_CHARS = 500
+    # Seconds a successful /api/tags answer is reused without asking again
+    HEALTH_TTL = 2.0
+
     def __init__(
         self,
         host: str = "localhost",
         port: int = 11434,
         model: str = "codellama",
         timeout: int = 30,
+        warmup: bool = False,
+        keep_alive: Union[str, int] = "30m",
     ):
         """
         Initialize Ollama client.
@@ -29,66 +167,280 @@ class OllamaClient:
             port: Ollama server port
             model: Default model to use
             timeout: Request timeout in seconds
+            warmup: Start loading the default model in the background
+                    (see :meth:`warmup`)
+            keep_alive: How long Ollama keeps a model loaded after each
+                        request unless the call overrides it. Ollama's own
+                        default of 5 minutes unloads it between sporadic
+                        completions
         """
         self.base_url = f"http://{host}:{port}"
+        self.host = host
+        self.port = port
         self.model = model
         self.timeout = timeout
-        logger.info(f"Ollama client initialized: {self.base_url}, model={model}")
+        self.keep_alive = keep_alive
+        # One keep-alive connection per thread; http.client is not thread-safe
+        self._local = threading.local()
+        self._connections: weakref.WeakSet = weakref.WeakSet()
+        self._connections_lock = threading.Lock()
+        # Request digest -> response text, for repeat prompts
+        self._response_cache: OrderedDict[bytes, str] = OrderedDict()
+        self._response_cache_lock = threading.Lock()
+        # (monotonic time, model names) of the last successful /api/tags
+        self._tags: Optional[tuple[float, list]] = None
+        # request key -> future of the identical request already in flight
+        self._pending: dict[bytes, concurrent.futures.Future] = {}
+        logger.info("Ollama client initialized: %s, model=%s", self.base_url, model)
+        if warmup:
+            self.warmup()
+
+    def warmup(self) -> threading.Thread:
+        """
+        Load the default model in a background thread.
+
+        Ollama loads model weights on the first request, which can take
+        seconds; preloading right away moves that cost off the user's
+        first completion.
+
+        Returns:
+            The started daemon thread
+        """
+        thread = threading.Thread(
+            target=self.preload, name="ollama-warmup", daemon=True
+        )
+        thread.start()
+        return thread
 
-    def _make_request(self, endpoint: str, data: dict) -> Optional[dict]:
+    def preload(self, model: Optional[str] = None) -> bool:
+        """
+        Load *model* (default: the client's model) and keep it resident
+        for ``keep_alive``.
+
+        Sends a generate request without a prompt, which Ollama treats as
+        load-only.
+
+        Returns:
+            True if Ollama accepted the request
+        """
+        model = model or self.model
+        data = {"model": model, "keep_alive": self.keep_alive, "stream": False}
+        if self._make_request("/api/generate", data) is None:
+            return False
+        logger.info("Model loaded: %s (keep_alive=%s)", model, self.keep_alive)
+        return True
+
+    def _connection(self) -> http.client.HTTPConnection:
+        """Return this thread's persistent connection to Ollama."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = _NoDelayConnection(self.host, self.port, timeout=self.timeout)
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.add(conn)
+        return conn
+
+    def _drop_connection(self) -> None:
+        """Close this thread's connection so the next request reconnects."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def _request(
+        self,
+        method: str,
+        endpoint: str,
+        data: Optional[dict] = None,
+        timeout: Optional[float] = None,
+    ) -> http.client.HTTPResponse:
+        """
+        Send a request over the keep-alive connection.
+
+        A connection the server closed while idle is reopened once.
+
+        Raises:
+            HTTPError on a non-200 status, URLError on connection failures,
+            TimeoutError on timeouts
+        """
+        body = _dumps(data) if data is not None else None
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        timeout = self.timeout if timeout is None else timeout
+
+        for attempt in range(2):
+            conn = self._connection()
+            conn.timeout = timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(timeout)
+            reused = conn.sock is not None
+            try:
+                conn.request(method, endpoint, body=body, headers=headers)
+                response = conn.getresponse()
+            except TimeoutError:
+                self._drop_connection()
+                raise
+            except (http.client.HTTPException, OSError) as e:
+                self._drop_connection()
+                if reused and attempt == 0:
+                    continue
+                raise URLError(e) from e
+            break
+
+        if response.status != 200:
+            response.read()
+            raise HTTPError(
+                f"{self.base_url}{endpoint}",
+                response.status,
+                response.reason,
+                response.headers,
+                None,
+            )
+        return response
+
+    def _stream_request(
+        self,
+        endpoint: str,
+        data: dict,
+        cancel: Optional[threading.Event] = None,
+    ) -> Iterator[str]:
+        """
+        POST to Ollama and yield ``response`` fragments as they arrive.
+
+        Args:
+            endpoint: API endpoint (e.g., '/api/generate')
+            data: Request payload
+            cancel: When set, stop reading at the next chunk and drop the
+                    connection so Ollama stops generating
+
+        Yields:
+            Response text fragments
+
+        Raises:
+            HTTPError, URLError, TimeoutError on transport failures
+        """
+        response = self._request("POST", endpoint, data)
+        finished = False
+        try:
+            for line in _iter_ndjson(response):
+                if cancel is not None and cancel.is_set():
+                    return
+                if line:
+                    try:
+                        chunk = _loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if chunk.get("response"):
+                        yield chunk["response"]
+                    if chunk.get("done", False):
+                        break
+            # Consume the end of the chunked body so the connection is reusable
+            response.read()
+            finished = True
+        finally:
+            if not finished:
+                # Abandoned mid-stream: unread body would corrupt the next request
+                self._drop_connection()
+
+    def close(self) -> None:
+        """Close every open connection to Ollama; later requests reconnect."""
+        with self._connections_lock:
+            connections = list(self._connections)
+        for conn in connections:
+            conn.close()
+
+    def __enter__(self) -> "OllamaClient":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _log_request_error(self, error: Exception) -> None:
+        """Log a failed Ollama request."""
+        if isinstance(error, HTTPError):
+            logger.error("HTTP error: %s - %s", error.code, error.reason)
+        elif isinstance(error, URLError):
+            logger.error("URL error: %s", error.reason)
+        elif isinstance(error, TimeoutError):
+            logger.error("Request timed out after %ss", self.timeout)
+        else:
+            logger.error("Unexpected error: %s", error)
+
+    def _make_request(
+        self,
+        endpoint: str,
+        data: dict,
+        on_chunk: Optional[Callable[[str], None]] = None,
+        cancel: Optional[threading.Event] = None,
+    ) -> Optional[dict]:
         """
         Make a synchronous HTTP request to Ollama API.
 
         Args:
             endpoint: API endpoint (e.g., '/api/generate')
             data: Request payload
+            on_chunk: Called with each fragment of a streamed response
+            cancel: Abandons a streamed response once set
 
         Returns:
-            Response data or None on error
+            Response data or None on error or cancellation
         """
-        url = f"{self.base_url}{endpoint}"
-        headers = {"Content-Type": "application/json"}
-
         try:
-            request = Request(
-                url,
-                data=json.dumps(data).encode("utf-8"),
-                headers=headers,
-                method="POST",
-            )
-            with urlopen(request, timeout=self.timeout) as response:
-                # Handle streaming response - collect all chunks
-                full_response = ""
-                for line in response:
-                    if line:
-                        try:
-                            chunk = json.loads(line.decode("utf-8"))
-                            if "response" in chunk:
-                                full_response += chunk["response"]
-                            if chunk.get("done", False):
-                                break
-                        except json.JSONDecodeError:
-                            continue
-                return {"response": full_response}
-        except HTTPError as e:
-            logger.error(f"HTTP error: {e.code} - {e.reason}")
-            return None
-        except URLError as e:
-            logger.error(f"URL error: {e.reason}")
-            return None
-        except TimeoutError:
-            logger.error(f"Request timed out after {self.timeout}s")
-            return None
+            if not data.get("stream", False):
+                response = self._request("POST", endpoint, data)
+                result = _loads(response.read())
+                return {"response": result.get("response", "")}
+            # Handle streaming response - collect all chunks
+            parts: list[str] = []
+            for fragment in self._stream_request(endpoint, data, cancel):
+                parts.append(fragment)
+                if on_chunk:
+                    on_chunk(fragment)
+            if cancel is not None and cancel.is_set():
+                logger.debug("Request cancelled")
+                return None
+            return {"response": "".join(parts)}
         except Exception as e:
-            logger.error(f"Unexpected error: {e}")
+            self._log_request_error(e)
             return None
 
+    def _generate_payload(
+        self,
+        prompt: str,
+        model: Optional[str],
+        system: Optional[str],
+        options: Optional[dict],
+        keep_alive: Optional[Union[str, int]],
+        stream: bool = False,
+    ) -> dict:
+        """Build the ``/api/generate`` request body."""
+        data = {
+            "model": model or self.model,
+            "prompt": prompt,
+            "stream": stream,
+        }
+
+        if system:
+            data["system"] = system
+
+        if options:
+            data["options"] = options
+
+        data["keep_alive"] = keep_alive if keep_alive is not None else self.keep_alive
+
+        return data
+
     def generate(
         self,
         prompt: str,
         model: Optional[str] = None,
         context: Optional[str] = None,
         system: Optional[str] = None,
+        options: Optional[dict] = None,
+        keep_alive: Optional[Union[str, int]] = None,
+        stream: bool = False,
+        stream_callback: Optional[Callable[[str], None]] = None,
+        cancel_token: Optional[threading.Event] = None,
+        cache: bool = False,
     ) -> Optional[str]:
         """
         Generate a completion from Ollama.
@@ -98,29 +450,186 @@ class OllamaClient:
             model: Model to use (defaults to client's default)
             context: Additional context for the prompt
             system: System prompt for the model
+            options: Model options (e.g. ``num_predict``, ``temperature``)
+            keep_alive: How long Ollama keeps the model (and its prompt
+                        cache) loaded after the request, e.g. ``"30m"``;
+                        ``-1`` keeps it loaded indefinitely. Defaults to
+                        the client's ``keep_alive``
+            stream: Ask Ollama for NDJSON chunks and join them here. The
+                    default waits for a single JSON body, which is cheaper
+                    when only the full text is wanted
+            stream_callback: Called with each text fragment as it arrives;
+                             implies ``stream``. The full text is still
+                             returned. A cached response is passed in one
+                             call
+            cancel_token: Setting this event abandons the request mid-stream
+                          (implies ``stream``); the result is then None
+            cache: Answer identical requests (model, system prompt, prompt
+                   and options) from an in-memory LRU cache, see
+                   :meth:`clear_cache`, and wait for an identical request
+                   still in flight instead of sending a second one. Off by
+                   default so callers can regenerate an answer; a streaming
+                   call never waits on another request's stream, and a
+                   waiter whose leader was cancelled or failed sends its
+                   own request
 
         Returns:
             Generated text or None on error
         """
-        data = {
-            "model": model or self.model,
-            "prompt": prompt,
-            "stream": True,
-        }
-
-        if system:
-            data["system"] = system
-
         if context:
-            data["prompt"] = f"{context}\n\n{prompt}"
-
-        logger.debug(f"Generating completion for prompt: {prompt[:100]}...")
-        result = self._make_request("/api/generate", data)
-
+            prompt = f"{context}\n\n{prompt}"
+        data = self._generate_payload(
+            prompt,
+            model,
+            system,
+            options,
+            keep_alive,
+            stream or stream_callback is not None or cancel_token is not None,
+        )
+
+        if not cache:
+            return self._send_generate(data, stream_callback, cancel_token)
+
+        key = hashlib.blake2b(
+            "\0".join(
+                (data["model"], system or "", prompt, repr(options))
+            ).encode("utf-8"),
+            digest_size=16,
+        ).digest()
+        flight = None
+        while True:
+            with self._response_cache_lock:
+                cached = self._response_cache.get(key)
+                if cached is not None:
+                    self._response_cache.move_to_end(key)
+                    break
+                pending = self._pending.get(key)
+                if pending is None:
+                    flight = self._pending[key] = concurrent.futures.Future()
+                    break
+                if stream_callback is not None:
+                    # Fragments must reach this caller as they arrive
+                    break
+            logger.debug("Joining identical in-flight request")
+            cached = pending.result()
+            if cached is not None:
+                break
+            if cancel_token is not None and cancel_token.is_set():
+                return None
+            # The leader was cancelled or failed; ask on our own behalf
+
+        if cached is not None:
+            logger.debug("Response cache hit")
+            if stream_callback:
+                stream_callback(cached)
+            return cached
+
+        response = None
+        try:
+            response = self._send_generate(data, stream_callback, cancel_token)
+        finally:
+            with self._response_cache_lock:
+                if flight is not None:
+                    del self._pending[key]
+                if response:
+                    self._response_cache[key] = response
+                    if len(self._response_cache) > _RESPONSE_CACHE_SIZE:
+                        self._response_cache.popitem(last=False)
+            if flight is not None:
+                flight.set_result(response or None)
+        return response
+
+    def _send_generate(
+        self,
+        data: dict,
+        stream_callback: Optional[Callable[[str], None]],
+        cancel_token: Optional[threading.Event],
+    ) -> Optional[str]:
+        """POST a ``/api/generate`` body and return the response text."""
+        logger.debug("Generating completion for prompt: %.100s...", data["prompt"])
+        result = self._make_request(
+            "/api/generate", data, stream_callback, cancel_token
+        )
         if result and "response" in result:
             return result["response"]
         return None
 
+    def clear_cache(self) -> None:
+        """Forget all cached responses."""
+        with self._response_cache_lock:
+            self._response_cache.clear()
+
+    def generate_stream(
+        self,
+        prompt: str,
+        model: Optional[str] = None,
+        system: Optional[str] = None,
+        options: Optional[dict] = None,
+        keep_alive: Optional[Union[str, int]] = None,
+    ) -> Iterator[str]:
+        """
+        Generate a completion, yielding text fragments as Ollama decodes them.
+
+        Errors are logged and end the stream early.
+
+        Args:
+            prompt: The prompt to complete
+            model: Model to use (defaults to client's default)
+            system: System prompt for the model
+            options: Model options (see :meth:`generate`)
+            keep_alive: Model residency after the request (see :meth:`generate`)
+
+        Yields:
+            Generated text fragments
+        """
+        data = self._generate_payload(
+            prompt, model, system, options, keep_alive, stream=True
+        )
+
+        logger.debug("Streaming completion for prompt: %.100s...", prompt)
+        try:
+            yield from self._stream_request("/api/generate", data)
+        except Exception as e:
+            self._log_request_error(e)
+
+    async def generate_async(self, prompt: str, **kwargs) -> Optional[str]:
+        """Run :meth:`generate` on a worker thread; same arguments."""
+        return await asyncio.to_thread(self.generate, prompt, **kwargs)
+
+    async def generate_stream_async(
+        self, prompt: str, **kwargs
+    ) -> AsyncIterator[str]:
+        """
+        Async version of :meth:`generate_stream`; same arguments.
+
+        The HTTP stream is read on a worker thread. Closing the iterator
+        early (e.g. when a newer request supersedes this one) stops the
+        read and drops the connection instead of decoding the rest.
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        stop = threading.Event()
+        done = object()
+
+        def pump() -> None:
+            stream = self.generate_stream(prompt, **kwargs)
+            try:
+                for fragment in stream:
+                    if stop.is_set():
+                        break
+                    loop.call_soon_threadsafe(queue.put_nowait, fragment)
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, done)
+                stream.close()
+
+        worker = loop.run_in_executor(None, pump)
+        try:
+            while (fragment := await queue.get()) is not done:
+                yield fragment
+        finally:
+            stop.set()
+            await worker
+
     def complete_code(
         self,
         code_before: str,
@@ -130,6 +639,8 @@ class OllamaClient:
         cursor_prefix: str = "",
         secondary_context: str = "",
         project_context: str = "",
+        stream_callback: Optional[Callable[[str], None]] = None,
+        cancel_token: Optional[threading.Event] = None,
     ) -> Optional[str]:
         """
         Generate code completion with layered context.
@@ -142,58 +653,46 @@ class OllamaClient:
             cursor_prefix: Exact text at cursor position for precise completion
             secondary_context: Context from other open tabs
             project_context: Project file listing
+            stream_callback: Called with each fragment as it is generated
+                             (see :meth:`generate`)
+            cancel_token: Set by the caller once the completion is no longer
+                          wanted, e.g. when the user typed on
 
         Returns:
             Code completion or None on error
         """
-        system_prompt = f"""You are a precise code completion assistant for {language}.
-
-CRITICAL RULES:
-1. Complete ONLY from the exact cursor position - do NOT repeat any code that already exists
-2. The cursor is at the end of: "{cursor_prefix}"
-3. Your completion should continue naturally from that exact point
-4. Do NOT include explanations, comments, or markdown - only the completion code
-5. Match the existing code style and indentation
-6. Keep completions focused and concise
+        system_prompt = _complete_system(language)
 
-Context priority:
-- PRIMARY: Local code around cursor (most important)
-- SECONDARY: Other open files (for imports/references)
-- TERTIARY: Project structure (for awareness)
-
-Only output the exact completion text that should be inserted at the cursor."""
-
-        # Build the prompt with layered context
-        prompt_parts = []
-
-        # Add secondary context if available
-        if secondary_context:
-            prompt_parts.append(secondary_context)
-
-        # Add project context if available (less priority)
-        if project_context:
-            prompt_parts.append(f"\n{project_context}")
-
-        # Add the main completion request (highest priority)
-        prompt_parts.append(f"\n=== Current File (Primary Context) ===")
-        prompt_parts.append(f"Language: {language}")
-        prompt_parts.append(f"\nCode before cursor:\n```{language}\n{code_before}")
-
-        if code_after:
-            prompt_parts.append(f"\n[CURSOR HERE]\n{code_after}")
-        else:
-            prompt_parts.append("\n[CURSOR HERE]")
-
-        prompt_parts.append("```")
+        # Keep every layer within its budget
+        code_before = _tail(code_before, self.MAX_BEFORE_CHARS)
+        code_after = _head(code_after, self.MAX_AFTER_CHARS)
+        secondary_context = _head(secondary_context, self.MAX_SECONDARY_CHARS)
+        project_context = _head(project_context, self.MAX_PROJECT_CHARS)
 
         # Truncate cursor_prefix for display to avoid prompt issues with very long lines
-        display_prefix = cursor_prefix[:100] if len(cursor_prefix) > 100 else cursor_prefix
-        prompt_parts.append(f"\nCursor position text: '{display_prefix}'")
-        prompt_parts.append("\nProvide ONLY the completion code (no explanations):")
-
-        prompt = "\n".join(prompt_parts)
-
-        return self.generate(prompt, model=model, system=system_prompt)
+        display_prefix = cursor_prefix[:100]
+
+        # Layered context: open tabs, then project files, then the current
+        # file (highest priority) with the cursor marked
+        prompt = (
+            (f"{secondary_context}\n" if secondary_context else "")
+            + (f"\n{project_context}\n" if project_context else "")
+            + f"\n=== Current File (Primary Context) ===\nLanguage: {language}\n"
+            f"\nCode before cursor:\n```{language}\n{code_before}\n\n[CURSOR HERE]"
+            + (f"\n{code_after}" if code_after else "")
+            + f"\n```\n\nCursor position text: '{display_prefix}'\n"
+            "\nProvide ONLY the completion code (no explanations):"
+        )
+
+        return self.generate(
+            prompt,
+            model=model,
+            system=system_prompt,
+            options=_COMPLETE_OPTIONS,
+            stream_callback=stream_callback,
+            cancel_token=cancel_token,
+            cache=True,
+        )
 
     def explain_code(
         self,
@@ -212,29 +711,62 @@ Only output the exact completion text that should be inserted at the cursor."""
         Returns:
             Explanation or None on error
         """
-        system_prompt = """You are a code documentation assistant.
-Provide brief, helpful explanations of code.
-Keep explanations concise (2-3 sentences max)."""
-
         prompt = f"Explain this {language} code briefly:\n```{language}\n{code}\n```"
 
-        return self.generate(prompt, model=model, system=system_prompt)
+        return self.generate(
+            prompt, model=model, system=_SYSTEM_EXPLAIN, options=_EXPLAIN_OPTIONS
+        )
+
+    async def complete_code_async(self, code_before: str, **kwargs) -> Optional[str]:
+        """Run :meth:`complete_code` on a worker thread; same arguments."""
+        return await asyncio.to_thread(self.complete_code, code_before, **kwargs)
+
+    async def explain_code_async(self, code: str, **kwargs) -> Optional[str]:
+        """Run :meth:`explain_code` on a worker thread; same arguments."""
+        return await asyncio.to_thread(self.explain_code, code, **kwargs)
+
+    def _fetch_tags(self) -> tuple[bool, list]:
+        """
+        GET ``/api/tags``, shared by :meth:`health_check` and
+        :meth:`list_models`.
+
+        A successful answer is reused for ``HEALTH_TTL`` seconds, so a
+        health check followed by a model listing costs one request.
+
+        Returns:
+            Tuple of (server reachable, model names)
+        """
+        now = time.monotonic()
+        tags = self._tags
+        if tags is not None and now - tags[0] < self.HEALTH_TTL:
+            return True, tags[1]
+        try:
+            response = self._request("GET", "/api/tags", timeout=5)
+            if ijson is not None:
+                # Stream the names out without building the whole listing
+                names = list(ijson.items(response, "models.item.name"))
+                response.read()
+            else:
+                data = _loads(response.read())
+                names = [m["name"] for m in data.get("models", [])]
+        except Exception as e:
+            self._tags = None
+            logger.warning("Failed to query Ollama models: %s", e)
+            return False, []
+        self._tags = (now, names)
+        return True, names
 
     def health_check(self) -> bool:
         """
         Check if Ollama server is available.
 
+        A success is remembered for ``HEALTH_TTL`` seconds, so frequent
+        polling does not hit the server every time.
+
         Returns:
             True if server is reachable, False otherwise
         """
-        try:
-            url = f"{self.base_url}/api/tags"
-            request = Request(url, method="GET")
-            with urlopen(request, timeout=5) as response:
-                return response.status == 200
-        except Exception as e:
-            logger.warning(f"Health check failed: {e}")
-            return False
+        return self._fetch_tags()[0]
 
     def list_models(self) -> list:
         """
@@ -243,12 +775,57 @@ Keep explanations concise (2-3 sentences max)."""
         Returns:
             List of model names
         """
-        try:
-            url = f"{self.base_url}/api/tags"
-            request = Request(url, method="GET")
-            with urlopen(request, timeout=5) as response:
-                data = json.loads(response.read().decode("utf-8"))
-                return [m["name"] for m in data.get("models", [])]
-        except Exception as e:
-            logger.error(f"Failed to list models: {e}")
-            return []
+        return list(self._fetch_tags()[1])
+
+
+class AsyncOllamaClient:
+    """
+    asyncio facade over :class:`OllamaClient`.
+
+    Each call runs on a worker thread with its own keep-alive connection,
+    so independent requests (a completion, a hover explanation and a health
+    check) overlap instead of queueing. The response cache is the wrapped
+    client's, shared with any synchronous callers.
+    """
+
+    def __init__(self, client: Optional[OllamaClient] = None, **kwargs):
+        """
+        Args:
+            client: Synchronous client to wrap; one is created from
+                    *kwargs* (host, port, model, timeout) when omitted
+        """
+        self.sync = client if client is not None else OllamaClient(**kwargs)
+
+    async def generate(self, prompt: str, **kwargs) -> Optional[str]:
+        """Async :meth:`OllamaClient.generate`."""
+        return await self.sync.generate_async(prompt, **kwargs)
+
+    def generate_stream(self, prompt: str, **kwargs) -> AsyncIterator[str]:
+        """Async :meth:`OllamaClient.generate_stream`."""
+        return self.sync.generate_stream_async(prompt, **kwargs)
+
+    async def complete_code(self, code_before: str, **kwargs) -> Optional[str]:
+        """Async :meth:`OllamaClient.complete_code`."""
+        return await self.sync.complete_code_async(code_before, **kwargs)
+
+    async def explain_code(self, code: str, **kwargs) -> Optional[str]:
+        """Async :meth:`OllamaClient.explain_code`."""
+        return await self.sync.explain_code_async(code, **kwargs)
+
+    async def health_check(self) -> bool:
+        """Async :meth:`OllamaClient.health_check`."""
+        return await asyncio.to_thread(self.sync.health_check)
+
+    async def list_models(self) -> list:
+        """Async :meth:`OllamaClient.list_models`."""
+        return await asyncio.to_thread(self.sync.list_models)
+
+    async def aclose(self) -> None:
+        """Close the wrapped client's connections."""
+        self.sync.close()
+
+    async def __aenter__(self) -> "AsyncOllamaClient":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
@@ -11,6 +11,7 @@ Options:
     --ollama-host Ollama server host (default: localhost)
     --ollama-port Ollama server port (default: 11434)
     --model       Ollama model to use (default: codellama)
+    --agent-model Ollama model for agent requests (default: --model)
     --log-file    Log file path (default: /tmp/gopilot.log)
     --log-level   Log level: DEBUG, INFO, WARNING, ERROR (default: INFO)
     --repo-path   Path to git repository (default: current directory)
@@ -19,13 +20,29 @@ Options:
 from __future__ import annotations
 
 import argparse
+import asyncio
+import atexit
+import functools
 import json
 import logging
-import sys
+import logging.handlers
+import os
+import queue
+import re
 import socket
+import sys
 import threading
-from typing import Any, Optional
+from concurrent.futures import Executor, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Optional
+from urllib.parse import unquote
+
+try:
+    # Optional: faster JSON that reads and writes bytes directly
+    import orjson
+except ImportError:  # pragma: no cover - depends on environment
+    orjson = None
 
+from . import __version__
 from .ollama_client import OllamaClient
 from .handlers import LSPHandlers
 from .git_context import GitContext
@@ -34,10 +51,61 @@ from .agent import CopilotAgent
 # Configure logger
 logger = logging.getLogger(__name__)
 
+if orjson is not None:
+    _dumps = orjson.dumps
+    _loads = orjson.loads
+else:
+
+    def _dumps(obj: Any) -> bytes:
+        return json.dumps(obj).encode("utf-8")
+
+    def _loads(data: bytes) -> Any:
+        # json.loads detects UTF-8 bytes itself
+        return json.loads(data)
+
+
+# LSP base-protocol header carrying the body size, matched at a line start
+_CONTENT_LENGTH_RE = re.compile(rb"^content-length[ \t]*:[ \t]*(\d+)", re.I | re.M)
+# Longest header line read before giving up on finding its end
+_MAX_HEADER_LINE = 1024
+
+# Request parallelism assumed when OLLAMA_NUM_PARALLEL is unset: one
+# generation per model at a time, so extra workers would only queue there
+_DEFAULT_OLLAMA_PARALLEL = 1
+
+# Static parts of the initialize result, built once (treat as read-only)
+_SERVER_INFO = {"name": "gopilot", "version": __version__}
+_SERVER_INFO_WITH_AGENT = {
+    **_SERVER_INFO,
+    "agentCapabilities": {
+        "actions": [
+            "query",
+            "review",
+            "commit_message",
+            "explain_diff",
+            "summarize_branch",
+            "status",
+            "multi",
+        ],
+    },
+}
+
+
+def _ollama_parallelism() -> int:
+    """Worker count for Ollama-bound requests, from ``OLLAMA_NUM_PARALLEL``."""
+    try:
+        return max(1, int(os.environ["OLLAMA_NUM_PARALLEL"]))
+    except (KeyError, ValueError):
+        return _DEFAULT_OLLAMA_PARALLEL
+
 
 class LSPServer:
     """Language Server Protocol server implementation."""
 
+    # Requests that wait on Ollama. Transports run these concurrently so
+    # Ollama can schedule them together instead of one after another.
+    CONCURRENT_METHODS = frozenset({"textDocument/completion", "textDocument/hover"})
+
     def __init__(
         self,
         ollama_host: str = "localhost",
@@ -45,6 +113,7 @@ class LSPServer:
         model: str = "codellama",
         repo_path: Optional[str] = None,
         context_lines: int = 50,
+        agent_model: Optional[str] = None,
     ):
         """
         Initialize LSP server.
@@ -55,6 +124,8 @@ class LSPServer:
             model: Default Ollama model
             repo_path: Path to the git repository (enables agent features)
             context_lines: Number of lines around cursor for local scope
+            agent_model: Ollama model for agent requests (e.g. a quantized
+                         tag); defaults to *model*
         """
         self.ollama_client = OllamaClient(
             host=ollama_host,
@@ -63,6 +134,7 @@ class LSPServer:
         )
 
         # Git-aware copilot agent
+        self.agent_model = agent_model
         self.git_context = GitContext(repo_path)
         self.agent: Optional[CopilotAgent] = None
         git_enabled = self.git_context.is_git_repo()
@@ -75,13 +147,38 @@ class LSPServer:
         )
 
         if git_enabled:
-            self.agent = CopilotAgent(self.ollama_client, self.git_context)
+            self.agent = CopilotAgent(
+                self.ollama_client, self.git_context, self.agent_model
+            )
             logger.info("Copilot agent enabled (git repository detected)")
         else:
             logger.info("Copilot agent disabled (not a git repository)")
 
         self._initialized = False
         self._shutdown_requested = False
+        self.exit_requested = False
+
+        # Workers for CONCURRENT_METHODS, capped at what Ollama runs in
+        # parallel so surplus requests wait here instead of inside Ollama
+        self.executor = ThreadPoolExecutor(
+            max_workers=_ollama_parallelism(), thread_name_prefix="gopilot-ollama"
+        )
+
+        # method -> (handler, sends a response, handler takes ``notify``)
+        self._dispatch: dict[str, tuple[Callable[..., Any], bool, bool]] = {
+            "initialize": (self._handle_initialize, True, False),
+            "initialized": (self._handle_initialized, False, False),
+            "shutdown": (self._handle_shutdown, True, False),
+            "exit": (self._handle_exit, False, False),
+            "textDocument/didOpen": (self._handle_did_open, False, False),
+            "textDocument/didChange": (self._handle_did_change, False, False),
+            "textDocument/didSave": (self._handle_did_save, False, False),
+            "textDocument/didClose": (self._handle_did_close, False, False),
+            "textDocument/completion": (self._handle_completion, True, False),
+            "textDocument/hover": (self._handle_hover, True, False),
+            "gopilot/agent": (self._handle_agent_request, True, True),
+            "$/cancelRequest": (self._handle_cancel_request, False, False),
+        }
 
         self._capabilities = {
             "textDocumentSync": {
@@ -95,63 +192,47 @@ class LSPServer:
             },
             "hoverProvider": True,
         }
-        logger.info(f"LSP server initialized with model: {model}")
+        logger.info("LSP server initialized with model: %s", model)
 
-    def handle_request(self, request: dict) -> Optional[dict]:
+    def handle_request(
+        self,
+        request: dict,
+        notify: Optional[Callable[[dict], None]] = None,
+    ) -> Optional[dict]:
         """
         Handle an incoming JSON-RPC request.
 
         Args:
             request: JSON-RPC request object
+            notify: Callback used to send notifications (e.g. ``$/progress``)
+                    to the client while the request is being handled
 
         Returns:
             JSON-RPC response or None for notifications
         """
         method = request.get("method", "")
-        params = request.get("params", {})
         request_id = request.get("id")
 
-        logger.debug(f"Handling request: {method}")
+        logger.debug("Handling request: %s", method)
 
-        # Method dispatch
-        if method == "initialize":
-            result = self._handle_initialize(params)
-        elif method == "initialized":
-            self._handle_initialized()
-            return None  # Notification, no response
-        elif method == "shutdown":
-            result = self._handle_shutdown()
-        elif method == "exit":
-            self._handle_exit()
-            return None
-        elif method == "textDocument/didOpen":
-            self._handle_did_open(params)
-            return None
-        elif method == "textDocument/didChange":
-            self._handle_did_change(params)
-            return None
-        elif method == "textDocument/didSave":
-            self._handle_did_save(params)
-            return None
-        elif method == "textDocument/didClose":
-            self._handle_did_close(params)
-            return None
-        elif method == "textDocument/completion":
-            result = self._handle_completion(params)
-        elif method == "textDocument/hover":
-            result = self._handle_hover(params)
-        elif method == "gopilot/agent":
-            result = self._handle_agent_request(params)
-        elif method == "$/cancelRequest":
-            return None  # Ignore cancel requests
-        else:
-            logger.warning(f"Unknown method: {method}")
+        entry = self._dispatch.get(method)
+        if entry is None:
+            logger.warning("Unknown method: %s", method)
             if request_id is not None:
                 return self._create_error_response(
                     request_id, -32601, f"Method not found: {method}"
                 )
             return None
 
+        handler, has_result, takes_notify = entry
+        params = request.get("params", {})
+        if takes_notify:
+            result = handler(params, notify)
+        else:
+            result = handler(params)
+        if not has_result:
+            return None  # Notification, no response
+
         if request_id is not None:
             return self._create_response(request_id, result)
         return None
@@ -160,73 +241,84 @@ class LSPServer:
         """Handle initialize request."""
         logger.info("Received initialize request")
         root_uri = params.get("rootUri", params.get("rootPath", ""))
-        logger.info(f"Root URI: {root_uri}")
+        logger.info("Root URI: %s", root_uri)
 
         # Update git context repo path from the client root if available
-        if root_uri:
-            repo_path = root_uri.removeprefix("file://")
+        repo_path = unquote(root_uri.removeprefix("file://")) if root_uri else ""
+        # Same repository as at startup (the usual case): keep the warm
+        # GitContext and agent instead of rebuilding them
+        if repo_path and os.path.realpath(repo_path) != os.path.realpath(
+            self.git_context.repo_path
+        ):
+            old_context = self.git_context
             self.git_context = GitContext(repo_path)
             git_enabled = self.git_context.is_git_repo()
 
-            # Reinitialize handlers with updated git context
-            self.handlers = LSPHandlers(
-                self.ollama_client,
-                git_context=self.git_context if git_enabled else None,
-                context_lines=self.handlers.context_lines,
-            )
+            # Keep the handlers (open documents, caches) and the Ollama
+            # client's connections; only the repository changes
+            self.handlers.set_git_context(self.git_context if git_enabled else None)
 
             if git_enabled:
-                self.agent = CopilotAgent(self.ollama_client, self.git_context)
-                logger.info(f"Copilot agent enabled for: {repo_path}")
-
-        result = {
-            "capabilities": self._capabilities,
-            "serverInfo": {
-                "name": "gopilot",
-                "version": "0.1.0",
-            },
-        }
+                self.agent = CopilotAgent(
+                    self.ollama_client, self.git_context, self.agent_model
+                )
+                logger.info("Copilot agent enabled for: %s", repo_path)
+            else:
+                self.agent = None
+
+            # Nothing points at the old context any more: stop its
+            # cat-file session and worker pool
+            old_context.close()
 
         # Advertise agent capabilities
-        if self.agent:
-            result["serverInfo"]["agentCapabilities"] = {
-                "actions": [
-                    "query",
-                    "review",
-                    "commit_message",
-                    "explain_diff",
-                    "summarize_branch",
-                    "status",
-                ],
-            }
-
-        return result
-
-    def _handle_initialized(self) -> None:
+        server_info = _SERVER_INFO_WITH_AGENT if self.agent else _SERVER_INFO
+        return {"capabilities": self._capabilities, "serverInfo": server_info}
+
+    def _handle_initialized(self, params: dict) -> None:
         """Handle initialized notification."""
         self._initialized = True
         logger.info("Server initialized successfully")
 
-        # Check Ollama connection
-        if self.ollama_client.health_check():
-            logger.info("Ollama server is available")
+        # Check Ollama off the request loop; the editor need not wait for it
+        threading.Thread(
+            target=self._warmup_ollama, name="gopilot-warmup", daemon=True
+        ).start()
+
+    def _warmup_ollama(self) -> None:
+        """Check the Ollama connection and load the model ahead of use."""
+        if not self.ollama_client.health_check():
+            logger.warning("Ollama server is not available")
+            return
+        logger.info("Ollama server is available")
+        if logger.isEnabledFor(logging.INFO):
+            # Answered from the health check's /api/tags response
             models = self.ollama_client.list_models()
             if models:
-                logger.info(f"Available models: {', '.join(models)}")
-        else:
-            logger.warning("Ollama server is not available")
+                logger.info("Available models: %s", ", ".join(models))
+        # Load the model now rather than on the first completion
+        self.ollama_client.preload()
 
-    def _handle_shutdown(self) -> None:
+    def _handle_shutdown(self, params: dict) -> None:
         """Handle shutdown request."""
         logger.info("Shutdown requested")
         self._shutdown_requested = True
         return None
 
-    def _handle_exit(self) -> None:
+    def _handle_exit(self, params: dict) -> None:
         """Handle exit notification."""
         logger.info("Exit notification received")
-        exit_code = 0 if self._shutdown_requested else 1
-        sys.exit(exit_code)
+        # The transport stops reading after this message and main() exits
+        # with exit_code once in-flight responses are written
+        self.exit_requested = True
+
+    @property
+    def exit_code(self) -> int:
+        """Process exit status: 0 if ``shutdown`` preceded ``exit``, else 1."""
+        return 0 if self._shutdown_requested else 1
+
+    def _handle_cancel_request(self, params: dict) -> None:
+        """Ignore $/cancelRequest; newer completions supersede older ones."""
+        return None
 
     def _handle_did_open(self, params: dict) -> None:
         """Handle textDocument/didOpen notification."""
@@ -234,7 +326,7 @@ class LSPServer:
         uri = text_document.get("uri", "")
         text = text_document.get("text", "")
         self.handlers.store_document(uri, text)
-        logger.info(f"Document opened: {uri}")
+        logger.info("Document opened: %s", uri)
 
     def _handle_did_change(self, params: dict) -> None:
         """Handle textDocument/didChange notification."""
@@ -246,7 +338,7 @@ class LSPServer:
         if content_changes:
             text = content_changes[-1].get("text", "")
             self.handlers.store_document(uri, text)
-            logger.debug(f"Document changed: {uri}")
+            logger.debug("Document changed: %s", uri)
 
     def _handle_did_save(self, params: dict) -> None:
         """Handle textDocument/didSave notification."""
@@ -257,7 +349,7 @@ class LSPServer:
         if text is not None:
             self.handlers.store_document(uri, text)
 
-        logger.debug(f"Document saved: {uri}")
+        logger.debug("Document saved: %s", uri)
 
     def _handle_did_close(self, params: dict) -> None:
         """Handle textDocument/didClose notification."""
@@ -265,18 +357,70 @@ class LSPServer:
         uri = text_document.get("uri", "")
         # Remove from document store when tab closes
         self.handlers.remove_document(uri)
-        logger.debug(f"Document closed: {uri}")
+        logger.debug("Document closed: %s", uri)
 
-    def _handle_agent_request(self, params: dict) -> dict:
+    def _handle_agent_request(
+        self,
+        params: dict,
+        notify: Optional[Callable[[dict], None]] = None,
+    ) -> dict:
         """Handle gopilot/agent custom request."""
         if not self.agent:
             return {"error": "Agent not available (not a git repository)"}
 
+        batch = params.get("requests")
+        if batch is not None:
+            logger.info("Agent batch request: %s actions", len(batch))
+            return {"results": asyncio.run(self.agent.batch_handle(batch))}
+
         action = params.get("action", "")
         action_params = params.get("params", {})
-        logger.info(f"Agent request: action={action}")
+        logger.info("Agent request: action=%s", action)
+
+        token = params.get("workDoneToken")
+        if params.get("stream") and token is not None and notify:
+            return self._stream_agent_request(action, action_params, token, notify)
         return self.agent.handle_agent_request(action, action_params)
 
+    def _stream_agent_request(
+        self,
+        action: str,
+        action_params: dict,
+        token: Any,
+        notify: Callable[[dict], None],
+    ) -> dict:
+        """
+        Run an agent action, reporting each generated fragment to the
+        client as a ``$/progress`` notification.
+
+        The final response still carries the complete text.
+        """
+
+        def progress(value: dict) -> None:
+            notify(
+                {
+                    "jsonrpc": "2.0",
+                    "method": "$/progress",
+                    "params": {"token": token, "value": value},
+                }
+            )
+
+        progress({"kind": "begin", "title": f"gopilot: {action}"})
+        fragments = []
+        try:
+            for fragment in self.agent.stream_agent_request(action, action_params):
+                fragments.append(fragment)
+                progress({"kind": "report", "message": fragment})
+        except Exception as exc:
+            logger.exception("Agent stream error for action=%s: %s", action, exc)
+            return {"error": str(exc)}
+        finally:
+            progress({"kind": "end"})
+
+        if not fragments:
+            return {"error": "Failed to generate response (Ollama unreachable?)"}
+        return {"result": "".join(fragments)}
+
     def _handle_completion(self, params: dict) -> dict:
         """Handle textDocument/completion request."""
         text_document = params.get("textDocument", {})
@@ -307,9 +451,8 @@ class LSPServer:
             "result": result,
         }
 
-    def _create_error_response(
-        self, request_id: Any, code: int, message: str
-    ) -> dict:
+    @staticmethod
+    def _create_error_response(request_id: Any, code: int, message: str) -> dict:
         """Create a JSON-RPC error response."""
         return {
             "jsonrpc": "2.0",
@@ -321,8 +464,29 @@ class LSPServer:
         }
 
 
+def _internal_error(message: dict, exc: Exception) -> Optional[dict]:
+    """
+    Build the response for a message whose handler raised.
+
+    Returns:
+        A JSON-RPC internal error for requests, None for notifications
+    """
+    logger.exception("Error handling message: %s", exc)
+    if message.get("id") is None:
+        return None
+    return LSPServer._create_error_response(
+        message["id"], -32603, f"Internal error: {exc}"
+    )
+
+
 class StdioTransport:
-    """Stdio transport for LSP communication."""
+    """
+    Stdio transport for LSP communication.
+
+    Messages are handled in the order they arrive, except for
+    ``LSPServer.CONCURRENT_METHODS``, which run on the server's worker pool
+    so a completion does not hold up the requests behind it.
+    """
 
     def __init__(self, server: LSPServer):
         """
@@ -333,77 +497,109 @@ class StdioTransport:
         """
         self.server = server
         self._running = False
+        self._pending: set[Future] = set()
+        self._write_lock = threading.Lock()
 
     def start(self) -> None:
         """Start the stdio transport loop."""
         logger.info("Starting stdio transport")
         self._running = True
 
-        while self._running:
-            try:
-                message = self._read_message()
-                if message is None:
-                    break
+        try:
+            while self._running:
+                try:
+                    message = self._read_message()
+                    if message is None:
+                        break
 
-                response = self.server.handle_request(message)
-                if response:
-                    self._write_message(response)
+                    if message.get("method") in self.server.CONCURRENT_METHODS:
+                        future = self.server.executor.submit(
+                            self._handle_message, message
+                        )
+                        self._pending.add(future)
+                        future.add_done_callback(self._pending.discard)
+                    else:
+                        self._handle_message(message)
+                        if message.get("method") == "exit":
+                            break
+
+                except Exception as e:
+                    logger.exception("Error handling message: %s", e)
+        finally:
+            # Let in-flight requests answer before the transport goes away
+            wait(list(self._pending))
 
-            except Exception as e:
-                logger.exception(f"Error handling message: {e}")
+    def _handle_message(self, message: dict) -> None:
+        """Handle one message and write its response."""
+        try:
+            response = self.server.handle_request(
+                message, notify=self._write_message
+            )
+        except Exception as e:
+            # Still answer, or the client waits on this request forever
+            response = _internal_error(message, e)
+        if response:
+            self._write_message(response)
 
     def _read_message(self) -> Optional[dict]:
         """Read a message from stdin."""
+        stdin = sys.stdin.buffer
         try:
-            # Read headers
-            headers = {}
+            # Read headers; only Content-Length matters (Content-Type is
+            # always the JSON-RPC default)
+            content_length = 0
             while True:
-                line = sys.stdin.readline()
+                line = stdin.readline(_MAX_HEADER_LINE)
                 if not line:
                     return None
-                line = line.strip()
-                if not line:
+                if not line.strip():
                     break
-                if ":" in line:
-                    key, value = line.split(":", 1)
-                    headers[key.strip().lower()] = value.strip()
+                match = _CONTENT_LENGTH_RE.match(line)
+                if match:
+                    content_length = int(match.group(1))
 
-            # Get content length
-            content_length = int(headers.get("content-length", 0))
             if content_length == 0:
                 return None
 
-            # Read content
-            content = sys.stdin.read(content_length)
+            # Read content (a byte count, so read the binary stream)
+            content = stdin.read(content_length)
             if not content:
                 return None
 
-            return json.loads(content)
+            return _loads(content)
 
         except json.JSONDecodeError as e:
-            logger.error(f"JSON decode error: {e}")
+            logger.error("JSON decode error: %s", e)
             return None
         except Exception as e:
-            logger.error(f"Error reading message: {e}")
+            logger.error("Error reading message: %s", e)
             return None
 
     def _write_message(self, message: dict) -> None:
         """Write a message to stdout."""
         try:
-            content = json.dumps(message)
-            content_bytes = content.encode("utf-8")
+            content_bytes = _dumps(message)
             header = f"Content-Length: {len(content_bytes)}\r\n\r\n"
 
-            sys.stdout.write(header)
-            sys.stdout.write(content)
-            sys.stdout.flush()
+            # One write so the frame goes out in a single syscall
+            stdout = sys.stdout.buffer
+            with self._write_lock:
+                stdout.write(header.encode("ascii") + content_bytes)
+                stdout.flush()
 
         except Exception as e:
-            logger.error(f"Error writing message: {e}")
+            logger.error("Error writing message: %s", e)
 
 
 class TCPTransport:
-    """TCP transport for LSP communication."""
+    """
+    TCP transport for LSP communication.
+
+    Connections are served by one asyncio event loop. Each client's
+    messages are handled in order on worker threads, except for
+    ``LSPServer.CONCURRENT_METHODS``, which may overlap; a slow completion
+    holds up neither other clients nor the same client's edits.
+    """
 
     def __init__(self, server: LSPServer, host: str = "127.0.0.1", port: int = 2087):
         """
@@ -417,118 +613,145 @@ class TCPTransport:
         self.server = server
         self.host = host
         self.port = port
-        self._socket: Optional[socket.socket] = None
+        self._server: Optional[asyncio.AbstractServer] = None
         self._running = False
 
     def start(self) -> None:
         """Start the TCP transport."""
-        logger.info(f"Starting TCP transport on {self.host}:{self.port}")
+        logger.info("Starting TCP transport on %s:%s", self.host, self.port)
         self._running = True
+        asyncio.run(self._serve())
 
-        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        self._socket.bind((self.host, self.port))
-        self._socket.listen(5)
-
-        logger.info(f"Listening on {self.host}:{self.port}")
-
-        while self._running:
-            try:
-                client_socket, address = self._socket.accept()
-                logger.info(f"Client connected: {address}")
-                thread = threading.Thread(
-                    target=self._handle_client,
-                    args=(client_socket,),
-                    daemon=True,
-                )
-                thread.start()
-            except Exception as e:
-                if self._running:
-                    logger.error(f"Error accepting connection: {e}")
+    async def _serve(self) -> None:
+        """Accept clients until the server is closed."""
+        self._server = await asyncio.start_server(
+            self._handle_client, self.host, self.port
+        )
+        logger.info("Listening on %s:%s", self.host, self.port)
+        async with self._server:
+            await self._server.serve_forever()
 
-    def _handle_client(self, client_socket: socket.socket) -> None:
+    async def _handle_client(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
         """Handle a client connection."""
+        logger.info("Client connected: %s", writer.get_extra_info("peername"))
+        sock = writer.get_extra_info("socket")
+        if sock is not None:
+            # Small request/response traffic: never hold frames for Nagle
+            # (asyncio's selector loop does this too; other loops may not)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        loop = asyncio.get_running_loop()
+
+        def notify(message: dict) -> None:
+            # Called from the worker thread while a request is handled
+            loop.call_soon_threadsafe(writer.write, self._encode_message(message))
+
+        tasks: set[asyncio.Task] = set()
         try:
-            buffer = b""
             while self._running:
-                data = client_socket.recv(4096)
-                if not data:
+                message = await self._read_message(reader)
+                if message is None:
                     break
-                buffer += data
-
-                while True:
-                    message, buffer = self._parse_message(buffer)
-                    if message is None:
-                        break
 
-                    response = self.server.handle_request(message)
-                    if response:
-                        self._send_message(client_socket, response)
+                if message.get("method") in self.server.CONCURRENT_METHODS:
+                    task = loop.create_task(
+                        self._respond(message, writer, notify, self.server.executor)
+                    )
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                    continue
+                await self._respond(message, writer, notify)
+                if message.get("method") == "exit":
+                    # Ends this client's session, not the listener
+                    break
 
         except Exception as e:
-            logger.error(f"Error handling client: {e}")
+            logger.error("Error handling client: %s", e)
         finally:
-            client_socket.close()
-
-    def _parse_message(self, buffer: bytes) -> tuple[Optional[dict], bytes]:
-        """Parse a message from the buffer."""
-        try:
-            # Find header end
-            header_end = buffer.find(b"\r\n\r\n")
-            if header_end == -1:
-                return None, buffer
-
-            # Parse headers
-            headers_raw = buffer[:header_end].decode("utf-8")
-            headers = {}
-            for line in headers_raw.split("\r\n"):
-                if ":" in line:
-                    key, value = line.split(":", 1)
-                    headers[key.strip().lower()] = value.strip()
-
-            # Get content length
-            content_length = int(headers.get("content-length", 0))
-            if content_length == 0:
-                return None, buffer
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+            writer.close()
 
-            # Check if we have enough data
-            content_start = header_end + 4
-            content_end = content_start + content_length
+    async def _respond(
+        self,
+        message: dict,
+        writer: asyncio.StreamWriter,
+        notify: Callable[[dict], None],
+        executor: Optional[Executor] = None,
+    ) -> None:
+        """
+        Handle one message on a worker thread and write its response.
 
-            if len(buffer) < content_end:
-                return None, buffer
+        Args:
+            executor: Pool to run the handler on; the loop's default pool
+                      when None
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            try:
+                response = await loop.run_in_executor(
+                    executor,
+                    functools.partial(
+                        self.server.handle_request, message, notify=notify
+                    ),
+                )
+            except Exception as e:
+                response = _internal_error(message, e)
+            if response:
+                writer.write(self._encode_message(response))
+                await writer.drain()
+        except Exception as e:
+            logger.error("Error handling message: %s", e)
 
-            # Parse content
-            content = buffer[content_start:content_end].decode("utf-8")
-            message = json.loads(content)
+    async def _read_message(self, reader: asyncio.StreamReader) -> Optional[dict]:
+        """
+        Read the next message from the client.
 
-            return message, buffer[content_end:]
+        Returns:
+            The decoded message, or None once the client disconnects
+        """
+        while True:
+            try:
+                headers_raw = await reader.readuntil(b"\r\n\r\n")
+            except asyncio.IncompleteReadError:
+                return None
 
-        except Exception as e:
-            logger.error(f"Error parsing message: {e}")
-            return None, buffer
+            match = _CONTENT_LENGTH_RE.search(headers_raw)
+            content_length = int(match.group(1)) if match else 0
+            if content_length == 0:
+                continue
 
-    def _send_message(self, client_socket: socket.socket, message: dict) -> None:
-        """Send a message to the client."""
-        try:
-            content = json.dumps(message)
-            content_bytes = content.encode("utf-8")
-            header = f"Content-Length: {len(content_bytes)}\r\n\r\n"
+            try:
+                content = await reader.readexactly(content_length)
+            except asyncio.IncompleteReadError:
+                return None
 
-            client_socket.sendall(header.encode("utf-8"))
-            client_socket.sendall(content_bytes)
+            try:
+                return _loads(content)
+            except json.JSONDecodeError as e:
+                logger.error("JSON decode error: %s", e)
 
-        except Exception as e:
-            logger.error(f"Error sending message: {e}")
+    def _encode_message(self, message: dict) -> bytes:
+        """Frame a message for the wire as one buffer."""
+        content_bytes = _dumps(message)
+        header = f"Content-Length: {len(content_bytes)}\r\n\r\n"
+        return header.encode("ascii") + content_bytes
 
 
-def setup_logging(log_file: str, log_level: str) -> None:
+def setup_logging(log_file: str, log_level: str) -> logging.handlers.QueueListener:
     """
     Configure logging.
 
+    Records are queued and written to *log_file* by a background thread, so
+    the request loop never waits on file I/O.
+
     Args:
         log_file: Path to log file
         log_level: Logging level string
+
+    Returns:
+        The running listener; it is stopped (and flushed) at exit
     """
     level = getattr(logging, log_level.upper(), logging.INFO)
 
@@ -539,10 +762,18 @@ def setup_logging(log_file: str, log_level: str) -> None:
         logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
     )
 
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(
+        log_queue, file_handler, respect_handler_level=True
+    )
+    listener.start()
+    atexit.register(listener.stop)
+
     # Configure root logger
     root_logger = logging.getLogger()
     root_logger.setLevel(level)
-    root_logger.addHandler(file_handler)
+    root_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    return listener
 
 
 def _run_agent_cli(server: LSPServer) -> None:
@@ -613,8 +844,14 @@ def _run_agent_cli(server: LSPServer) -> None:
         print(server.agent.process_query(query) or "(no response)")
 
 
-def main() -> None:
-    """Main entry point."""
+@functools.lru_cache(maxsize=1)
+def _build_parser() -> argparse.ArgumentParser:
+    """
+    Build the command-line parser.
+
+    Built on first use rather than at import, so importing the server
+    (tests, the agent CLI) does not pay for it.
+    """
     parser = argparse.ArgumentParser(
         description="gopilot LSP Server - AI-powered code assistance"
     )
@@ -651,6 +888,12 @@ def main() -> None:
         default="codellama",
         help="Ollama model to use (default: codellama)",
     )
+    parser.add_argument(
+        "--agent-model",
+        default=None,
+        help="Ollama model for agent requests, e.g. a quantized "
+        "'qwen2.5-coder:7b-instruct-q4_K_M' (default: --model)",
+    )
     parser.add_argument(
         "--log-file",
         default="/tmp/gopilot.log",
@@ -674,15 +917,20 @@ def main() -> None:
         help="Number of lines around cursor for local scope (default: 50)",
     )
 
-    args = parser.parse_args()
+    return parser
+
+
+def main() -> None:
+    """Main entry point."""
+    args = _build_parser().parse_args()
 
     # Setup logging
     setup_logging(args.log_file, args.log_level)
 
     logger.info("Starting gopilot LSP server")
-    logger.info(f"Mode: {args.mode}")
-    logger.info(f"Ollama: {args.ollama_host}:{args.ollama_port}")
-    logger.info(f"Model: {args.model}")
+    logger.info("Mode: %s", args.mode)
+    logger.info("Ollama: %s:%s", args.ollama_host, args.ollama_port)
+    logger.info("Model: %s", args.model)
 
     # Create server
     server = LSPServer(
@@ -691,6 +939,7 @@ def main() -> None:
         model=args.model,
         repo_path=args.repo_path,
         context_lines=args.context_lines,
+        agent_model=args.agent_model,
     )
 
     # Start transport
@@ -707,8 +956,10 @@ def main() -> None:
         except KeyboardInterrupt:
             logger.info("Server interrupted")
         except Exception as e:
-            logger.exception(f"Server error: {e}")
+            logger.exception("Server error: %s", e)
             sys.exit(1)
+        if server.exit_requested:
+            sys.exit(server.exit_code)
 
 
 if __name__ == "__main__":
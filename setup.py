@@ -11,8 +11,12 @@ Or:
 
 from setuptools import setup, find_packages
 
-with open("README.md", "r", encoding="utf-8") as f:
-    long_description = f.read()
+try:
+    with open("README.md", "r", encoding="utf-8") as f:
+        long_description = f.read()
+except OSError:
+    # e.g. an sdist built without the README
+    long_description = ""
 
 setup(
     name="gopilot",
@@ -37,6 +41,11 @@ setup(
     ],
     python_requires=">=3.10",
     install_requires=[],
+    extras_require={
+        "pygit2": ["pygit2>=1.12"],
+        "orjson": ["orjson>=3.9"],
+        "ijson": ["ijson>=3.2"],
+    },
     entry_points={
         "console_scripts": [
             "gopilot=gopilot.server:main",
@@ -0,0 +1,145 @@
+"""Shared git repository fixtures for the test suite."""
+
+import atexit
+import os
+import pathlib
+import shlex
+import shutil
+import subprocess
+import tempfile
+
+try:
+    # Optional: build fixtures in-process through libgit2
+    import pygit2
+except ImportError:  # pragma: no cover - depends on environment
+    pygit2 = None
+
+# (files, message) -> template repository built for that content
+_templates: dict[tuple, str] = {}
+
+# Tag directories with the pid so parallel workers (pytest -n) are easy to
+# tell apart and never share a template
+_PREFIX = f"gopilot-{os.getpid()}-"
+
+# Keep fixtures on tmpfs when there is one, so git's many small writes
+# never touch a disk; None means tempfile's default location
+TMPDIR = (
+    "/dev/shm"
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK)
+    else None
+)
+
+# subprocess.run() keywords for git steps whose output nobody reads.
+# close_fds=False lets CPython use posix_spawn/vfork instead of fork plus
+# an fd sweep; descriptors Python opens are non-inheritable (PEP 446), so
+# nothing leaks into git (GitContext spawns git the same way)
+RUN_QUIET = {
+    "close_fds": False,
+    "stdout": subprocess.DEVNULL,
+    "stderr": subprocess.DEVNULL,
+    "check": True,
+}
+
+# Hooks, signing and fsync stay off for later commits in the copies too
+_CONFIG = {
+    "user.email": "test@test.com",
+    "user.name": "Test",
+    "core.hooksPath": "/dev/null",
+    "commit.gpgsign": "false",
+    "core.fsync": "none",
+}
+
+
+def _init_repo_pygit2(path: str, message: str) -> None:
+    """Create and commit the repository at *path* without spawning git."""
+    repo = pygit2.init_repository(path, initial_head="master")
+    config = repo.config
+    for name, value in _CONFIG.items():
+        config[name] = value
+    repo.index.add_all()
+    repo.index.write()
+    tree = repo.index.write_tree()
+    sig = pygit2.Signature(_CONFIG["user.name"], _CONFIG["user.email"])
+    repo.create_commit("HEAD", sig, sig, message, tree, [])
+    repo.free()
+
+
+def _write_files(path: str, files: dict[str, str]) -> None:
+    # Create each parent directory once, not once per file
+    for parent in {os.path.dirname(name) for name in files} - {""}:
+        os.makedirs(os.path.join(path, parent), exist_ok=True)
+    for name, content in files.items():
+        pathlib.Path(path, name).write_text(content)
+
+
+def _init_repo(path: str, files: dict[str, str], message: str) -> None:
+    """Create a repository at *path* with *files* committed."""
+    _write_files(path, files)
+    if pygit2 is not None:
+        _init_repo_pygit2(path, message)
+        return
+    # No template (sample hooks, info/exclude) to copy
+    config = "".join(
+        f"git config {name} {shlex.quote(value)} && " for name, value in _CONFIG.items()
+    )
+    script = (
+        "git init -q --template= && "
+        + config
+        + f"git add -A && git commit -q -m {shlex.quote(message)}"
+    )
+    # Ignore the developer's global/system git config
+    env = dict(os.environ, GIT_CONFIG_GLOBAL=os.devnull, GIT_CONFIG_NOSYSTEM="1")
+    subprocess.run(["sh", "-c", script], cwd=path, env=env, **RUN_QUIET)
+
+
+def git_env(path: str) -> dict[str, str]:
+    """Environment pointing git straight at the repository at *path*."""
+    return dict(os.environ, GIT_DIR=os.path.join(path, ".git"), GIT_WORK_TREE=path)
+
+
+def make_branch(path: str, branch: str, files: dict[str, str], message: str) -> None:
+    """
+    Commit *files* on a new *branch* of the repository at *path*.
+
+    The branch is created from and left for the current one, all in a
+    single shell.
+
+    Args:
+        path: Repository work tree
+        branch: Name of the new branch
+        files: Relative path -> file content
+        message: Commit message
+    """
+    _write_files(path, files)
+    script = (
+        f"git checkout -q -b {shlex.quote(branch)} && git add -A && "
+        f"git commit -q -m {shlex.quote(message)} && git checkout -q -"
+    )
+    subprocess.run(["sh", "-c", script], cwd=path, env=git_env(path), **RUN_QUIET)
+
+
+def make_repo(files: dict[str, str], message: str = "init") -> str:
+    """
+    Create a temporary git repository with *files* in a single commit.
+
+    git only runs the first time a given content is requested; later calls
+    copy that template, so a test's setUp costs a directory copy instead
+    of a round of git processes.
+
+    Args:
+        files: Relative path -> file content
+        message: Commit message
+
+    Returns:
+        Path of a fresh repository owned by the caller (remove it when done)
+    """
+    key = (tuple(sorted(files.items())), message)
+    template = _templates.get(key)
+    if template is None:
+        template = tempfile.mkdtemp(prefix=_PREFIX + "template-", dir=TMPDIR)
+        atexit.register(shutil.rmtree, template, ignore_errors=True)
+        _init_repo(template, files, message)
+        _templates[key] = template
+    path = tempfile.mkdtemp(prefix=_PREFIX, dir=TMPDIR)
+    shutil.copytree(template, path, dirs_exist_ok=True, symlinks=True)
+    return path
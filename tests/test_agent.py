@@ -1,14 +1,43 @@
 """Tests for gopilot.agent module."""
 
+import asyncio
+import functools
 import os
+import shutil
 import subprocess
 import tempfile
 import unittest
-from unittest.mock import MagicMock, patch
-
-from gopilot.agent import CopilotAgent, _truncate
+from unittest.mock import patch
+
+from gopilot.agent import (
+    _MAX_DIFF_BYTES,
+    CopilotAgent,
+    _cap,
+    _compress_diff,
+    _truncate,
+)
 from gopilot.git_context import GitContext
-from gopilot.ollama_client import OllamaClient
+from gopilot.server import LSPServer
+
+from tests.gitrepo import RUN_QUIET, TMPDIR, git_env, make_branch, make_repo
+
+
+class _StubOllama:
+    """Stands in for OllamaClient, recording the arguments of each call."""
+
+    def __init__(self, response: str = "AI response"):
+        self.response = response
+        self.chunks: list[str] = []
+        self.generate_calls: list[dict] = []
+        self.generate_stream_calls: list[dict] = []
+
+    def generate(self, **kwargs):
+        self.generate_calls.append(kwargs)
+        return self.response
+
+    def generate_stream(self, **kwargs):
+        self.generate_stream_calls.append(kwargs)
+        return iter(self.chunks)
 
 
 class TestTruncate(unittest.TestCase):
@@ -21,122 +50,101 @@ class TestTruncate(unittest.TestCase):
         self.assertIn("truncated", result)
 
 
-class TestCopilotAgent(unittest.TestCase):
-    """Tests for CopilotAgent using a real temp git repo + mocked Ollama."""
-
-    def setUp(self):
-        self.tmpdir = tempfile.mkdtemp()
-        subprocess.run(["git", "init", self.tmpdir], capture_output=True, check=True)
-        subprocess.run(
-            ["git", "-C", self.tmpdir, "config", "user.email", "t@t.com"],
-            capture_output=True,
-            check=True,
-        )
-        subprocess.run(
-            ["git", "-C", self.tmpdir, "config", "user.name", "T"],
-            capture_output=True,
-            check=True,
-        )
-        with open(os.path.join(self.tmpdir, "a.txt"), "w") as f:
-            f.write("hello\n")
-        subprocess.run(
-            ["git", "-C", self.tmpdir, "add", "."], capture_output=True, check=True
-        )
-        subprocess.run(
-            ["git", "-C", self.tmpdir, "commit", "-m", "init"],
-            capture_output=True,
-            check=True,
-        )
+def _file_diff(path: str, changes: int, context: int = 0) -> str:
+    lines = [
+        f"diff --git a/{path} b/{path}",
+        f"--- a/{path}",
+        f"+++ b/{path}",
+        "@@ -1,1 +1,1 @@",
+    ]
+    lines += [f" context {i}" for i in range(context)]
+    lines += [f"+added {path} {i}" for i in range(changes)]
+    return "\n".join(lines) + "\n"
+
+
+class TestCap(unittest.TestCase):
+    def test_short_list_unchanged(self):
+        self.assertEqual(_cap(["a", "b"], 3), "a, b")
+
+    def test_long_list_capped(self):
+        self.assertEqual(_cap(["a", "b", "c", "d"], 2), "a, b (+2 more)")
+
+
+class TestCompressDiff(unittest.TestCase):
+    def test_small_diff_unchanged(self):
+        diff = _file_diff("a.py", 2)
+        self.assertEqual(_compress_diff(diff, token_budget=1000), diff)
+
+    def test_drops_lockfiles_and_distant_context(self):
+        diff = _file_diff("a.py", 3, context=50) + _file_diff("poetry.lock", 200)
+        result = _compress_diff(diff, token_budget=200)
+        self.assertIn("+added a.py 0", result)
+        self.assertIn(" context 49", result)  # adjacent to a change
+        self.assertNotIn(" context 0", result)
+        self.assertNotIn("poetry.lock", result)
+        self.assertIn("omitted", result)
+
+    def test_prefers_high_signal_files(self):
+        diff = _file_diff("small.py", 1) + _file_diff("big.py", 40)
+        result = _compress_diff(diff, token_budget=195)
+        self.assertIn("big.py", result)
+        self.assertNotIn("small.py", result)
+
+    def test_oversized_file_truncated(self):
+        result = _compress_diff(_file_diff("huge.py", 1000), token_budget=50)
+        self.assertIn("huge.py", result)
+        self.assertIn("truncated", result)
 
-        self.git = GitContext(self.tmpdir)
-        self.ollama = MagicMock(spec=OllamaClient)
-        self.ollama.generate.return_value = "AI response"
-        self.agent = CopilotAgent(self.ollama, self.git)
 
-    def tearDown(self):
-        import shutil
+class TestCopilotAgentReadOnly(unittest.TestCase):
+    """Agent tests that leave the repository untouched share one fixture."""
 
-        shutil.rmtree(self.tmpdir, ignore_errors=True)
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = make_repo({"a.txt": "hello\n"})
+        cls.addClassCleanup(shutil.rmtree, cls.tmpdir)
+        cls.git = GitContext(cls.tmpdir)
+        cls.addClassCleanup(cls.git.close)
+        cls.agent = CopilotAgent(_StubOllama(), cls.git)
 
-    # ---- process_query ----
+    def setUp(self):
+        self.ollama = self.agent.ollama = _StubOllama()
 
     def test_process_query_calls_ollama(self):
         result = self.agent.process_query("What is this repo?")
         self.assertEqual(result, "AI response")
-        self.ollama.generate.assert_called_once()
-        call_kwargs = self.ollama.generate.call_args
-        self.assertIn("system", call_kwargs.kwargs or call_kwargs[1])
+        self.assertEqual(len(self.ollama.generate_calls), 1)
+        self.assertIn("system", self.ollama.generate_calls[0])
+
+    def test_model_preference_passed_to_ollama(self):
+        agent = CopilotAgent(self.ollama, self.git, "coder:7b-q4_K_M")
+        agent.process_query("hi")
+        self.assertEqual(
+            self.ollama.generate_calls[-1]["model"], "coder:7b-q4_K_M"
+        )
 
-    # ---- review_changes ----
+    def test_model_preference_from_env(self):
+        with patch.dict(os.environ, {"GOPILOT_AGENT_MODEL": "env-model"}):
+            agent = CopilotAgent(self.ollama, self.git)
+        self.assertEqual(agent.model_preference, "env-model")
 
     def test_review_changes_no_diff(self):
         result = self.agent.review_changes()
         self.assertEqual(result, "No changes detected to review.")
 
-    def test_review_changes_with_diff(self):
-        with open(os.path.join(self.tmpdir, "a.txt"), "a") as f:
-            f.write("world\n")
-        result = self.agent.review_changes()
-        self.assertEqual(result, "AI response")
-        self.ollama.generate.assert_called_once()
-
-    # ---- suggest_commit_message ----
-
     def test_suggest_commit_message_no_changes(self):
         result = self.agent.suggest_commit_message()
         self.assertEqual(result, "No changes detected.")
 
-    def test_suggest_commit_message_with_staged(self):
-        with open(os.path.join(self.tmpdir, "b.txt"), "w") as f:
-            f.write("new\n")
-        subprocess.run(
-            ["git", "-C", self.tmpdir, "add", "b.txt"],
-            capture_output=True,
-            check=True,
-        )
-        result = self.agent.suggest_commit_message()
-        self.assertEqual(result, "AI response")
-
-    # ---- explain_diff ----
-
     def test_explain_diff_no_changes(self):
         branch = self.git.get_current_branch()
         result = self.agent.explain_diff(base=branch)
         self.assertIn("No differences", result)
 
-    def test_explain_diff_between_branches(self):
-        subprocess.run(
-            ["git", "-C", self.tmpdir, "checkout", "-b", "feat"],
-            capture_output=True,
-            check=True,
-        )
-        with open(os.path.join(self.tmpdir, "c.txt"), "w") as f:
-            f.write("feat\n")
-        subprocess.run(
-            ["git", "-C", self.tmpdir, "add", "."], capture_output=True, check=True
-        )
-        subprocess.run(
-            ["git", "-C", self.tmpdir, "commit", "-m", "feat work"],
-            capture_output=True,
-            check=True,
-        )
-        subprocess.run(
-            ["git", "-C", self.tmpdir, "checkout", "-"],
-            capture_output=True,
-            check=True,
-        )
-        base = self.git.get_current_branch()
-        result = self.agent.explain_diff(base=base, target="feat")
-        self.assertEqual(result, "AI response")
-
-    # ---- summarize_branch ----
-
     def test_summarize_branch(self):
         result = self.agent.summarize_branch()
         self.assertEqual(result, "AI response")
 
-    # ---- handle_agent_request ----
-
     def test_handle_agent_request_status(self):
         resp = self.agent.handle_agent_request("status", {})
         self.assertIn("result", resp)
@@ -150,49 +158,155 @@ class TestCopilotAgent(unittest.TestCase):
         resp = self.agent.handle_agent_request("query", {"query": "hi"})
         self.assertEqual(resp["result"], "AI response")
 
-    # ---- get_context_for_completion ----
+    def test_multi_action_no_changes(self):
+        result = self.agent.multi_action(["review", "commit_message"])
+        self.assertEqual(
+            result,
+            {"review": "No changes detected.", "commit_message": "No changes detected."},
+        )
+        self.assertEqual(self.ollama.generate_calls, [])
+
+    def test_handle_agent_request_multi_unknown_action(self):
+        with self.assertLogs("gopilot.agent", "ERROR") as logs:
+            resp = self.agent.handle_agent_request("multi", {"actions": ["status"]})
+        self.assertIn("error", resp)
+        self.assertIn("Unsupported multi actions: status", logs.output[0])
+
+    def test_batch_handle(self):
+        results = asyncio.run(
+            self.agent.batch_handle(
+                [
+                    {"action": "query", "params": {"query": "hi"}},
+                    {"action": "status", "params": {}},
+                    {"action": "nope"},
+                ]
+            )
+        )
+        self.assertEqual(results[0]["result"], "AI response")
+        self.assertIn("branch", results[1]["result"])
+        self.assertIn("error", results[2])
+
+    def test_stream_agent_request(self):
+        self.ollama.chunks = ["AI ", "response"]
+        chunks = list(self.agent.stream_agent_request("query", {"query": "hi"}))
+        self.assertEqual(chunks, ["AI ", "response"])
+
+    def test_stream_agent_request_no_changes(self):
+        chunks = list(self.agent.stream_agent_request("review", {}))
+        self.assertEqual(chunks, ["No changes detected to review."])
+        self.assertEqual(self.ollama.generate_stream_calls, [])
 
     def test_get_context_for_completion(self):
         ctx = self.agent.get_context_for_completion()
         self.assertIn("[branch:", ctx)
 
 
-class TestCopilotAgentLSPIntegration(unittest.TestCase):
-    """Test the agent request through the LSP server dispatch."""
+class TestCopilotAgent(unittest.TestCase):
+    """Agent tests that change the working tree, each on a fresh repo copy."""
 
     def setUp(self):
-        self.tmpdir = tempfile.mkdtemp()
-        subprocess.run(["git", "init", self.tmpdir], capture_output=True, check=True)
-        subprocess.run(
-            ["git", "-C", self.tmpdir, "config", "user.email", "t@t.com"],
-            capture_output=True,
-            check=True,
+        self.tmpdir = make_repo({"a.txt": "hello\n"})
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.run_git = functools.partial(
+            subprocess.run, cwd=self.tmpdir, env=git_env(self.tmpdir), **RUN_QUIET
         )
-        subprocess.run(
-            ["git", "-C", self.tmpdir, "config", "user.name", "T"],
-            capture_output=True,
-            check=True,
-        )
-        with open(os.path.join(self.tmpdir, "a.txt"), "w") as f:
-            f.write("x\n")
-        subprocess.run(
-            ["git", "-C", self.tmpdir, "add", "."], capture_output=True, check=True
-        )
-        subprocess.run(
-            ["git", "-C", self.tmpdir, "commit", "-m", "init"],
-            capture_output=True,
-            check=True,
+
+        self.git = GitContext(self.tmpdir)
+        self.ollama = _StubOllama()
+        self.addCleanup(self.git.close)
+        self.agent = CopilotAgent(self.ollama, self.git)
+
+    def test_review_changes_with_diff(self):
+        with open(os.path.join(self.tmpdir, "a.txt"), "a") as f:
+            f.write("world\n")
+        result = self.agent.review_changes()
+        self.assertEqual(result, "AI response")
+        self.assertEqual(len(self.ollama.generate_calls), 1)
+
+    def test_review_prompt_puts_diff_last(self):
+        with open(os.path.join(self.tmpdir, "a.txt"), "a") as f:
+            f.write("world\n")
+        self.agent.review_changes()
+        kwargs = self.ollama.generate_calls[0]
+        instruction, _, diff_block = kwargs["prompt"].partition("\n---DIFF---\n")
+        self.assertEqual(instruction, "Review this diff.")
+        self.assertIn("+world", diff_block)
+        self.assertIn("keep_alive", kwargs)
+
+    def test_review_caps_diff_at_source(self):
+        with open(os.path.join(self.tmpdir, "a.txt"), "a") as f:
+            f.write("x" * (_MAX_DIFF_BYTES * 2) + "\n")
+        with patch.object(self.git, "get_diff", wraps=self.git.get_diff) as get_diff:
+            self.agent.review_changes()
+        self.assertEqual(get_diff.call_args.kwargs["max_bytes"], _MAX_DIFF_BYTES)
+        prompt = self.ollama.generate_calls[0]["prompt"]
+        self.assertLess(len(prompt), _MAX_DIFF_BYTES)
+
+    def test_review_lists_files_beyond_the_cap(self):
+        with open(os.path.join(self.tmpdir, "a.txt"), "a") as f:
+            f.write("more\n" * 5)
+        with open(os.path.join(self.tmpdir, "b.txt"), "w") as f:
+            f.write("new\n")
+        self.run_git(["git", "add", "-N", "b.txt"])
+        with patch("gopilot.agent._MAX_DIFF_FILES", 1):
+            self.agent.review_changes()
+        prompt = self.ollama.generate_calls[0]["prompt"]
+        self.assertIn("+more", prompt)
+        self.assertNotIn("+new", prompt)
+        self.assertIn("1 more changed file(s) not shown: b.txt", prompt)
+
+    def test_review_from_subdirectory(self):
+        os.mkdir(os.path.join(self.tmpdir, "src"))
+        with open(os.path.join(self.tmpdir, "src", "b.txt"), "w") as f:
+            f.write("new\n")
+        self.run_git(["git", "add", "-N", "src/b.txt"])
+        with open(os.path.join(self.tmpdir, "a.txt"), "a") as f:
+            f.write("more\n")
+        git = GitContext(os.path.join(self.tmpdir, "src"))
+        self.addCleanup(git.close)
+        CopilotAgent(self.ollama, git).review_changes()
+        prompt = self.ollama.generate_calls[0]["prompt"]
+        self.assertIn("+more", prompt)
+        self.assertIn("+new", prompt)
+
+    def test_suggest_commit_message_with_staged(self):
+        with open(os.path.join(self.tmpdir, "b.txt"), "w") as f:
+            f.write("new\n")
+        self.run_git(["git", "add", "b.txt"])
+        result = self.agent.suggest_commit_message()
+        self.assertEqual(result, "AI response")
+
+    def test_explain_diff_between_branches(self):
+        make_branch(self.tmpdir, "feat", {"c.txt": "feat\n"}, "feat work")
+        base = self.git.get_current_branch()
+        result = self.agent.explain_diff(base=base, target="feat")
+        self.assertEqual(result, "AI response")
+
+    def test_multi_action_single_generate(self):
+        with open(os.path.join(self.tmpdir, "a.txt"), "a") as f:
+            f.write("world\n")
+        self.ollama.response = (
+            "[1] Looks fine.\n[2] feat: add world\n\nAdds a line."
         )
+        result = self.agent.multi_action(["review", "commit_message"])
+        self.assertEqual(len(self.ollama.generate_calls), 1)
+        self.assertEqual(result["review"], "Looks fine.")
+        self.assertEqual(result["commit_message"], "feat: add world\n\nAdds a line.")
 
-    def tearDown(self):
-        import shutil
 
-        shutil.rmtree(self.tmpdir, ignore_errors=True)
+class TestCopilotAgentLSPIntegration(unittest.TestCase):
+    """Test the agent request through the LSP server dispatch."""
 
-    def test_server_agent_request(self):
-        from gopilot.server import LSPServer
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = make_repo({"a.txt": "x\n"})
+        cls.addClassCleanup(shutil.rmtree, cls.tmpdir)
+        cls.server = LSPServer(repo_path=cls.tmpdir)
+        cls.addClassCleanup(cls.server.git_context.close)
+        cls.addClassCleanup(cls.server.executor.shutdown)
 
-        server = LSPServer(repo_path=self.tmpdir)
+    def test_server_agent_request(self):
+        server = self.server
         self.assertIsNotNone(server.agent)
 
         # Status action does not need Ollama
@@ -208,11 +322,34 @@ class TestCopilotAgentLSPIntegration(unittest.TestCase):
         self.assertEqual(response["id"], 1)
         self.assertIn("branch", response["result"]["result"])
 
-    def test_server_agent_not_available_outside_git(self):
-        non_git = tempfile.mkdtemp()
-        try:
-            from gopilot.server import LSPServer
+    def test_server_agent_stream_request(self):
+        sent = []
+        with patch.object(
+            self.server.ollama_client,
+            "generate_stream",
+            return_value=iter(["Hello", " world"]),
+        ):
+            response = self.server.handle_request(
+                {
+                    "jsonrpc": "2.0",
+                    "id": 4,
+                    "method": "gopilot/agent",
+                    "params": {
+                        "action": "query",
+                        "params": {"query": "hi"},
+                        "stream": True,
+                        "workDoneToken": "tok",
+                    },
+                },
+                notify=sent.append,
+            )
+        self.assertEqual(response["result"]["result"], "Hello world")
+        kinds = [msg["params"]["value"]["kind"] for msg in sent]
+        self.assertEqual(kinds, ["begin", "report", "report", "end"])
+        self.assertEqual(sent[1]["params"]["value"]["message"], "Hello")
 
+    def test_server_agent_not_available_outside_git(self):
+        with tempfile.TemporaryDirectory(dir=TMPDIR) as non_git:
             server = LSPServer(repo_path=non_git)
             self.assertIsNone(server.agent)
 
@@ -225,16 +362,9 @@ class TestCopilotAgentLSPIntegration(unittest.TestCase):
                 }
             )
             self.assertIn("error", response["result"])
-        finally:
-            import shutil
-
-            shutil.rmtree(non_git, ignore_errors=True)
 
     def test_initialize_advertises_agent_capabilities(self):
-        from gopilot.server import LSPServer
-
-        server = LSPServer(repo_path=self.tmpdir)
-        response = server.handle_request(
+        response = self.server.handle_request(
             {
                 "jsonrpc": "2.0",
                 "id": 3,
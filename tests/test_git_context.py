@@ -1,59 +1,46 @@
 """Tests for gopilot.git_context module."""
 
+import functools
 import os
+import shutil
 import subprocess
 import tempfile
+import threading
 import unittest
+from unittest.mock import patch
 
-from gopilot.git_context import GitContext
+from gopilot import git_context
+from gopilot.git_context import GitContext, _parse_porcelain_v2
 
+from tests.gitrepo import RUN_QUIET, TMPDIR, git_env, make_branch, make_repo
 
-class TestGitContext(unittest.TestCase):
-    """Tests that exercise GitContext against a real temporary git repo."""
 
-    def setUp(self):
-        """Create a temporary git repository for each test."""
-        self.tmpdir = tempfile.mkdtemp()
-        subprocess.run(
-            ["git", "init", self.tmpdir], capture_output=True, check=True
-        )
-        subprocess.run(
-            ["git", "-C", self.tmpdir, "config", "user.email", "test@test.com"],
-            capture_output=True,
-            check=True,
-        )
-        subprocess.run(
-            ["git", "-C", self.tmpdir, "config", "user.name", "Test"],
-            capture_output=True,
-            check=True,
-        )
-        # Create an initial commit so HEAD exists
-        init_file = os.path.join(self.tmpdir, "README.md")
-        with open(init_file, "w") as f:
-            f.write("# test repo\n")
-        subprocess.run(
-            ["git", "-C", self.tmpdir, "add", "."], capture_output=True, check=True
-        )
-        subprocess.run(
-            ["git", "-C", self.tmpdir, "commit", "-m", "initial commit"],
-            capture_output=True,
-            check=True,
-        )
-        self.ctx = GitContext(self.tmpdir)
-
-    def tearDown(self):
-        import shutil
+class TestGitContextReadOnly(unittest.TestCase):
+    """Read-only GitContext tests sharing one repository for the whole class."""
 
-        shutil.rmtree(self.tmpdir, ignore_errors=True)
-
-    # ---- basic state ----
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = make_repo({"README.md": "# test repo\n"}, "initial commit")
+        cls.addClassCleanup(shutil.rmtree, cls.tmpdir)
+        cls.ctx = GitContext(cls.tmpdir)
+        cls.addClassCleanup(cls.ctx.close)
 
     def test_is_git_repo(self):
         self.assertTrue(self.ctx.is_git_repo())
 
     def test_is_not_git_repo(self):
-        ctx = GitContext(tempfile.mkdtemp())
-        self.assertFalse(ctx.is_git_repo())
+        with tempfile.TemporaryDirectory(dir=TMPDIR) as tmpdir:
+            ctx = GitContext(tmpdir)
+            self.assertFalse(ctx.is_git_repo())
+
+    def test_resolves_git_dir_once(self):
+        self.assertEqual(
+            os.path.realpath(self.ctx._work_tree), os.path.realpath(self.tmpdir)
+        )
+        self.assertEqual(self.ctx._git_cmd, ["git"])
+        self.assertEqual(
+            self.ctx._popen_kwargs["env"]["GIT_DIR"], self.ctx._git_dir
+        )
 
     def test_get_current_branch(self):
         branch = self.ctx.get_current_branch()
@@ -61,29 +48,131 @@ class TestGitContext(unittest.TestCase):
         # Default branch name varies (master / main), just check non-empty
         self.assertTrue(len(branch) > 0)
 
-    # ---- branches ----
+    def test_run_git_async(self):
+        future = self.ctx._run_git_async("rev-parse", "--is-inside-work-tree")
+        self.assertEqual(future.result(), "true")
 
     def test_list_branches(self):
         branches = self.ctx.list_branches()
         self.assertIsInstance(branches, list)
         self.assertGreater(len(branches), 0)
 
-    def test_list_branches_after_new_branch(self):
-        subprocess.run(
-            ["git", "-C", self.tmpdir, "branch", "feature-x"],
-            capture_output=True,
-            check=True,
-        )
-        branches = self.ctx.list_branches()
-        self.assertIn("feature-x", branches)
-
-    # ---- diff / changed files ----
-
     def test_get_diff_no_changes(self):
         diff = self.ctx.get_diff()
         # No uncommitted changes -> empty or None
         self.assertTrue(diff is not None)
 
+    def test_get_diff_max_files_no_changes(self):
+        self.assertEqual(self.ctx.get_diff(max_files=5), "")
+
+    def test_get_commit_log(self):
+        log = self.ctx.get_commit_log(n=5)
+        self.assertIsInstance(log, list)
+        self.assertGreater(len(log), 0)
+        self.assertIn("initial commit", log[0])
+
+    def test_get_file_at_ref(self):
+        content = self.ctx.get_file_at_ref("README.md", "HEAD")
+        self.assertIsNotNone(content)
+        self.assertIn("# test repo", content)
+
+    def test_get_file_size_at_ref(self):
+        self.assertEqual(
+            self.ctx.get_file_size_at_ref("README.md"), len("# test repo\n")
+        )
+        self.assertIsNone(self.ctx.get_file_size_at_ref("missing.txt"))
+
+    def test_get_file_at_ref_missing(self):
+        self.assertIsNone(self.ctx.get_file_at_ref("missing.txt"))
+        self.assertIsNotNone(self.ctx.get_file_at_ref("README.md"))
+
+    def test_get_status_summary(self):
+        summary = self.ctx.get_status_summary()
+        self.assertIn("branch", summary)
+        self.assertIn("branches", summary)
+        self.assertIn("staged_files", summary)
+        self.assertIn("unstaged_files", summary)
+        self.assertIn("recent_commits", summary)
+
+    def test_request_scope_memoizes_reads(self):
+        with patch.object(
+            self.ctx, "_spawn_git", wraps=self.ctx._spawn_git
+        ) as spawn:
+            with self.ctx.request_scope():
+                self.ctx.get_diff()
+                self.ctx.get_diff()
+            self.assertEqual(spawn.call_count, 1)
+            self.ctx.get_diff()
+            self.assertEqual(spawn.call_count, 2)
+        self.assertIsNone(self.ctx._request_memo.get())
+
+    def test_request_scope_is_per_request(self):
+        with self.ctx.request_scope():
+            memo = self.ctx._request_memo.get()
+            # Submitted work shares the caller's memo ...
+            self.assertIs(self.ctx.submit(self.ctx._request_memo.get).result(), memo)
+            # ... while an unrelated thread's request gets its own
+            seen = []
+            thread = threading.Thread(
+                target=lambda: seen.append(self.ctx._request_memo.get())
+            )
+            thread.start()
+            thread.join()
+            self.assertEqual(seen, [None])
+
+    @unittest.skipIf(git_context.pygit2 is None, "pygit2 not installed")
+    def test_pygit2_matches_subprocess(self):
+        self.assertIsNotNone(self.ctx._repo)
+        with patch.object(git_context, "pygit2", None):
+            cli = GitContext(self.tmpdir)
+        try:
+            self.assertIsNone(cli._repo)
+            self.assertEqual(self.ctx.get_current_branch(), cli.get_current_branch())
+            self.assertEqual(self.ctx.list_branches(), cli.list_branches())
+            self.assertEqual(self.ctx.list_project_files(), cli.list_project_files())
+            self.assertEqual(
+                self.ctx.get_file_at_ref("README.md"), cli.get_file_at_ref("README.md")
+            )
+            ours = self.ctx.get_commit_log(n=5)
+            theirs = cli.get_commit_log(n=5)
+            self.assertEqual(len(ours), len(theirs))
+            self.assertEqual(ours[0].split(" ", 1)[1], theirs[0].split(" ", 1)[1])
+        finally:
+            cli.close()
+
+
+class TestGitContext(unittest.TestCase):
+    """Tests that modify the repository or the GitContext, each on a fresh copy."""
+
+    def setUp(self):
+        """Create a temporary git repository for each test."""
+        self.tmpdir = make_repo({"README.md": "# test repo\n"}, "initial commit")
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.ctx = GitContext(self.tmpdir)
+        self.addCleanup(self.ctx.close)
+        # GIT_DIR/GIT_WORK_TREE spare git the repository discovery walk
+        self.run_git = functools.partial(
+            subprocess.run, cwd=self.tmpdir, env=git_env(self.tmpdir), **RUN_QUIET
+        )
+
+    def test_subdirectory_paths_relative_to_repo_path(self):
+        subdir = os.path.join(self.tmpdir, "sub")
+        os.makedirs(subdir)
+        with open(os.path.join(subdir, "x.txt"), "w") as f:
+            f.write("x\n")
+        self.run_git(["git", "add", "."])
+        ctx = GitContext(subdir)
+        try:
+            self.assertTrue(ctx.is_git_repo())
+            self.assertEqual(ctx.list_project_files(), ["x.txt"])
+        finally:
+            ctx.close()
+
+    def test_list_branches_after_new_branch(self):
+        self.run_git(["git", "branch", "feature-x"])
+        branches = self.ctx.list_branches()
+        self.assertIn("feature-x", branches)
+
     def test_get_changed_files_with_modification(self):
         filepath = os.path.join(self.tmpdir, "README.md")
         with open(filepath, "a") as f:
@@ -91,106 +180,140 @@ class TestGitContext(unittest.TestCase):
         changed = self.ctx.get_changed_files()
         self.assertIn("README.md", changed)
 
+    def test_get_diff_max_bytes(self):
+        with open(os.path.join(self.tmpdir, "README.md"), "a") as f:
+            f.write("x" * 1000 + "\n")
+        full = self.ctx.get_diff()
+        limited = self.ctx.get_diff(max_bytes=100)
+        self.assertLessEqual(len(limited), 100)
+        self.assertTrue(full.startswith(limited))
+
+    def test_get_diff_max_files(self):
+        with open(os.path.join(self.tmpdir, "README.md"), "a") as f:
+            f.write("one\n")
+        with open(os.path.join(self.tmpdir, "big.txt"), "w") as f:
+            f.write("big\n")
+        self.run_git(["git", "add", "big.txt"])
+        with open(os.path.join(self.tmpdir, "big.txt"), "a") as f:
+            f.write("line\n" * 10)
+        diff = self.ctx.get_diff(max_files=1)
+        self.assertIn("big.txt", diff)
+        self.assertNotIn("README.md", diff)
+
+    def test_rank_changed_files(self):
+        with open(os.path.join(self.tmpdir, "README.md"), "a") as f:
+            f.write("one\n")
+        with open(os.path.join(self.tmpdir, "big.txt"), "w") as f:
+            f.write("line\n" * 10)
+        self.run_git(["git", "add", "big.txt"])
+        self.assertEqual(self.ctx.rank_changed_files(), ["README.md"])
+        self.assertEqual(self.ctx.rank_changed_files(staged=True), ["big.txt"])
+        self.assertEqual(
+            self.ctx.rank_changed_files(base="HEAD"), ["big.txt", "README.md"]
+        )
+        diff = self.ctx.get_diff(base="HEAD", paths=["README.md"])
+        self.assertIn("+one", diff)
+        self.assertNotIn("big.txt", diff)
+
     def test_get_staged_diff(self):
         filepath = os.path.join(self.tmpdir, "new.txt")
         with open(filepath, "w") as f:
             f.write("hello\n")
-        subprocess.run(
-            ["git", "-C", self.tmpdir, "add", "new.txt"],
-            capture_output=True,
-            check=True,
-        )
+        self.run_git(["git", "add", "new.txt"])
         diff = self.ctx.get_staged_diff()
         self.assertIsNotNone(diff)
         self.assertIn("hello", diff)
 
+    def test_has_staged_changes(self):
+        self.assertFalse(self.ctx.has_staged_changes())
+        with open(os.path.join(self.tmpdir, "new.txt"), "w") as f:
+            f.write("hello\n")
+        self.run_git(["git", "add", "new.txt"])
+        self.assertTrue(self.ctx.has_staged_changes())
+
     def test_get_changed_files_between_branches(self):
-        subprocess.run(
-            ["git", "-C", self.tmpdir, "checkout", "-b", "feature-y"],
-            capture_output=True,
-            check=True,
-        )
-        filepath = os.path.join(self.tmpdir, "feature.py")
-        with open(filepath, "w") as f:
-            f.write("print('hi')\n")
-        subprocess.run(
-            ["git", "-C", self.tmpdir, "add", "."], capture_output=True, check=True
-        )
-        subprocess.run(
-            ["git", "-C", self.tmpdir, "commit", "-m", "feature commit"],
-            capture_output=True,
-            check=True,
-        )
-        # Get the default branch name
-        default = subprocess.run(
-            ["git", "-C", self.tmpdir, "rev-parse", "--abbrev-ref", "HEAD"],
-            capture_output=True,
-            text=True,
-        ).stdout.strip()
-        # Switch back and compare
-        subprocess.run(
-            ["git", "-C", self.tmpdir, "checkout", "-"],
-            capture_output=True,
-            check=True,
+        make_branch(
+            self.tmpdir, "feature-y", {"feature.py": "print('hi')\n"}, "feature commit"
         )
         changed = self.ctx.get_changed_files(
             base=self.ctx.get_current_branch(), target="feature-y"
         )
         self.assertIn("feature.py", changed)
 
-    # ---- commit log ----
-
-    def test_get_commit_log(self):
-        log = self.ctx.get_commit_log(n=5)
-        self.assertIsInstance(log, list)
-        self.assertGreater(len(log), 0)
-        self.assertIn("initial commit", log[0])
-
     def test_get_branch_commits(self):
-        # Create a new branch with a commit
-        subprocess.run(
-            ["git", "-C", self.tmpdir, "checkout", "-b", "br1"],
-            capture_output=True,
-            check=True,
-        )
-        filepath = os.path.join(self.tmpdir, "b.txt")
-        with open(filepath, "w") as f:
-            f.write("b\n")
-        subprocess.run(
-            ["git", "-C", self.tmpdir, "add", "."], capture_output=True, check=True
-        )
-        subprocess.run(
-            ["git", "-C", self.tmpdir, "commit", "-m", "branch commit"],
-            capture_output=True,
-            check=True,
-        )
-        # Get the initial branch name
-        subprocess.run(
-            ["git", "-C", self.tmpdir, "checkout", "-"],
-            capture_output=True,
-            check=True,
-        )
+        make_branch(self.tmpdir, "br1", {"b.txt": "b\n"}, "branch commit")
         base = self.ctx.get_current_branch()
         commits = self.ctx.get_branch_commits(base=base, target="br1")
         self.assertGreater(len(commits), 0)
         self.assertIn("branch commit", commits[0])
 
-    # ---- file at ref ----
+    def test_get_file_at_ref_reuses_process(self):
+        self.ctx._repo = None  # exercise the cat-file path
+        self.ctx.get_file_at_ref("README.md")
+        procs = dict(self.ctx._batch._procs)
+        self.assertTrue(procs)
+        self.assertIn("# test repo", self.ctx.get_file_at_ref("README.md"))
+        self.assertEqual(self.ctx._batch._procs, procs)
 
-    def test_get_file_at_ref(self):
-        content = self.ctx.get_file_at_ref("README.md", "HEAD")
-        self.assertIsNotNone(content)
-        self.assertIn("# test repo", content)
+    def test_get_status_summary_staged_and_unstaged(self):
+        with open(os.path.join(self.tmpdir, "README.md"), "a") as f:
+            f.write("unstaged\n")
+        with open(os.path.join(self.tmpdir, "staged.txt"), "w") as f:
+            f.write("staged\n")
+        self.run_git(["git", "add", "staged.txt"])
+        summary = self.ctx.get_status_summary()
+        self.assertEqual(summary["branch"], self.ctx.get_current_branch())
+        self.assertEqual(summary["staged_files"], ["staged.txt"])
+        self.assertEqual(summary["unstaged_files"], ["README.md"])
 
-    # ---- status summary ----
+    def test_cached_read_reused(self):
+        self.ctx._repo = None  # count git subprocess reads
+        with patch.object(
+            self.ctx, "_run_git_lines", wraps=self.ctx._run_git_lines
+        ) as run:
+            first = self.ctx.list_project_files()
+            second = self.ctx.list_project_files()
+        self.assertEqual(first, second)
+        self.assertEqual(run.call_count, 1)
 
-    def test_get_status_summary(self):
-        summary = self.ctx.get_status_summary()
-        self.assertIn("branch", summary)
-        self.assertIn("branches", summary)
-        self.assertIn("staged_files", summary)
-        self.assertIn("unstaged_files", summary)
-        self.assertIn("recent_commits", summary)
+    def test_cached_result_mutation_does_not_leak(self):
+        self.ctx.list_branches().append("bogus")
+        self.assertNotIn("bogus", self.ctx.list_branches())
+        log = self.ctx.get_commit_log(n=5)
+        log.clear()
+        self.assertTrue(self.ctx.get_commit_log(n=5))
+
+    def test_cache_invalidated_on_head_change(self):
+        branch = self.ctx.get_current_branch()
+        self.run_git(["git", "checkout", "-b", "other"])
+        self.assertNotEqual(self.ctx.get_current_branch(), branch)
+        self.assertEqual(self.ctx.get_current_branch(), "other")
+
+
+class TestParsePorcelainV2(unittest.TestCase):
+    """Tests for the porcelain v2 status parser."""
+
+    def test_parse_branch_and_files(self):
+        output = "\0".join(
+            [
+                "# branch.oid abc123",
+                "# branch.head main",
+                "1 .M N... 100644 100644 100644 aaa aaa mod file.py",
+                "2 R. N... 100644 100644 100644 bbb bbb R100 new.py",
+                "old.py",
+                "1 AM N... 000000 100644 100644 000 ccc both.py",
+            ]
+        )
+        branch, staged, unstaged = _parse_porcelain_v2(output)
+        self.assertEqual(branch, "main")
+        self.assertEqual(staged, ["new.py", "both.py"])
+        self.assertEqual(unstaged, ["mod file.py", "both.py"])
+
+    def test_parse_detached_head(self):
+        branch, staged, unstaged = _parse_porcelain_v2("# branch.head (detached)")
+        self.assertEqual(branch, "HEAD")
+        self.assertEqual(staged, [])
+        self.assertEqual(unstaged, [])
 
 
 if __name__ == "__main__":
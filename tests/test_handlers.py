@@ -1,18 +1,42 @@
 """Tests for gopilot.handlers module - context layering and completion."""
 
+import shutil
+import tempfile
 import unittest
 from unittest.mock import MagicMock, patch
 
-from gopilot.handlers import LSPHandlers
-from gopilot.ollama_client import OllamaClient
+from gopilot.git_context import GitContext
+from gopilot.handlers import LSPHandlers, _DocumentLines, _line_starts
+
+from tests.gitrepo import TMPDIR, make_repo
+
+# Shared, immutable inputs for the context-building tests
+_LINES_20 = tuple(f"line{i}" for i in range(20))
+_PYTHON_SRC = (
+    "import os\nfrom sys import path\n\ndef hello():\n    pass\n\nclass Foo:\n    pass\n"
+)
+_JS_SRC = "import React from 'react';\nexport default App;\nconst x = 1;\n"
+_PLAIN_SRC = "some content\nanother line\n"
+_300_FILES = tuple(f"file{i}.py" for i in range(300))
+
+
+class _StubOllama:
+    """Stands in for OllamaClient, recording the arguments of each completion."""
+
+    def __init__(self, completion: str = "completed_code()"):
+        self.completion = completion
+        self.complete_code_calls: list[dict] = []
+
+    def complete_code(self, **kwargs):
+        self.complete_code_calls.append(kwargs)
+        return self.completion
 
 
 class TestLSPHandlersContextLayering(unittest.TestCase):
     """Tests for the layered context system in LSPHandlers."""
 
     def setUp(self):
-        self.ollama = MagicMock(spec=OllamaClient)
-        self.ollama.complete_code.return_value = "completed_code()"
+        self.ollama = _StubOllama()
         self.handlers = LSPHandlers(self.ollama, context_lines=5)
 
     def test_init_default_context_lines(self):
@@ -41,6 +65,15 @@ class TestLSPHandlersContextLayering(unittest.TestCase):
         # Should not raise
         self.handlers.remove_document("file://nonexistent.py")
 
+    # ---- _get_language_from_uri ----
+
+    def test_get_language_from_uri(self):
+        self.assertEqual(self.handlers._get_language_from_uri("file:///a/b.tsx"), "typescript")
+        self.assertEqual(self.handlers._get_language_from_uri("file:///a/B.PY"), "python")
+
+    def test_get_language_from_uri_unknown(self):
+        self.assertEqual(self.handlers._get_language_from_uri("file:///a.d/Makefile"), "text")
+
     # ---- _extract_current_line_prefix ----
 
     def test_extract_current_line_prefix(self):
@@ -59,6 +92,15 @@ class TestLSPHandlersContextLayering(unittest.TestCase):
         result = self.handlers._extract_current_line_prefix("hello", -1)
         self.assertEqual(result, "")
 
+    # ---- _get_word_at_position ----
+
+    def test_get_word_at_position(self):
+        line = "result = my_func(arg1)"
+        self.assertEqual(self.handlers._get_word_at_position(line, 12), "my_func")
+        self.assertEqual(self.handlers._get_word_at_position(line, 16), "my_func")
+        self.assertEqual(self.handlers._get_word_at_position(line, 0), "result")
+        self.assertEqual(self.handlers._get_word_at_position(line, 8), "")
+
     # ---- _build_local_scope ----
 
     def test_build_local_scope_basic(self):
@@ -82,9 +124,8 @@ class TestLSPHandlersContextLayering(unittest.TestCase):
 
     def test_build_local_scope_respects_context_lines(self):
         # With context_lines=5, should only include +/- 5 lines
-        lines = [f"line{i}" for i in range(20)]
         code_before, code_after, prefix = self.handlers._build_local_scope(
-            lines, line_num=10, char_num=0
+            _LINES_20, line_num=10, char_num=0
         )
         # Should not include line0..line4 (outside -5 window from line 10)
         self.assertNotIn("line0", code_before)
@@ -95,27 +136,76 @@ class TestLSPHandlersContextLayering(unittest.TestCase):
         # Should not include line16..line19 (outside +5 window from line 10)
         self.assertNotIn("line16", code_after)
 
+    def test_document_lines_matches_split(self):
+        for text in ("", "a", "a\nb", "a\n\nb\n"):
+            view = _DocumentLines(text, _line_starts(text))
+            expected = text.split("\n")
+            self.assertEqual(len(view), len(expected))
+            self.assertEqual(view[:], expected)
+            self.assertEqual(view[-1], expected[-1])
+            self.assertEqual(view[1:3], expected[1:3])
+
+    def test_line_index_built_lazily_and_shared(self):
+        self.handlers.store_document("file://a.py", "a\nb")
+        self.assertNotIn("file://a.py", self.handlers._line_starts)
+        doc = self.handlers.get_document("file://a.py")
+        first = self.handlers._get_lines("file://a.py", doc)
+        self.assertIs(self.handlers._get_lines("file://a.py", doc).starts, first.starts)
+        self.handlers.store_document("file://a.py", "a\nb\nc")
+        self.assertEqual(len(self.handlers._get_lines("file://a.py", "a\nb\nc")), 3)
+
+    def test_unchanged_store_keeps_line_index(self):
+        self.handlers.store_document("file://a.py", "a\nb")
+        doc = self.handlers.get_document("file://a.py")
+        first = self.handlers._get_lines("file://a.py", doc)
+        self.handlers.store_document("file://a.py", "a\n" + "b")
+        self.assertIs(self.handlers.get_document("file://a.py"), doc)
+        self.assertIs(self.handlers._get_lines("file://a.py", doc).starts, first.starts)
+
+    def test_handle_completion_uses_line_index(self):
+        self.handlers.store_document("file://a.py", "a\nbc\nd")
+        self.handlers.handle_completion("file://a.py", {"line": 1, "character": 1})
+        kwargs = self.ollama.complete_code_calls[-1]
+        self.assertEqual(kwargs["code_before"], "a\nb")
+        self.assertEqual(kwargs["code_after"], "c\nd")
+
+    def test_build_local_scope_caps_characters(self):
+        h = LSPHandlers(self.ollama, context_lines=50)
+        lines = ["x" * 99] * 60
+        code_before, code_after, _ = h._build_local_scope(lines, line_num=30, char_num=0)
+        self.assertLessEqual(len(code_before), h.MAX_CODE_BEFORE_CHARS)
+        self.assertLessEqual(len(code_after), h.MAX_CODE_AFTER_CHARS)
+        # Trimmed back to whole lines
+        self.assertTrue(code_before.startswith("x" * 99 + "\n"))
+        self.assertTrue(code_after.endswith("x" * 99))
+
     # ---- _extract_file_summary ----
 
     def test_extract_file_summary_python(self):
-        text = "import os\nfrom sys import path\n\ndef hello():\n    pass\n\nclass Foo:\n    pass\n"
-        summary = self.handlers._extract_file_summary(text, "python")
+        summary = self.handlers._extract_file_summary(_PYTHON_SRC, "python")
         self.assertIn("import os", summary)
         self.assertIn("from sys import path", summary)
         self.assertIn("def hello():", summary)
         self.assertIn("class Foo:", summary)
 
     def test_extract_file_summary_js(self):
-        text = "import React from 'react';\nexport default App;\nconst x = 1;\n"
-        summary = self.handlers._extract_file_summary(text, "javascript")
+        summary = self.handlers._extract_file_summary(_JS_SRC, "javascript")
         self.assertIn("import React", summary)
         self.assertIn("export default", summary)
 
     def test_extract_file_summary_fallback(self):
-        text = "some content\nanother line\n"
-        summary = self.handlers._extract_file_summary(text, "unknown")
+        summary = self.handlers._extract_file_summary(_PLAIN_SRC, "unknown")
         self.assertIn("some content", summary)
 
+    def test_get_uri_info_decodes_and_caches(self):
+        uri = "file:///src/my%20module.py"
+        self.assertEqual(
+            self.handlers._get_uri_info(uri), ("/src/my module.py", "python")
+        )
+        self.assertIs(self.handlers._get_uri_info(uri), self.handlers._uri_info[uri])
+        self.handlers.remove_document(uri)
+        self.assertNotIn(uri, self.handlers._uri_info)
+
     # ---- _build_secondary_context ----
 
     def test_build_secondary_context_no_other_docs(self):
@@ -131,6 +221,34 @@ class TestLSPHandlersContextLayering(unittest.TestCase):
         self.assertIn("b.py", result)
         self.assertNotIn("a.py", result)  # Should exclude current
 
+    def test_build_secondary_context_caches_summaries(self):
+        self.handlers.store_document("file://a.py", "x = 1\n")
+        self.handlers.store_document("file://b.py", "import sys\n")
+        with patch.object(
+            self.handlers, "_extract_file_summary", wraps=self.handlers._extract_file_summary
+        ) as summarize:
+            self.handlers._build_secondary_context("file://a.py")
+            self.handlers._build_secondary_context("file://a.py")
+            self.assertEqual(summarize.call_count, 1)
+            self.handlers.store_document("file://b.py", "import os\n")
+            result = self.handlers._build_secondary_context("file://a.py")
+            self.assertEqual(summarize.call_count, 2)
+        self.assertIn("import os", result)
+
+    def test_build_secondary_context_tolerates_concurrent_close(self):
+        for name in ("a", "b", "c"):
+            self.handlers.store_document(f"file://{name}.py", "x = 1\n")
+        summarize = self.handlers._extract_file_summary
+
+        def close_tab(*args):
+            # The transport thread closes a tab mid-iteration
+            self.handlers.remove_document("file://c.py")
+            return summarize(*args)
+
+        with patch.object(self.handlers, "_extract_file_summary", close_tab):
+            result = self.handlers._build_secondary_context("file://a.py")
+        self.assertIn("b.py", result)
+
     # ---- _build_project_scope ----
 
     def test_build_project_scope_no_git(self):
@@ -148,13 +266,25 @@ class TestLSPHandlersContextLayering(unittest.TestCase):
 
     def test_build_project_scope_limits_files(self):
         git_ctx = MagicMock()
-        git_ctx.list_project_files.return_value = [f"file{i}.py" for i in range(300)]
+        git_ctx.list_project_files.return_value = list(_300_FILES)
         h = LSPHandlers(self.ollama, git_context=git_ctx)
         result = h._build_project_scope()
         # Should be limited to MAX_PROJECT_FILES
         file_lines = [l for l in result.split("\n") if l.startswith("file")]
         self.assertLessEqual(len(file_lines), LSPHandlers.MAX_PROJECT_FILES)
 
+    def test_build_project_scope_cached_until_repo_changes(self):
+        git_ctx = MagicMock()
+        git_ctx.repo_stamp.return_value = (1, 1)
+        git_ctx.list_project_files.return_value = ["a.py"]
+        h = LSPHandlers(self.ollama, git_context=git_ctx)
+        h._build_project_scope()
+        h._build_project_scope()
+        git_ctx.list_project_files.assert_called_once()
+        git_ctx.repo_stamp.return_value = (2, 1)
+        git_ctx.list_project_files.return_value = ["a.py", "b.py"]
+        self.assertIn("b.py", h._build_project_scope())
+
     # ---- handle_completion with layered context ----
 
     def test_handle_completion_passes_layered_context(self):
@@ -167,17 +297,11 @@ class TestLSPHandlersContextLayering(unittest.TestCase):
         )
 
         # Verify complete_code was called with new parameters
-        self.ollama.complete_code.assert_called_once()
-        call_kwargs = self.ollama.complete_code.call_args
-        kwargs = call_kwargs.kwargs if call_kwargs.kwargs else {}
-        # Should have keyword args or positional
-        if kwargs:
-            self.assertIn("cursor_prefix", kwargs)
-            self.assertIn("secondary_context", kwargs)
-            self.assertIn("project_context", kwargs)
-        else:
-            # Positional args - at least code_before, code_after, language
-            self.assertGreaterEqual(len(call_kwargs.args), 2)
+        self.assertEqual(len(self.ollama.complete_code_calls), 1)
+        kwargs = self.ollama.complete_code_calls[0]
+        self.assertIn("cursor_prefix", kwargs)
+        self.assertIn("secondary_context", kwargs)
+        self.assertIn("project_context", kwargs)
 
     def test_handle_completion_cursor_prefix(self):
         doc = "def hello():\n    print('world')\n"
@@ -188,16 +312,16 @@ class TestLSPHandlersContextLayering(unittest.TestCase):
             {"line": 1, "character": 9},  # at "    print|"
         )
 
-        call_kwargs = self.ollama.complete_code.call_args
-        kwargs = call_kwargs.kwargs if call_kwargs.kwargs else {}
-        if "cursor_prefix" in kwargs:
-            self.assertEqual(kwargs["cursor_prefix"], "    print")
+        kwargs = self.ollama.complete_code_calls[0]
+        self.assertEqual(kwargs["cursor_prefix"], "    print")
 
     def test_handle_completion_no_document(self):
-        result = self.handlers.handle_completion(
-            "file://missing.py", {"line": 0, "character": 0}
-        )
+        with self.assertLogs("gopilot.handlers", "WARNING") as logs:
+            result = self.handlers.handle_completion(
+                "file://missing.py", {"line": 0, "character": 0}
+            )
         self.assertEqual(result, [])
+        self.assertIn("Document not found: file://missing.py", logs.output[0])
 
     def test_handle_completion_returns_items(self):
         doc = "def foo():\n    \n"
@@ -211,64 +335,79 @@ class TestLSPHandlersContextLayering(unittest.TestCase):
         self.assertEqual(items[0]["detail"], "AI Completion (gopilot)")
 
     def test_handle_completion_empty_result(self):
-        self.ollama.complete_code.return_value = ""
+        self.ollama.completion = ""
         doc = "def foo():\n    \n"
         self.handlers.store_document("file://test.py", doc)
 
+        with self.assertLogs("gopilot.handlers", "WARNING") as logs:
+            items = self.handlers.handle_completion(
+                "file://test.py",
+                {"line": 1, "character": 4},
+            )
+        self.assertEqual(items, [])
+        self.assertIn("No completion received", logs.output[0])
+
+    def test_handle_completion_drops_superseded_result(self):
+        self.handlers.store_document("file://test.py", "x = ")
+
+        def newer_request(**kwargs):
+            self.handlers._next_completion("file://test.py")
+            return "1"
+
+        self.ollama.complete_code = newer_request
         items = self.handlers.handle_completion(
-            "file://test.py",
-            {"line": 1, "character": 4},
+            "file://test.py", {"line": 0, "character": 4}
         )
         self.assertEqual(items, [])
 
+    def test_new_completion_cancels_previous(self):
+        _, first = self.handlers._next_completion("file://test.py")
+        _, second = self.handlers._next_completion("file://test.py")
+        self.assertTrue(first.is_set())
+        self.assertFalse(second.is_set())
+        self.handlers.remove_document("file://test.py")
+        self.assertTrue(second.is_set())
+
+    def test_repeat_completion_at_same_position_is_not_cancelled(self):
+        _, first = self.handlers._next_completion("file://test.py", (1, 0, 4))
+        _, second = self.handlers._next_completion("file://test.py", (1, 0, 4))
+        self.assertIs(first, second)
+        self.assertFalse(first.is_set())
+        _, third = self.handlers._next_completion("file://test.py", (1, 0, 5))
+        self.assertTrue(first.is_set())
+        self.assertFalse(third.is_set())
+
+    def test_handle_completion_debounce_skips_ollama(self):
+        self.handlers.store_document("file://test.py", "x = ")
+        with patch("gopilot.handlers.time.sleep") as sleep:
+            sleep.side_effect = lambda _: self.handlers._next_completion(
+                "file://test.py"
+            )
+            items = self.handlers.handle_completion(
+                "file://test.py", {"line": 0, "character": 4}
+            )
+        self.assertEqual(items, [])
+        self.assertEqual(self.ollama.complete_code_calls, [])
+
 
 class TestListProjectFiles(unittest.TestCase):
     """Test list_project_files in GitContext."""
 
     def test_list_project_files_in_repo(self):
-        import os
-        import subprocess
-        import tempfile
-
-        tmpdir = tempfile.mkdtemp()
-        try:
-            subprocess.run(["git", "init", tmpdir], capture_output=True, check=True)
-            subprocess.run(
-                ["git", "-C", tmpdir, "config", "user.email", "t@t.com"],
-                capture_output=True, check=True,
-            )
-            subprocess.run(
-                ["git", "-C", tmpdir, "config", "user.name", "T"],
-                capture_output=True, check=True,
-            )
-            for name in ["a.py", "b.py", "lib/c.py"]:
-                path = os.path.join(tmpdir, name)
-                os.makedirs(os.path.dirname(path), exist_ok=True)
-                with open(path, "w") as f:
-                    f.write("x\n")
-            subprocess.run(
-                ["git", "-C", tmpdir, "add", "."], capture_output=True, check=True
-            )
-            subprocess.run(
-                ["git", "-C", tmpdir, "commit", "-m", "init"],
-                capture_output=True, check=True,
-            )
-
-            from gopilot.git_context import GitContext
-            ctx = GitContext(tmpdir)
-            files = ctx.list_project_files()
-            self.assertIn("a.py", files)
-            self.assertIn("b.py", files)
-            self.assertIn("lib/c.py", files)
-        finally:
-            import shutil
-            shutil.rmtree(tmpdir, ignore_errors=True)
+        tmpdir = make_repo({"a.py": "x\n", "b.py": "x\n", "lib/c.py": "x\n"})
+        self.addCleanup(shutil.rmtree, tmpdir)
+        ctx = GitContext(tmpdir)
+        self.addCleanup(ctx.close)
+        files = ctx.list_project_files()
+        self.assertIn("a.py", files)
+        self.assertIn("b.py", files)
+        self.assertIn("lib/c.py", files)
 
     def test_list_project_files_not_git(self):
-        import tempfile
-        from gopilot.git_context import GitContext
-        ctx = GitContext(tempfile.mkdtemp())
-        self.assertEqual(ctx.list_project_files(), [])
+        with tempfile.TemporaryDirectory(dir=TMPDIR) as tmpdir:
+            ctx = GitContext(tmpdir)
+            with self.assertLogs("gopilot.git_context", "WARNING"):
+                self.assertEqual(ctx.list_project_files(), [])
 
 
 if __name__ == "__main__":
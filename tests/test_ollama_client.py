@@ -0,0 +1,476 @@
+"""Tests for gopilot.ollama_client module."""
+
+import asyncio
+import io
+import socket
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+
+from gopilot.ollama_client import (
+    AsyncOllamaClient,
+    OllamaClient,
+    _head,
+    _iter_ndjson,
+    _tail,
+)
+
+
+class TestOllamaClientAsync(unittest.TestCase):
+    """Tests for the asyncio wrappers around the blocking client."""
+
+    def setUp(self):
+        self.client = OllamaClient()
+
+    def test_generate_async(self):
+        with patch.object(self.client, "generate", return_value="hi") as generate:
+            result = asyncio.run(self.client.generate_async("p", system="s"))
+        self.assertEqual(result, "hi")
+        generate.assert_called_once_with("p", system="s")
+
+    def test_generate_stream_async_yields_fragments(self):
+        def fragments(prompt, **kwargs):
+            yield from ["a", "b", "c"]
+
+        with patch.object(self.client, "generate_stream", side_effect=fragments):
+
+            async def collect():
+                return [f async for f in self.client.generate_stream_async("p")]
+
+            self.assertEqual(asyncio.run(collect()), ["a", "b", "c"])
+
+    def test_generate_stream_async_close_stops_stream(self):
+        closed = threading.Event()
+
+        def fragments(prompt, **kwargs):
+            try:
+                for i in range(1000):
+                    yield str(i)
+            finally:
+                closed.set()
+
+        with patch.object(self.client, "generate_stream", side_effect=fragments):
+
+            async def first():
+                stream = self.client.generate_stream_async("p")
+                fragment = await stream.__anext__()
+                await stream.aclose()
+                return fragment
+
+            self.assertEqual(asyncio.run(first()), "0")
+        self.assertTrue(closed.is_set())
+
+    def test_complete_code_async(self):
+        with patch.object(self.client, "complete_code", return_value="x") as complete:
+            result = asyncio.run(
+                self.client.complete_code_async("a = ", language="python")
+            )
+        self.assertEqual(result, "x")
+        complete.assert_called_once_with("a = ", language="python")
+
+
+class TestAsyncOllamaClient(unittest.TestCase):
+    """Tests for the asyncio facade."""
+
+    def test_requests_overlap_and_share_cache(self):
+        sync = OllamaClient()
+        gate = threading.Barrier(2, timeout=5)
+
+        def respond(endpoint, data, *args):
+            gate.wait()  # both requests must be in flight at once
+            return {"response": data["prompt"]}
+
+        async def run(client):
+            async with client:
+                return await asyncio.gather(
+                    client.generate("a", cache=True), client.explain_code("b = 1")
+                )
+
+        with patch.object(sync, "_make_request", side_effect=respond):
+            first, _ = asyncio.run(run(AsyncOllamaClient(sync)))
+        self.assertEqual(first, "a")
+        with patch.object(sync, "_make_request") as request:
+            self.assertEqual(sync.generate("a", cache=True), "a")
+        request.assert_not_called()
+
+
+class TestIterNdjson(unittest.TestCase):
+    def test_splits_records_across_reads(self):
+        class Trickle(io.BytesIO):
+            def read1(self, size=-1):
+                return super().read1(3)
+
+        stream = Trickle(b'{"a": 1}\n{"b": 2}\n{"c"')
+        self.assertEqual(
+            list(_iter_ndjson(stream)), [b'{"a": 1}', b'{"b": 2}', b'{"c"']
+        )
+
+
+class TestPromptBudget(unittest.TestCase):
+    """Tests for the complete_code section budgets."""
+
+    def test_head_and_tail_cut_at_lines(self):
+        text = "aaaa\nbbbb\ncccc"
+        self.assertEqual(_head(text, 12), "aaaa\nbbbb")
+        self.assertEqual(_tail(text, 12), "bbbb\ncccc")
+        self.assertEqual(_head(text, 100), text)
+
+    def test_complete_code_truncates_sections(self):
+        client = OllamaClient()
+        with patch.object(client, "generate", return_value="x") as generate:
+            client.complete_code(
+                "b\n" * 5000,
+                code_after="a\n" * 5000,
+                secondary_context="s\n" * 5000,
+                project_context="p\n" * 5000,
+            )
+        prompt = generate.call_args.args[0]
+        self.assertLessEqual(prompt.count("b\n"), client.MAX_BEFORE_CHARS // 2)
+        self.assertLessEqual(prompt.count("a\n"), client.MAX_AFTER_CHARS // 2)
+        self.assertLessEqual(prompt.count("s\n"), client.MAX_SECONDARY_CHARS // 2)
+        self.assertLessEqual(prompt.count("p\n"), client.MAX_PROJECT_CHARS // 2)
+
+
+class TestWarmup(unittest.TestCase):
+    def test_warmup_preloads_default_model(self):
+        client = OllamaClient(keep_alive="1h")
+        reply = {"response": ""}
+        with patch.object(client, "_make_request", return_value=reply) as req:
+            client.warmup().join(timeout=5)
+        data = req.call_args.args[1]
+        self.assertEqual(data["model"], client.model)
+        self.assertEqual(data["keep_alive"], "1h")
+        self.assertNotIn("prompt", data)
+
+    def test_preload_reports_failure(self):
+        client = OllamaClient()
+        with patch.object(client, "_make_request", return_value=None):
+            self.assertFalse(client.preload("other-model"))
+
+    def test_generate_sends_default_keep_alive(self):
+        client = OllamaClient(keep_alive="1h")
+        default = client._generate_payload("p", None, None, None, None)
+        pinned = client._generate_payload("p", None, None, None, -1)
+        self.assertEqual(default["keep_alive"], "1h")
+        self.assertEqual(pinned["keep_alive"], -1)
+
+    def test_constructor_warmup(self):
+        with patch.object(OllamaClient, "warmup") as warmup:
+            OllamaClient(warmup=True)
+            OllamaClient()
+        warmup.assert_called_once()
+
+
+class TestConnections(unittest.TestCase):
+    """Tests for keep-alive connection handling."""
+
+    def test_connection_reused_per_thread(self):
+        client = OllamaClient()
+        self.assertIs(client._connection(), client._connection())
+
+    def test_close_closes_open_connections(self):
+        with OllamaClient() as client:
+            conn = client._connection()
+            with patch.object(conn, "close") as close:
+                client.close()
+        close.assert_called_once()
+
+    def test_connection_disables_nagle(self):
+        server = socket.create_server(("127.0.0.1", 0))
+        self.addCleanup(server.close)
+        client = OllamaClient(port=server.getsockname()[1])
+        self.addCleanup(client.close)
+        conn = client._connection()
+        conn.connect()
+        self.assertTrue(
+            conn.sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY)
+        )
+
+    def test_retry_resends_the_same_body(self):
+        client = OllamaClient()
+        stale, fresh = MagicMock(), MagicMock(sock=None)
+        stale.request.side_effect = ConnectionResetError
+        fresh.getresponse.return_value = MagicMock(status=200)
+        with patch.object(client, "_connection", side_effect=[stale, fresh]):
+            client._request("POST", "/api/generate", {"prompt": "hi"})
+        body = stale.request.call_args.kwargs["body"]
+        self.assertIsInstance(body, bytes)
+        self.assertIs(fresh.request.call_args.kwargs["body"], body)
+
+
+class TestListModels(unittest.TestCase):
+    """Tests for list_models parsing."""
+
+    BODY = b'{"models": [{"name": "a:7b", "size": 1}, {"name": "b:1b"}]}'
+
+    def _list(self):
+        client = OllamaClient()
+        with patch.object(client, "_request", return_value=io.BytesIO(self.BODY)):
+            return client.list_models()
+
+    def test_list_models(self):
+        self.assertEqual(self._list(), ["a:7b", "b:1b"])
+
+    def test_list_models_without_ijson(self):
+        with patch("gopilot.ollama_client.ijson", None):
+            self.assertEqual(self._list(), ["a:7b", "b:1b"])
+
+
+class TestHealthCheck(unittest.TestCase):
+    """Tests for the cached health check."""
+
+    def setUp(self):
+        self.client = OllamaClient()
+
+    def test_success_is_cached(self):
+        with patch.object(
+            self.client, "_request", return_value=io.BytesIO(b"{}")
+        ) as request:
+            self.assertTrue(self.client.health_check())
+            self.assertTrue(self.client.health_check())
+        request.assert_called_once()
+
+    def test_failure_is_not_cached(self):
+        with patch.object(
+            self.client, "_request", side_effect=OSError("refused")
+        ) as request, self.assertLogs("gopilot.ollama_client", "WARNING") as logs:
+            self.assertFalse(self.client.health_check())
+            self.assertFalse(self.client.health_check())
+        self.assertEqual(request.call_count, 2)
+        self.assertEqual(len(logs.output), 2)
+
+    def test_cache_expires(self):
+        self.client.HEALTH_TTL = 0
+        with patch.object(
+            self.client, "_request", side_effect=lambda *a, **k: io.BytesIO(b"{}")
+        ) as request:
+            self.client.health_check()
+            self.client.health_check()
+        self.assertEqual(request.call_count, 2)
+
+    def test_list_models_reuses_health_check(self):
+        body = b'{"models": [{"name": "a:7b"}]}'
+        with patch.object(
+            self.client, "_request", return_value=io.BytesIO(body)
+        ) as request:
+            self.assertTrue(self.client.health_check())
+            self.assertEqual(self.client.list_models(), ["a:7b"])
+        request.assert_called_once()
+
+
+class TestStreaming(unittest.TestCase):
+    """Tests for streamed generation."""
+
+    def setUp(self):
+        self.client = OllamaClient()
+
+    def test_generate_stream_callback_receives_fragments(self):
+        received = []
+        with patch.object(
+            self.client, "_stream_request", return_value=iter(["a", "b"])
+        ) as stream:
+            result = self.client.generate("p", stream_callback=received.append)
+        self.assertEqual(result, "ab")
+        self.assertEqual(received, ["a", "b"])
+        self.assertTrue(stream.call_args.args[1]["stream"])
+
+    def test_cancel_token_abandons_stream(self):
+        cancel = threading.Event()
+        lines = [b'{"response": "a"}\n', b'{"response": "b"}\n', b'{"done": true}\n']
+        response = MagicMock(wraps=io.BytesIO(b"".join(lines)))
+        received = []
+
+        def on_chunk(fragment):
+            received.append(fragment)
+            cancel.set()
+
+        with patch.object(self.client, "_request", return_value=response), patch.object(
+            self.client, "_drop_connection"
+        ) as drop:
+            result = self.client.generate(
+                "p", stream_callback=on_chunk, cancel_token=cancel
+            )
+        self.assertIsNone(result)
+        self.assertEqual(received, ["a"])
+        drop.assert_called_once()
+        response.read.assert_not_called()
+
+    def test_done_releases_connection_for_reuse(self):
+        lines = [b'{"response": "a"}\n', b'{"done": true}\n']
+        response = MagicMock(wraps=io.BytesIO(b"".join(lines)))
+        with patch.object(self.client, "_request", return_value=response), patch.object(
+            self.client, "_drop_connection"
+        ) as drop:
+            fragments = list(self.client._stream_request("/api/generate", {}))
+        self.assertEqual(fragments, ["a"])
+        response.read.assert_called_once_with()
+        drop.assert_not_called()
+
+    def test_cache_hit_calls_back_once(self):
+        received = []
+        with patch.object(self.client, "_make_request", return_value={"response": "x"}):
+            self.client.complete_code("a = ")
+            self.client.complete_code("a = ", stream_callback=received.append)
+        self.assertEqual(received, ["x"])
+
+
+class TestCompletionCache(unittest.TestCase):
+    """Tests for the generate response cache and complete_code prompts."""
+
+    def setUp(self):
+        self.client = OllamaClient()
+
+    def _respond(self, *texts):
+        return patch.object(
+            self.client,
+            "_make_request",
+            side_effect=[{"response": t} if t is not None else None for t in texts],
+        )
+
+    def test_repeat_completion_served_from_cache(self):
+        with self._respond("x") as request:
+            first = self.client.complete_code("a = ", language="python")
+            second = self.client.complete_code("a = ", language="python")
+        self.assertEqual((first, second), ("x", "x"))
+        request.assert_called_once()
+
+    def test_different_context_misses_cache(self):
+        with self._respond("x", "y") as request:
+            self.client.complete_code("a = ")
+            self.client.complete_code("a = ", secondary_context="other tab")
+        self.assertEqual(request.call_count, 2)
+
+    def test_different_options_miss_cache(self):
+        with self._respond("x", "y") as request:
+            self.client.generate("p", options={"num_predict": 1}, cache=True)
+            self.client.generate("p", options={"num_predict": 2}, cache=True)
+        self.assertEqual(request.call_count, 2)
+
+    def test_failed_completion_not_cached(self):
+        with self._respond(None, "x"):
+            self.assertIsNone(self.client.complete_code("a = "))
+            self.assertEqual(self.client.complete_code("a = "), "x")
+
+    def test_clear_cache(self):
+        with self._respond("x", "x") as request:
+            self.client.generate("p", cache=True)
+            self.client.clear_cache()
+            self.client.generate("p", cache=True)
+        self.assertEqual(request.call_count, 2)
+
+    def test_generate_is_not_cached_by_default(self):
+        with self._respond("x", "y") as request:
+            self.assertEqual(self.client.generate("p"), "x")
+            self.assertEqual(self.client.generate("p"), "y")
+        self.assertEqual(request.call_count, 2)
+        self.assertEqual(len(self.client._response_cache), 0)
+
+    def test_system_prompt_is_stable_across_cursor_positions(self):
+        with patch.object(self.client, "generate", return_value="x") as generate:
+            self.client.complete_code("a = ", cursor_prefix="a = ")
+            self.client.complete_code("b = ", cursor_prefix="b = ")
+        systems = [c.kwargs["system"] for c in generate.call_args_list]
+        self.assertEqual(systems[0], systems[1])
+        self.assertIn("python", systems[0])
+
+    def test_complete_code_caps_generation(self):
+        with patch.object(self.client, "generate", return_value="x") as generate:
+            self.client.complete_code("a = ")
+        options = generate.call_args.kwargs["options"]
+        self.assertEqual(options["num_predict"], 128)
+        self.assertIn("\n```", options["stop"])
+        # A leading opening fence must not end generation
+        self.assertNotIn("```", options["stop"])
+
+    def test_explain_code_uses_static_system_prompt(self):
+        with patch.object(self.client, "generate", return_value="x") as generate:
+            self.assertEqual(self.client.explain_code("a = 1"), "x")
+        self.assertIn("documentation assistant", generate.call_args.kwargs["system"])
+
+    def test_cache_is_bounded(self):
+        with patch("gopilot.ollama_client._RESPONSE_CACHE_SIZE", 2), self._respond(
+            "x", "x", "x"
+        ):
+            for code in ("a", "b", "c"):
+                self.client.complete_code(code)
+        self.assertEqual(len(self.client._response_cache), 2)
+
+    def test_identical_inflight_requests_are_coalesced(self):
+        started, release = threading.Event(), threading.Event()
+
+        def slow_request(*args):
+            started.set()
+            release.wait(5)
+            return {"response": "x"}
+
+        results = []
+        with patch.object(
+            self.client, "_make_request", side_effect=slow_request
+        ) as request:
+            leader = threading.Thread(
+                target=lambda: results.append(self.client.generate("p", cache=True))
+            )
+            leader.start()
+            started.wait(5)
+            joiner = threading.Thread(
+                target=lambda: results.append(self.client.generate("p", cache=True))
+            )
+            joiner.start()
+            release.set()
+            leader.join(5)
+            joiner.join(5)
+        self.assertEqual(results, ["x", "x"])
+        request.assert_called_once()
+        self.assertEqual(self.client._pending, {})
+
+    def _join_inflight(self, leader_response, **joiner_kwargs):
+        """Start a cached request that blocks, then issue a second one."""
+        started, release = threading.Event(), threading.Event()
+
+        def request(*args):
+            if started.is_set():
+                return {"response": "own"}
+            started.set()
+            release.wait(5)
+            return leader_response
+
+        results = {}
+        with patch.object(
+            self.client, "_make_request", side_effect=request
+        ) as make_request:
+            leader = threading.Thread(
+                target=lambda: results.setdefault(
+                    "leader", self.client.generate("p", cache=True)
+                )
+            )
+            leader.start()
+            started.wait(5)
+            joiner = threading.Thread(
+                target=lambda: results.setdefault(
+                    "joiner", self.client.generate("p", cache=True, **joiner_kwargs)
+                )
+            )
+            joiner.start()
+            if joiner_kwargs:
+                joiner.join(5)  # must not wait for the leader
+            release.set()
+            leader.join(5)
+            joiner.join(5)
+        return results, make_request.call_count
+
+    def test_waiter_retries_when_leader_is_cancelled(self):
+        results, calls = self._join_inflight(None)
+        self.assertEqual(results, {"leader": None, "joiner": "own"})
+        self.assertEqual(calls, 2)
+
+    def test_streaming_request_does_not_join(self):
+        received = []
+        results, calls = self._join_inflight(
+            {"response": "x"}, stream_callback=received.append
+        )
+        self.assertEqual(results["joiner"], "own")
+        self.assertEqual(calls, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
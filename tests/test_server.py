@@ -0,0 +1,427 @@
+"""Tests for gopilot.server module."""
+
+import asyncio
+import atexit
+import io
+import json
+import logging
+import os
+import socket
+import tempfile
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from gopilot import __version__
+from gopilot.server import (
+    LSPServer,
+    StdioTransport,
+    TCPTransport,
+    _build_parser,
+    _ollama_parallelism,
+    setup_logging,
+)
+
+from tests.gitrepo import TMPDIR
+
+
+def _frame(body: bytes) -> bytes:
+    return b"Content-Length: %d\r\n\r\n" % len(body) + body
+
+
+class TestHandleRequest(unittest.TestCase):
+    """Tests for LSPServer method dispatch."""
+
+    @classmethod
+    def setUpClass(cls):
+        with tempfile.TemporaryDirectory(dir=TMPDIR) as tmpdir:
+            cls.server = LSPServer(repo_path=tmpdir)
+
+    def test_request_gets_response(self):
+        response = self.server.handle_request(
+            {"jsonrpc": "2.0", "id": 7, "method": "shutdown"}
+        )
+        self.assertEqual(response, {"jsonrpc": "2.0", "id": 7, "result": None})
+
+    def test_notification_gets_no_response(self):
+        request = {
+            "method": "textDocument/didOpen",
+            "params": {"textDocument": {"uri": "file:///a.py", "text": "x"}},
+        }
+        self.assertIsNone(self.server.handle_request(request))
+        self.assertEqual(self.server.handlers.get_document("file:///a.py"), "x")
+
+    def test_initialize_without_agent(self):
+        response = self.server.handle_request(
+            {"id": 1, "method": "initialize", "params": {}}
+        )
+        server_info = response["result"]["serverInfo"]
+        self.assertEqual(server_info, {"name": "gopilot", "version": __version__})
+        self.assertTrue(response["result"]["capabilities"]["hoverProvider"])
+
+    def test_initialize_keeps_handlers_and_documents(self):
+        handlers = self.server.handlers
+        handlers.store_document("file:///open.py", "y")
+        with tempfile.TemporaryDirectory(dir=TMPDIR) as root:
+            self.server.handle_request(
+                {"id": 1, "method": "initialize", "params": {"rootUri": root}}
+            )
+        self.assertIs(self.server.handlers, handlers)
+        self.assertEqual(handlers.get_document("file:///open.py"), "y")
+
+    def test_initialize_new_root_closes_old_git_context(self):
+        old_context = self.server.git_context
+        with patch.object(old_context, "close") as close, tempfile.TemporaryDirectory(
+            dir=TMPDIR
+        ) as root:
+            self.server.handle_request(
+                {"id": 1, "method": "initialize", "params": {"rootUri": root}}
+            )
+        self.assertIsNot(self.server.git_context, old_context)
+        self.assertIsNone(self.server.agent)
+        close.assert_called_once_with()
+
+    def test_initialize_same_root_keeps_git_context(self):
+        git_context = self.server.git_context
+        self.server.handle_request(
+            {
+                "id": 1,
+                "method": "initialize",
+                "params": {"rootUri": f"file://{git_context.repo_path}"},
+            }
+        )
+        self.assertIs(self.server.git_context, git_context)
+
+    def test_initialized_warms_up_in_background(self):
+        client = MagicMock()
+        client.health_check.return_value = True
+        with patch.object(self.server, "ollama_client", client), patch(
+            "gopilot.server.threading.Thread"
+        ) as thread:
+            self.assertIsNone(self.server.handle_request({"method": "initialized"}))
+            client.health_check.assert_not_called()
+            thread.return_value.start.assert_called_once()
+            self.server._warmup_ollama()
+        client.preload.assert_called_once_with()
+
+    def test_warmup_skips_unreachable_ollama(self):
+        client = MagicMock()
+        client.health_check.return_value = False
+        with patch.object(self.server, "ollama_client", client), self.assertLogs(
+            "gopilot.server", "WARNING"
+        ):
+            self.server._warmup_ollama()
+        client.list_models.assert_not_called()
+        client.preload.assert_not_called()
+
+    def test_executor_follows_ollama_parallelism(self):
+        with patch.dict(os.environ, {"OLLAMA_NUM_PARALLEL": "3"}):
+            self.assertEqual(_ollama_parallelism(), 3)
+        with patch.dict(os.environ, {"OLLAMA_NUM_PARALLEL": "auto"}):
+            self.assertEqual(_ollama_parallelism(), 1)
+        self.assertEqual(
+            self.server.executor._max_workers, _ollama_parallelism()
+        )
+
+    def test_exit_sets_flag_instead_of_raising(self):
+        with tempfile.TemporaryDirectory(dir=TMPDIR) as tmpdir:
+            server = LSPServer(repo_path=tmpdir)
+        self.assertIsNone(server.handle_request({"method": "exit"}))
+        self.assertTrue(server.exit_requested)
+        self.assertEqual(server.exit_code, 1)
+        server.handle_request({"id": 1, "method": "shutdown"})
+        self.assertEqual(server.exit_code, 0)
+
+    def test_unknown_method(self):
+        with self.assertLogs("gopilot.server", "WARNING") as logs:
+            response = self.server.handle_request({"id": 1, "method": "nope"})
+            self.assertIsNone(self.server.handle_request({"method": "nope"}))
+        self.assertEqual(response["error"]["code"], -32601)
+        self.assertEqual(
+            logs.output, ["WARNING:gopilot.server:Unknown method: nope"] * 2
+        )
+
+
+class TestArgumentParser(unittest.TestCase):
+    """Tests for the command-line parser."""
+
+    def test_defaults(self):
+        args = _build_parser().parse_args([])
+        self.assertEqual(
+            (args.mode, args.port, args.model), ("stdio", 2087, "codellama")
+        )
+        self.assertIsNone(args.agent_model)
+
+    def test_parser_is_built_once(self):
+        self.assertIs(_build_parser(), _build_parser())
+
+
+class TestSetupLogging(unittest.TestCase):
+    """Tests for the queued log file handler."""
+
+    def test_records_reach_file_via_listener(self):
+        root = logging.getLogger()
+        handlers, level = root.handlers[:], root.level
+        with tempfile.TemporaryDirectory(dir=TMPDIR) as tmpdir:
+            log_file = os.path.join(tmpdir, "gopilot.log")
+            try:
+                listener = setup_logging(log_file, "INFO")
+                logging.getLogger("gopilot.test").info("queued %s", "record")
+                logging.getLogger("gopilot.test").debug("filtered")
+                listener.stop()
+                listener.handlers[0].close()
+            finally:
+                for handler in root.handlers[len(handlers) :]:
+                    root.removeHandler(handler)
+                root.setLevel(level)
+                atexit.unregister(listener.stop)
+            with open(log_file) as f:
+                contents = f.read()
+        self.assertIn("queued record", contents)
+        self.assertNotIn("filtered", contents)
+
+
+class TestStdioTransport(unittest.TestCase):
+    """Tests for Content-Length framing over stdio."""
+
+    def setUp(self):
+        self.transport = StdioTransport(MagicMock())
+
+    def test_read_message_counts_bytes(self):
+        body = '{"method": "x", "params": {"text": "café →"}}'.encode("utf-8")
+        stdin = MagicMock(buffer=io.BytesIO(_frame(body) + _frame(b"{}")))
+        with patch("sys.stdin", stdin):
+            first = self.transport._read_message()
+            second = self.transport._read_message()
+        self.assertEqual(first["params"]["text"], "café →")
+        self.assertEqual(second, {})
+
+    def test_read_message_ignores_other_headers(self):
+        data = (
+            b"Content-Type: application/vscode-jsonrpc; charset=utf-8\r\n"
+            b"content-length: 9\r\n\r\n"
+            b'{"id": 1}'
+        )
+        with patch("sys.stdin", MagicMock(buffer=io.BytesIO(data))):
+            self.assertEqual(self.transport._read_message(), {"id": 1})
+
+    def test_completion_does_not_block_later_messages(self):
+        release = threading.Event()
+        handled = []
+
+        def handle_request(message, notify=None):
+            if message["method"] == "textDocument/completion":
+                release.wait(5)
+            else:
+                release.set()
+            handled.append(message["method"])
+            return None
+
+        self.transport.server.CONCURRENT_METHODS = LSPServer.CONCURRENT_METHODS
+        self.transport.server.executor = ThreadPoolExecutor(2)
+        self.addCleanup(self.transport.server.executor.shutdown)
+        self.transport.server.handle_request.side_effect = handle_request
+        data = _frame(b'{"id": 1, "method": "textDocument/completion"}') + _frame(
+            b'{"method": "textDocument/didChange"}'
+        )
+        stdin = MagicMock(buffer=io.BytesIO(data))
+        with patch("sys.stdin", stdin):
+            self.transport.start()
+        self.assertEqual(
+            handled, ["textDocument/didChange", "textDocument/completion"]
+        )
+
+    def test_stops_reading_after_exit(self):
+        data = _frame(b'{"method": "exit"}') + _frame(b'{"id": 1, "method": "x"}')
+        self.transport.server.handle_request.return_value = None  # notification
+        with patch("sys.stdin", MagicMock(buffer=io.BytesIO(data))):
+            self.transport.start()
+        self.transport.server.handle_request.assert_called_once()
+
+    def test_failed_request_gets_error_response(self):
+        self.transport.server.handle_request.side_effect = RuntimeError("boom")
+        stdout = MagicMock(buffer=io.BytesIO())
+        with patch("sys.stdout", stdout), self.assertLogs("gopilot.server", "ERROR"):
+            self.transport._handle_message({"id": 7, "method": "x"})
+            self.transport._handle_message({"method": "y"})
+        body = stdout.buffer.getvalue().split(b"\r\n\r\n", 1)[1]
+        response = json.loads(body)
+        self.assertEqual(response["id"], 7)
+        self.assertEqual(response["error"]["code"], -32603)
+
+    def test_write_message_frames_utf8(self):
+        stdout = MagicMock(buffer=io.BytesIO())
+        with patch("sys.stdout", stdout):
+            self.transport._write_message({"result": "→"})
+        data = stdout.buffer.getvalue()
+        header, body = data.split(b"\r\n\r\n", 1)
+        self.assertEqual(header, b"Content-Length: %d" % len(body))
+        self.assertEqual(json.loads(body), {"result": "→"})
+
+
+class TestTCPTransport(unittest.TestCase):
+    """Tests for the asyncio TCP transport."""
+
+    def setUp(self):
+        self.transport = TCPTransport(MagicMock())
+
+    def _read_all(self, data: bytes) -> list:
+        async def read():
+            reader = asyncio.StreamReader()
+            reader.feed_data(data)
+            reader.feed_eof()
+            messages = []
+            while (message := await self.transport._read_message(reader)) is not None:
+                messages.append(message)
+            return messages
+
+        return asyncio.run(read())
+
+    async def _start_server(self, handlers: list) -> asyncio.AbstractServer:
+        """Serve on an ephemeral port, recording each client's handler task."""
+
+        async def handle_client(reader, writer):
+            handlers.append(asyncio.current_task())
+            await self.transport._handle_client(reader, writer)
+
+        return await asyncio.start_server(handle_client, "127.0.0.1", 0)
+
+    def test_read_message_splits_frames(self):
+        data = _frame(b'{"id": 1}') + _frame(b'{"id": 2}')
+        self.assertEqual(self._read_all(data), [{"id": 1}, {"id": 2}])
+
+    def test_read_message_large_frame_in_pieces(self):
+        text = "x" * (1 << 20)
+        data = _frame(json.dumps({"text": text}).encode("utf-8"))
+
+        async def read():
+            reader = asyncio.StreamReader()
+            read_task = asyncio.ensure_future(self.transport._read_message(reader))
+            for i in range(0, len(data), 4096):
+                reader.feed_data(data[i : i + 4096])
+                await asyncio.sleep(0)
+            return await read_task
+
+        self.assertEqual(asyncio.run(read())["text"], text)
+
+    def test_read_message_ignores_other_headers(self):
+        data = b"Content-Type: application/json\r\nContent-Length:9\r\n\r\n{\"id\": 1}"
+        self.assertEqual(self._read_all(data), [{"id": 1}])
+
+    def test_read_message_stops_on_truncated_body(self):
+        self.assertEqual(self._read_all(_frame(b'{"id": 1}')[:-2]), [])
+
+    def test_read_message_skips_bad_json(self):
+        data = _frame(b"{oops") + _frame(b'{"id": 2}')
+        with self.assertLogs("gopilot.server", "ERROR"):
+            self.assertEqual(self._read_all(data), [{"id": 2}])
+
+    def test_encode_message_round_trips(self):
+        data = self.transport._encode_message({"id": 1, "result": "→"})
+        self.assertEqual(self._read_all(data), [{"id": 1, "result": "→"}])
+
+    def test_serves_clients_concurrently(self):
+        release = threading.Event()
+
+        def handle_request(message, notify=None):
+            if message["id"] == 1:
+                release.wait(5)
+            else:
+                release.set()
+            return {"id": message["id"]}
+
+        self.transport.server.handle_request.side_effect = handle_request
+        self.transport._running = True
+
+        async def exchange(port, request_id):
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(_frame(b'{"id": %d}' % request_id))
+            await writer.drain()
+            response = await self.transport._read_message(reader)
+            writer.close()
+            await writer.wait_closed()
+            return response
+
+        async def run():
+            handlers = []
+            server = await self._start_server(handlers)
+            port = server.sockets[0].getsockname()[1]
+            async with server:
+                responses = await asyncio.wait_for(
+                    asyncio.gather(exchange(port, 1), exchange(port, 2)), 5
+                )
+                # Let each handler see EOF rather than be cancelled at teardown
+                await asyncio.wait_for(asyncio.gather(*handlers), 5)
+                return responses
+
+        self.assertEqual(asyncio.run(run()), [{"id": 1}, {"id": 2}])
+
+    def test_failed_request_gets_error_response(self):
+        self.transport.server.handle_request.side_effect = RuntimeError("boom")
+        writer = MagicMock(drain=AsyncMock())
+
+        async def run():
+            await self.transport._respond({"id": 7, "method": "x"}, writer, None)
+
+        with self.assertLogs("gopilot.server", "ERROR"):
+            asyncio.run(run())
+        (data,), _ = writer.write.call_args
+        self.assertEqual(self._read_all(data)[0]["error"]["code"], -32603)
+
+    def test_accepted_socket_disables_nagle(self):
+        sock = MagicMock()
+        writer = MagicMock()
+        writer.get_extra_info.side_effect = lambda name: {"socket": sock}.get(name)
+
+        async def run():
+            reader = asyncio.StreamReader()
+            reader.feed_eof()
+            await self.transport._handle_client(reader, writer)
+
+        asyncio.run(run())
+        sock.setsockopt.assert_called_once_with(
+            socket.IPPROTO_TCP, socket.TCP_NODELAY, 1
+        )
+
+    def test_completion_does_not_block_same_client(self):
+        release = threading.Event()
+
+        def handle_request(message, notify=None):
+            if message["method"] == "textDocument/completion":
+                release.wait(5)
+            else:
+                release.set()
+            return {"id": message["id"]}
+
+        self.transport.server.CONCURRENT_METHODS = LSPServer.CONCURRENT_METHODS
+        self.transport.server.executor = ThreadPoolExecutor(2)
+        self.addCleanup(self.transport.server.executor.shutdown)
+        self.transport.server.handle_request.side_effect = handle_request
+        self.transport._running = True
+
+        async def run():
+            handlers = []
+            server = await self._start_server(handlers)
+            port = server.sockets[0].getsockname()[1]
+            async with server:
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                writer.write(
+                    _frame(b'{"id": 1, "method": "textDocument/completion"}')
+                    + _frame(b'{"id": 2, "method": "shutdown"}')
+                )
+                await writer.drain()
+                responses = [
+                    await asyncio.wait_for(self.transport._read_message(reader), 5)
+                    for _ in range(2)
+                ]
+                writer.close()
+                await writer.wait_closed()
+                await asyncio.wait_for(asyncio.gather(*handlers), 5)
+                return responses
+
+        self.assertEqual(asyncio.run(run()), [{"id": 2}, {"id": 1}])
+
+
+if __name__ == "__main__":
+    unittest.main()